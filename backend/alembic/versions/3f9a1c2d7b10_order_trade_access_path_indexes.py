@@ -0,0 +1,57 @@
+"""order and trade access path indexes
+
+Revision ID: 3f9a1c2d7b10
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9a1c2d7b10"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_LIMIT_ORDER = sa.text("type = 'L' AND status IN ('pending', 'partially_filled')")
+
+# (name, table, columns, extra kwargs)
+INDEXES = [
+    (
+        "ix_orders_open_book",
+        "orders",
+        ["symbol_id", "side", "price", "timestamp"],
+        {"postgresql_where": OPEN_LIMIT_ORDER, "sqlite_where": OPEN_LIMIT_ORDER},
+    ),
+    ("ix_orders_user_id_id", "orders", ["user_id", "id"], {}),
+    ("ix_orders_symbol_id_id", "orders", ["symbol_id", "id"], {}),
+    ("ix_trades_symbol_id_timestamp", "trades", ["symbol_id", "timestamp"], {}),
+    ("ix_trades_buy_user_id", "trades", ["buy_user_id"], {}),
+    ("ix_trades_sell_user_id", "trades", ["sell_user_id"], {}),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run inside a transaction; don't lock live tables
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                **kwargs,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, if_exists=True, postgresql_concurrently=True
+            )
@@ -0,0 +1,39 @@
+"""trades symbol keyset index
+
+Revision ID: 8c41e6f0a2d5
+Revises: 3f9a1c2d7b10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c41e6f0a2d5"
+down_revision: Union[str, None] = "3f9a1c2d7b10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /trades/symbol/{id} pages by (symbol_id, id > cursor) ORDER BY id
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_trades_symbol_id_id",
+            "trades",
+            ["symbol_id", "id"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_trades_symbol_id_id",
+            table_name="trades",
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
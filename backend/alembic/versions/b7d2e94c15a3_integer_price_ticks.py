@@ -0,0 +1,102 @@
+"""integer price ticks
+
+Revision ID: b7d2e94c15a3
+Revises: 8c41e6f0a2d5
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d2e94c15a3"
+down_revision: Union[str, None] = "8c41e6f0a2d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_LIMIT_ORDER = sa.text("type = 'L' AND status IN ('pending', 'partially_filled')")
+
+
+def upgrade() -> None:
+    op.add_column(
+        "symbols",
+        sa.Column("tick_size", sa.Numeric(18, 8), nullable=False, server_default="0.01"),
+    )
+    op.add_column("orders", sa.Column("price_ticks", sa.BigInteger()))
+    op.add_column("trades", sa.Column("price_ticks", sa.BigInteger()))
+
+    # Existing prices become whole ticks of their symbol's (default) tick size
+    op.execute(
+        """
+        UPDATE orders SET price_ticks = (
+            SELECT CAST(ROUND(CAST(orders.price AS NUMERIC) / symbols.tick_size) AS BIGINT)
+            FROM symbols WHERE symbols.id = orders.symbol_id
+        )
+        """
+    )
+    op.execute(
+        """
+        UPDATE trades SET price_ticks = (
+            SELECT CAST(ROUND(CAST(trades.trade_price AS NUMERIC) / symbols.tick_size) AS BIGINT)
+            FROM symbols WHERE symbols.id = trades.symbol_id
+        )
+        """
+    )
+
+    op.drop_index("ix_orders_open_book", table_name="orders", if_exists=True)
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("price")
+    with op.batch_alter_table("trades") as batch:
+        batch.drop_column("trade_price")
+        batch.alter_column(
+            "trade_quantity",
+            type_=sa.Integer(),
+            postgresql_using="ROUND(trade_quantity)::integer",
+        )
+    op.create_index(
+        "ix_orders_open_book",
+        "orders",
+        ["symbol_id", "side", "price_ticks", "timestamp"],
+        postgresql_where=OPEN_LIMIT_ORDER,
+        sqlite_where=OPEN_LIMIT_ORDER,
+    )
+
+
+def downgrade() -> None:
+    op.add_column("orders", sa.Column("price", sa.Float()))
+    op.add_column("trades", sa.Column("trade_price", sa.Float()))
+    op.execute(
+        """
+        UPDATE orders SET price = (
+            SELECT CAST(orders.price_ticks * symbols.tick_size AS FLOAT)
+            FROM symbols WHERE symbols.id = orders.symbol_id
+        )
+        """
+    )
+    op.execute(
+        """
+        UPDATE trades SET trade_price = (
+            SELECT CAST(trades.price_ticks * symbols.tick_size AS FLOAT)
+            FROM symbols WHERE symbols.id = trades.symbol_id
+        )
+        """
+    )
+
+    op.drop_index("ix_orders_open_book", table_name="orders", if_exists=True)
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("price_ticks")
+    with op.batch_alter_table("trades") as batch:
+        batch.drop_column("price_ticks")
+        batch.alter_column("trade_quantity", type_=sa.Float())
+    with op.batch_alter_table("symbols") as batch:
+        batch.drop_column("tick_size")
+    op.create_index(
+        "ix_orders_open_book",
+        "orders",
+        ["symbol_id", "side", "price", "timestamp"],
+        postgresql_where=OPEN_LIMIT_ORDER,
+        sqlite_where=OPEN_LIMIT_ORDER,
+    )
@@ -0,0 +1,83 @@
+"""ohlcv candles
+
+Revision ID: d3a8f51c6e27
+Revises: b7d2e94c15a3
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d3a8f51c6e27"
+down_revision: Union[str, None] = "b7d2e94c15a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INTERVALS = (1, 60, 300, 3600)
+EPOCH = datetime(1970, 1, 1)
+
+
+def upgrade() -> None:
+    candles = op.create_table(
+        "candles",
+        sa.Column(
+            "symbol_id",
+            sa.Integer(),
+            sa.ForeignKey("symbols.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("interval", sa.Integer(), primary_key=True),
+        sa.Column("start", sa.DateTime(), primary_key=True),
+        sa.Column("open_ticks", sa.BigInteger(), nullable=False),
+        sa.Column("high_ticks", sa.BigInteger(), nullable=False),
+        sa.Column("low_ticks", sa.BigInteger(), nullable=False),
+        sa.Column("close_ticks", sa.BigInteger(), nullable=False),
+        sa.Column("volume", sa.BigInteger(), nullable=False),
+        sa.Column("trades", sa.Integer(), nullable=False),
+    )
+
+    # Backfill from the existing trades, one symbol at a time
+    bind = op.get_bind()
+    # Streamed: the option goes on the SELECT only, alembic's connection is
+    # shared and the inserts below can't run as server-side cursors
+    trades = bind.execute(
+        sa.text(
+            "SELECT symbol_id, timestamp, price_ticks, trade_quantity FROM trades "
+            "WHERE timestamp IS NOT NULL ORDER BY symbol_id, id"
+        ).execution_options(yield_per=10000)
+    )
+    rows, current = {}, None
+    for symbol_id, ts, price, quantity in trades:
+        if symbol_id != current:
+            if rows:
+                op.bulk_insert(candles, list(rows.values()))
+            rows, current = {}, symbol_id
+        if isinstance(ts, str):  # SQLite hands back text
+            ts = datetime.fromisoformat(ts)
+        for seconds in INTERVALS:
+            offset = int((ts - EPOCH).total_seconds()) // seconds * seconds
+            start = EPOCH + timedelta(seconds=offset)
+            row = rows.get((seconds, start))
+            if row is None:
+                rows[(seconds, start)] = {
+                    "symbol_id": symbol_id, "interval": seconds, "start": start,
+                    "open_ticks": price, "high_ticks": price, "low_ticks": price,
+                    "close_ticks": price, "volume": quantity, "trades": 1,
+                }
+                continue
+            row["high_ticks"] = max(row["high_ticks"], price)
+            row["low_ticks"] = min(row["low_ticks"], price)
+            row["close_ticks"] = price
+            row["volume"] += quantity
+            row["trades"] += 1
+    if rows:
+        op.bulk_insert(candles, list(rows.values()))
+
+
+def downgrade() -> None:
+    op.drop_table("candles")
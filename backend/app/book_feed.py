@@ -0,0 +1,155 @@
+import asyncio
+import os
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import LockError
+
+# e.g. redis://redis:6379/2; unset = every worker broadcasts its own snapshots
+ORDERBOOK_REDIS_URL = os.getenv("ORDERBOOK_REDIS_URL")
+ORDERBOOK_LEADER_TTL = float(os.getenv("ORDERBOOK_LEADER_TTL", "10"))  # seconds
+ORDERBOOK_PUBLISH_INTERVAL = float(os.getenv("ORDERBOOK_PUBLISH_INTERVAL", "2"))
+
+LEADER_KEY = "orderbook:leader"
+DIRTY_KEY = "orderbook:dirty"  # set of symbol ids changed since the last publish
+SNAPSHOT_PREFIX = "orderbook:snapshot:"  # key = latest snapshot, channel = updates
+
+
+@dataclass
+class FeedStats:
+    leader: bool = False
+    published: int = 0  # snapshots computed and published (leader only)
+    relayed: int = 0  # snapshots received and handed to local sockets
+    compute_errors: int = 0
+    redis_errors: int = 0
+
+
+class SharedBookFeed:
+    """
+    Top-of-book snapshots shared by all workers through Redis.
+
+    Workers only report which symbols changed (`mark_dirty`). The worker
+    holding the leader lock computes a snapshot of each changed symbol once,
+    stores it under `orderbook:snapshot:{id}` and publishes it on the channel
+    of the same name; every worker relays what it receives to its own
+    WebSocket clients. Snapshots are aggregated by the DB, which has every
+    worker's orders, once per change rather than once per worker.
+    """
+
+    def __init__(self, redis_url: Optional[str], leader_ttl: float, interval: float):
+        self.leader_ttl = leader_ttl
+        self.interval = interval
+        self._redis = (
+            redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+            if redis_url
+            else None
+        )
+        self._lock = (
+            self._redis.lock(LEADER_KEY, timeout=leader_ttl)
+            if self._redis is not None
+            else None
+        )
+        self.stats = FeedStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    async def mark_dirty(self, symbol_ids: Iterable[int]):
+        symbol_ids = list(symbol_ids)
+        if not symbol_ids:
+            return
+        try:
+            await self._redis.sadd(DIRTY_KEY, *symbol_ids)
+        except redis.RedisError:
+            self.stats.redis_errors += 1
+
+    async def get(self, symbol_id: int) -> Optional[str]:
+        """Latest published snapshot (JSON text), None if none or Redis is down."""
+        try:
+            return await self._redis.get(SNAPSHOT_PREFIX + str(symbol_id))
+        except redis.RedisError:
+            self.stats.redis_errors += 1
+            return None
+
+    async def _elect(self) -> bool:
+        """Take or keep the leader lock; the TTL hands it over if we die."""
+        if self.stats.leader:
+            try:
+                await self._lock.reacquire()
+            except LockError:
+                self.stats.leader = False
+        else:
+            self.stats.leader = await self._lock.acquire(blocking=False)
+        return self.stats.leader
+
+    async def _pop_dirty(self):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.smembers(DIRTY_KEY)
+            pipe.delete(DIRTY_KEY)
+            members, _ = await pipe.execute()
+        return sorted(int(m) for m in members)
+
+    async def run_leader(self, compute: Callable[[int], Awaitable[str]]):
+        """
+        Compete for leadership forever; while leader, publish a snapshot of
+        every symbol marked dirty, at most once per interval.
+        """
+        while True:
+            try:
+                if await self._elect():
+                    for symbol_id in await self._pop_dirty():
+                        try:
+                            text = await compute(symbol_id)
+                        except Exception:
+                            # e.g. DB hiccup: retry the symbol next round
+                            self.stats.compute_errors += 1
+                            await self.mark_dirty([symbol_id])
+                            continue
+                        key = SNAPSHOT_PREFIX + str(symbol_id)
+                        async with self._redis.pipeline(transaction=False) as pipe:
+                            pipe.set(key, text)
+                            pipe.publish(key, text)
+                            await pipe.execute()
+                        self.stats.published += 1
+            except redis.RedisError:
+                self.stats.redis_errors += 1
+            await asyncio.sleep(self.interval)
+
+    async def run_relay(self, deliver: Callable[[int, str], Awaitable[None]]):
+        """Hand every published snapshot to `deliver(symbol_id, text)`."""
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(SNAPSHOT_PREFIX + "*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    symbol_id = int(message["channel"][len(SNAPSHOT_PREFIX):])
+                    self.stats.relayed += 1
+                    await deliver(symbol_id, message["data"])
+            except redis.RedisError:
+                self.stats.redis_errors += 1
+                await asyncio.sleep(self.interval)  # then resubscribe
+            finally:
+                await pubsub.aclose()
+
+    async def close(self):
+        if self._redis is None:
+            return
+        if self.stats.leader:
+            try:
+                await self._lock.release()
+            except (LockError, redis.RedisError):
+                pass
+            self.stats.leader = False
+        await self._redis.aclose()
+
+    def get_stats(self) -> dict:
+        return asdict(self.stats)
+
+
+book_feed = SharedBookFeed(
+    ORDERBOOK_REDIS_URL, ORDERBOOK_LEADER_TTL, ORDERBOOK_PUBLISH_INTERVAL
+)
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.commit_hooks import after_commit
+from app.models import Candle
+from app.ticks import tick_sizes
+
+# Candle intervals kept for every symbol, label -> seconds
+INTERVALS = {"1s": 1, "1m": 60, "5m": 300, "1h": 3600}
+LABELS = {seconds: label for label, seconds in INTERVALS.items()}
+
+_EPOCH = datetime(1970, 1, 1)
+_listeners: List[Callable[[int, List[dict]], None]] = []
+
+
+def add_listener(listener: Callable[[int, List[dict]], None]):
+    """Called with (symbol_id, candles) after each commit that changed candles."""
+    _listeners.append(listener)
+
+
+def utc_naive(ts: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    offset = int((utc_naive(ts) - _EPOCH).total_seconds()) // seconds * seconds
+    return _EPOCH + timedelta(seconds=offset)
+
+
+def aggregate(symbol_id: int, trades: Iterable[Tuple[datetime, int, int]]) -> List[dict]:
+    """
+    (timestamp, price_ticks, quantity) of trades in execution order ->
+    one candle row per interval and bucket they fall into.
+    """
+    rows: Dict[Tuple[int, datetime], dict] = {}
+    for ts, price, quantity in trades:
+        for seconds in INTERVALS.values():
+            start = bucket_start(ts, seconds)
+            row = rows.get((seconds, start))
+            if row is None:
+                rows[(seconds, start)] = {
+                    "symbol_id": symbol_id, "interval": seconds, "start": start,
+                    "open_ticks": price, "high_ticks": price, "low_ticks": price,
+                    "close_ticks": price, "volume": quantity, "trades": 1,
+                }
+                continue
+            row["high_ticks"] = max(row["high_ticks"], price)
+            row["low_ticks"] = min(row["low_ticks"], price)
+            row["close_ticks"] = price
+            row["volume"] += quantity
+            row["trades"] += 1
+    return list(rows.values())
+
+
+def candle_entry(candle) -> dict:
+    to_price = tick_sizes.to_price
+    return {
+        "symbol_id": candle.symbol_id,
+        "interval": LABELS[candle.interval],
+        "start": candle.start.isoformat(),
+        "open": to_price(candle.symbol_id, candle.open_ticks),
+        "high": to_price(candle.symbol_id, candle.high_ticks),
+        "low": to_price(candle.symbol_id, candle.low_ticks),
+        "close": to_price(candle.symbol_id, candle.close_ticks),
+        "volume": candle.volume,
+        "trades": candle.trades,
+    }
+
+
+def update_candles(db: Session, symbol_id: int, trades: List[Tuple[datetime, int, int]]):
+    """
+    Fold one match's trades into the candles of every interval with a single
+    upsert, in the caller's transaction. Callers are serialized per symbol
+    (sequencer), so `close` taken from the newest trades is the latest price.
+    """
+    rows = aggregate(symbol_id, trades)
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        greatest, least = func.greatest, func.least
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+        greatest, least = func.max, func.min  # scalar max()/min() in SQLite
+
+    stmt = insert(Candle).values(rows)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Candle.symbol_id, Candle.interval, Candle.start],
+        set_={
+            "high_ticks": greatest(Candle.high_ticks, new.high_ticks),
+            "low_ticks": least(Candle.low_ticks, new.low_ticks),
+            "close_ticks": new.close_ticks,
+            "volume": Candle.volume + new.volume,
+            "trades": Candle.trades + new.trades,
+        },
+    ).returning(*Candle.__table__.c)
+    candles = [candle_entry(row) for row in db.execute(stmt)]
+    after_commit(db, _publish, symbol_id, candles)
+
+
+def _publish(symbol_id: int, candles: List[dict]):
+    for listener in _listeners:
+        listener(symbol_id, candles)
@@ -0,0 +1,52 @@
+import logging
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+logger = logging.getLogger(__name__)
+
+_KEY = "after_commit"  # Session.info key
+
+
+def after_commit(db: Session, fn: Callable, *args):
+    """
+    Run `fn(*args)` once `db` commits its current transaction, on the
+    committing thread; dropped if it rolls back instead. For side effects
+    (feeds, caches) that must never show uncommitted data. Staged inside a
+    savepoint, it is dropped if that savepoint rolls back and otherwise
+    still waits for the outermost commit. An exception from `fn` is logged:
+    the transaction is durable by then, so commit() must not raise.
+    """
+    transaction = db.get_nested_transaction() or db.get_transaction()
+    db.info.setdefault(_KEY, []).append((transaction, fn, args))
+
+
+def _within(transaction: SessionTransaction, ancestor: SessionTransaction) -> bool:
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def _run(session: Session):
+    if session.in_nested_transaction():
+        return  # a savepoint was released, the real commit is still to come
+    for _, fn, args in session.info.pop(_KEY, ()):
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception("after-commit hook %r failed", fn)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop(session: Session, previous_transaction: SessionTransaction):
+    # Fires for savepoint and outermost rollbacks alike
+    if previous_transaction.parent is None:
+        session.info.pop(_KEY, None)
+        return
+    staged = session.info.get(_KEY)
+    if staged:
+        staged[:] = [s for s in staged if not _within(s[0], previous_transaction)]
@@ -0,0 +1,71 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict
+
+# Opt-in: new orders of a symbol queued together share one transaction
+ORDER_GROUP_COMMIT = os.getenv("ORDER_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+# How long the first order of a group waits for more, and the group size cap
+ORDER_GROUP_COMMIT_WINDOW_MS = float(os.getenv("ORDER_GROUP_COMMIT_WINDOW_MS", "2"))
+ORDER_GROUP_COMMIT_MAX = int(os.getenv("ORDER_GROUP_COMMIT_MAX", "64"))
+
+
+@dataclass
+class CommitStats:
+    commits: int = 0
+    orders: int = 0
+    max_batch: int = 0
+    last_batch: int = 0
+    failed: int = 0  # commits that raised; every order in them failed
+    total_commit: float = 0.0
+    max_commit: float = 0.0
+    last_commit: float = 0.0
+
+
+class OrderCommitStats:
+    """
+    Orders per commit and commit latency per symbol for `/orders/new`,
+    grouped or not, so the two modes can be compared.
+    """
+
+    def __init__(self):
+        self._stats: Dict[int, CommitStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, symbol_id: int, orders: int, seconds: float):
+        with self._lock:
+            s = self._stats.setdefault(symbol_id, CommitStats())
+            s.commits += 1
+            s.orders += orders
+            s.last_batch = orders
+            s.max_batch = max(s.max_batch, orders)
+            s.total_commit += seconds
+            s.last_commit = seconds
+            s.max_commit = max(s.max_commit, seconds)
+
+    def record_failure(self, symbol_id: int):
+        with self._lock:
+            self._stats.setdefault(symbol_id, CommitStats()).failed += 1
+
+    def stats(self) -> Dict[int, dict]:
+        """Per symbol, batch sizes and commit latency (ms)."""
+        with self._lock:
+            return {
+                symbol_id: {
+                    "commits": s.commits,
+                    "orders": s.orders,
+                    "failed": s.failed,
+                    "avg_batch": round(s.orders / s.commits, 2) if s.commits else 0.0,
+                    "max_batch": s.max_batch,
+                    "last_batch": s.last_batch,
+                    "avg_commit_ms": round(s.total_commit / s.commits * 1000, 3)
+                    if s.commits
+                    else 0.0,
+                    "max_commit_ms": round(s.max_commit * 1000, 3),
+                    "last_commit_ms": round(s.last_commit * 1000, 3),
+                }
+                for symbol_id, s in self._stats.items()
+            }
+
+
+commit_stats = OrderCommitStats()
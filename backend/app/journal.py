@@ -0,0 +1,627 @@
+"""Append-only order event journal with checkpoints, replayed at startup (see README)."""
+import argparse
+import fcntl
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.commit_hooks import after_commit
+from app.models import Order
+from app.orderbook import OPEN_STATUSES, OrderBook, RestingOrder, order_books
+from app.ticks import tick_sizes
+
+# Directory of the journal; unset = no journal, books load from `orders`
+ORDER_JOURNAL_DIR = os.getenv("ORDER_JOURNAL_DIR")
+# Records between checkpoints; each checkpoint starts a new segment
+ORDER_JOURNAL_CHECKPOINT_EVERY = int(os.getenv("ORDER_JOURNAL_CHECKPOINT_EVERY", "100000"))
+
+logger = logging.getLogger(__name__)
+
+
+class OrderEvent(NamedTuple):
+    """An order accepted (or re-entered by an amend), in its state after matching."""
+
+    order_id: int
+    symbol_id: int
+    user_id: int
+    side: str
+    type: str
+    price: int  # ticks
+    quantity: int
+    exec_qty: int
+    timestamp: datetime
+    status: str
+
+
+class FillEvent(NamedTuple):
+    """One execution against a resting order."""
+
+    order_id: int  # resting order
+    symbol_id: int
+    trade_id: int
+    aggressor_id: int
+    price: int  # ticks
+    quantity: int
+    exec_qty: int  # resting order's executed quantity after this fill
+
+
+class CancelEvent(NamedTuple):
+    order_id: int
+    symbol_id: int
+
+
+class ReduceEvent(NamedTuple):
+    """Quantity of a resting order lowered in place (keeps its priority)."""
+
+    order_id: int
+    symbol_id: int
+    quantity: int
+
+
+# Record: <length:u32><crc32:u32> then body = <seq:u64><type:u8><payload>
+_FRAME = struct.Struct("<II")
+_HEAD = struct.Struct("<QB")
+_CODES = {OrderEvent: 1, FillEvent: 2, CancelEvent: 3, ReduceEvent: 4}
+_EVENTS = {code: cls for cls, code in _CODES.items()}
+_PAYLOADS = {
+    1: struct.Struct("<qiqccqqqqB"),
+    2: struct.Struct("<qiqqqqq"),
+    3: struct.Struct("<qi"),
+    4: struct.Struct("<qiq"),
+}
+_STATUSES = ("pending", "partially_filled", "filled", "cancelled")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Checkpoint: header, per symbol a book header and its orders, crc32 trailer
+_CKPT_MAGIC = b"OJC1"
+_CKPT_HEAD = struct.Struct("<4sQI")  # magic, seq, symbols
+_CKPT_BOOK = struct.Struct("<iBqI")  # symbol_id, has ltp, ltp, orders
+_CKPT_ORDER = struct.Struct("<qqcqqqq")  # id, user_id, side, price, quantity, exec_qty, timestamp
+_CKPT_TAIL = struct.Struct("<I")
+
+_SEGMENT = "segment-{:020d}.log"  # named after its first sequence number
+_CHECKPOINT = "checkpoint-{:020d}.bin"  # named after the last record it covers
+_LOCK = "LOCK"
+_DIRTY = "DIRTY"  # present while a process has the journal open
+_CHECKPOINTS_KEPT = 2
+
+
+def _micros(ts: datetime) -> int:
+    return (ts - _EPOCH) // _MICROSECOND
+
+
+def _from_micros(micros: int) -> datetime:
+    return _EPOCH + micros * _MICROSECOND
+
+
+def encode_record(seq: int, event) -> bytes:
+    code = _CODES[type(event)]
+    if code == 1:
+        payload = _PAYLOADS[1].pack(
+            event.order_id, event.symbol_id, event.user_id, event.side.encode(),
+            event.type.encode(), event.price, event.quantity, event.exec_qty,
+            _micros(event.timestamp), _STATUSES.index(event.status),
+        )
+    else:
+        payload = _PAYLOADS[code].pack(*event)
+    body = _HEAD.pack(seq, code) + payload
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def _decode_body(body) -> Tuple[int, object]:
+    seq, code = _HEAD.unpack_from(body)
+    fields = _PAYLOADS[code].unpack_from(body, _HEAD.size)
+    if code == 1:
+        (order_id, symbol_id, user_id, side, type_, price, quantity, exec_qty,
+         ts, status) = fields
+        return seq, OrderEvent(
+            order_id, symbol_id, user_id, side.decode(), type_.decode(), price,
+            quantity, exec_qty, _from_micros(ts), _STATUSES[status],
+        )
+    return seq, _EVENTS[code](*fields)
+
+
+def read_segment(path: str) -> Iterator[Tuple[int, object]]:
+    """
+    (seq, event) of every intact record of a segment. Stops at the first
+    torn or corrupt record, i.e. a write cut short by a crash.
+    """
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, offset)
+        start, end = offset + _FRAME.size, offset + _FRAME.size + length
+        if end > len(data) or length < _HEAD.size:
+            return
+        body = data[start:end]
+        if zlib.crc32(body) != crc:
+            return
+        yield _decode_body(body)
+        offset = end
+
+
+class JournalState:
+    """Resting limit orders (time priority order) and last price per symbol, as of `seq`."""
+
+    def __init__(self, seq: int = 0):
+        self.seq = seq
+        self.books: Dict[int, "OrderedDict[int, RestingOrder]"] = {}
+        self.ltp: Dict[int, int] = {}
+
+    def apply(self, seq: int, event):
+        orders = self.books.get(event.symbol_id)
+        if orders is None:
+            orders = self.books[event.symbol_id] = OrderedDict()
+        if type(event) is OrderEvent:
+            orders.pop(event.order_id, None)  # an amended order re-enters at the back
+            if (
+                event.type == "L"
+                and event.status in OPEN_STATUSES
+                and event.exec_qty < event.quantity
+            ):
+                orders[event.order_id] = RestingOrder(
+                    event.order_id, event.user_id, event.side, event.price,
+                    event.quantity, event.exec_qty, event.timestamp,
+                )
+        elif type(event) is FillEvent:
+            self.ltp[event.symbol_id] = event.price
+            order = orders.get(event.order_id)
+            if order is not None:
+                order.exec_qty = event.exec_qty
+                if order.remaining <= 0:
+                    del orders[event.order_id]
+        elif type(event) is CancelEvent:
+            orders.pop(event.order_id, None)
+        else:
+            order = orders.get(event.order_id)
+            if order is not None:
+                order.quantity = event.quantity
+        self.seq = seq
+
+    @classmethod
+    def from_books(cls, books: Dict[int, OrderBook], seq: int) -> "JournalState":
+        state = cls(seq)
+        for symbol_id, book in books.items():
+            with book.lock:
+                orders = state.books[symbol_id] = OrderedDict()
+                # Level by level: each level's queue keeps its order
+                for side in (book.bids, book.asks):
+                    for level in side.iter_levels():
+                        for o in level.orders.values():
+                            orders[o.id] = replace(o)
+                if book.ltp is not None:
+                    state.ltp[symbol_id] = book.ltp
+        return state
+
+    def to_books(self) -> Dict[int, OrderBook]:
+        books = {}
+        for symbol_id in self.books.keys() | self.ltp.keys():
+            book = books[symbol_id] = OrderBook(symbol_id, tick_sizes.get(symbol_id))
+            for o in self.books.get(symbol_id, {}).values():
+                book.add(replace(o))  # the live book mutates its orders
+            book.ltp = self.ltp.get(symbol_id)
+        return books
+
+
+def _fsync_dir(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def write_checkpoint(directory: str, state: JournalState) -> str:
+    parts = [_CKPT_HEAD.pack(_CKPT_MAGIC, state.seq, len(state.books.keys() | state.ltp.keys()))]
+    for symbol_id in sorted(state.books.keys() | state.ltp.keys()):
+        orders = state.books.get(symbol_id, {})
+        ltp = state.ltp.get(symbol_id)
+        parts.append(_CKPT_BOOK.pack(symbol_id, ltp is not None, ltp or 0, len(orders)))
+        parts.extend(
+            _CKPT_ORDER.pack(
+                o.id, o.user_id, o.side.encode(), o.price, o.quantity, o.exec_qty,
+                _micros(o.timestamp),
+            )
+            for o in orders.values()
+        )
+    data = b"".join(parts)
+    data += _CKPT_TAIL.pack(zlib.crc32(data))
+
+    path = os.path.join(directory, _CHECKPOINT.format(state.seq))
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _write_all(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+    _fsync_dir(directory)
+
+    for old in sorted(glob.glob(os.path.join(directory, "checkpoint-*.bin")))[:-_CHECKPOINTS_KEPT]:
+        os.remove(old)
+    return path
+
+
+def read_checkpoint(path: str) -> Optional[JournalState]:
+    """The checkpoint's state, None if it is damaged."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _CKPT_HEAD.size + _CKPT_TAIL.size:
+        return None
+    (crc,) = _CKPT_TAIL.unpack_from(data, len(data) - _CKPT_TAIL.size)
+    if zlib.crc32(data[: -_CKPT_TAIL.size]) != crc:
+        return None
+    magic, seq, symbols = _CKPT_HEAD.unpack_from(data)
+    if magic != _CKPT_MAGIC:
+        return None
+
+    state = JournalState(seq)
+    offset = _CKPT_HEAD.size
+    for _ in range(symbols):
+        symbol_id, has_ltp, ltp, count = _CKPT_BOOK.unpack_from(data, offset)
+        offset += _CKPT_BOOK.size
+        if has_ltp:
+            state.ltp[symbol_id] = ltp
+        orders = state.books[symbol_id] = OrderedDict()
+        for _ in range(count):
+            order_id, user_id, side, price, quantity, exec_qty, ts = _CKPT_ORDER.unpack_from(
+                data, offset
+            )
+            offset += _CKPT_ORDER.size
+            orders[order_id] = RestingOrder(
+                order_id, user_id, side.decode(), price, quantity, exec_qty, _from_micros(ts)
+            )
+    return state
+
+
+def _segments(directory: str) -> List[Tuple[int, str]]:
+    paths = glob.glob(os.path.join(directory, "segment-*.log"))
+    return sorted((int(os.path.basename(p)[8:-4]), p) for p in paths)
+
+
+def read_journal(directory: str, after: int = 0) -> Iterator[Tuple[int, object]]:
+    """(seq, event) of the records after seq `after`, in order."""
+    segments = _segments(directory)
+    for i, (first, path) in enumerate(segments):
+        if i + 1 < len(segments) and segments[i + 1][0] <= after + 1:
+            continue  # entirely covered
+        for seq, event in read_segment(path):
+            if seq > after:
+                yield seq, event
+
+
+@dataclass
+class Replay:
+    state: JournalState
+    checkpoint_seq: Optional[int]  # None: no usable checkpoint, state is empty
+    records: int = 0  # tail records applied
+
+
+def replay(directory: str) -> Replay:
+    """State at the end of the journal: the newest intact checkpoint plus the records after it."""
+    state, checkpoint_seq = JournalState(), None
+    for path in sorted(glob.glob(os.path.join(directory, "checkpoint-*.bin")), reverse=True):
+        loaded = read_checkpoint(path)
+        if loaded is not None:
+            state, checkpoint_seq = loaded, loaded.seq
+            break
+
+    result = Replay(state, checkpoint_seq)
+    for seq, event in read_journal(directory, state.seq):
+        if seq != state.seq + 1:
+            break  # gap: nothing after it can be applied
+        state.apply(seq, event)
+        result.records += 1
+    return result
+
+
+@dataclass
+class JournalStats:
+    source: str = ""  # where books were loaded from at startup: "journal" or "orders"
+    load_ms: float = 0.0
+    replayed: int = 0  # tail records applied at startup
+    records: int = 0
+    batches: int = 0  # one write + fsync each
+    bytes: int = 0
+    max_batch: int = 0
+    last_fsync_ms: float = 0.0
+    checkpoints: int = 0
+    write_errors: int = 0
+
+
+class OrderJournal:
+    """
+    Journal writer. `record*` calls stage events on the caller's Session;
+    they get a sequence number when it commits (on the committing thread, so
+    per symbol they follow the sequencer's order) and are dropped if it rolls
+    back. The writer thread keeps its own JournalState up to date with what
+    it wrote, which is what checkpoints are taken from: no live book is
+    locked and a checkpoint matches its sequence number exactly.
+    """
+
+    def __init__(self, directory: Optional[str], checkpoint_every: int):
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self.stats = JournalStats()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._written = threading.Condition(self._lock)
+        self._pending: List[Tuple[int, object]] = []
+        self._seq = 0  # last assigned
+        self._durable_seq = 0  # last fsynced
+        self._handled_seq = 0  # last written, or dropped after a write error
+        self._state: Optional[JournalState] = None
+        self._checkpoint_seq = 0
+        self._fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closing = False
+        self._closed = False
+        self._failed = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @property
+    def failed(self) -> bool:
+        """A write failed: nothing more is journaled until restart."""
+        return self._failed
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # -- recording, inside the caller's transaction --
+
+    def record(self, db: Session, events: list):
+        if self.enabled and events:
+            after_commit(db, self._append, events)
+
+    def record_order(self, db: Session, order: Order):
+        if self.enabled:
+            self.record(db, [OrderEvent(
+                order.id, order.symbol_id, order.user_id, order.side, order.type,
+                order.price_ticks, order.quantity, order.exec_qty or 0,
+                order.timestamp, getattr(order.status, "value", order.status),
+            )])
+
+    def record_cancels(self, db: Session, symbol_id: int, order_ids: List[int]):
+        if self.enabled:
+            self.record(db, [CancelEvent(order_id, symbol_id) for order_id in order_ids])
+
+    def record_reduce(self, db: Session, order: Order, quantity: int):
+        if self.enabled:
+            self.record(db, [ReduceEvent(order.id, order.symbol_id, quantity)])
+
+    def _append(self, events: list):
+        with self._lock:
+            if self._thread is None:
+                if self._closed:
+                    # Committed after close: the next start can't trust the journal
+                    open(self._path(_DIRTY), "a").close()
+                return
+            for event in events:
+                self._seq += 1
+                self._pending.append((self._seq, event))
+            self._wake.notify()
+
+    # -- lifecycle --
+
+    def open(self, db: Session):
+        """
+        Load every symbol's book into `order_books` and start the writer.
+        After a clean shutdown the books come from the last checkpoint plus
+        the journal tail; otherwise (first start, crash) from `orders`, and
+        that state becomes the new checkpoint.
+        """
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(self._path(_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            raise RuntimeError(
+                f"Order journal {self.directory} is in use by another process: "
+                "ORDER_JOURNAL_DIR needs a single worker process, or one directory per worker"
+            )
+
+        result = replay(self.directory)
+        state = result.state
+        tick_sizes.load_all(db)
+        if result.checkpoint_seq is None or os.path.exists(self._path(_DIRTY)):
+            order_books.load_all(db)
+            state = JournalState.from_books(order_books.loaded(), state.seq)
+            write_checkpoint(self.directory, state)
+            self.stats.source = "orders"
+        else:
+            order_books.install(state.to_books())
+            self.stats.source = "journal"
+            self.stats.replayed = result.records
+
+        self._state = state
+        self._seq = self._durable_seq = self._handled_seq = self._checkpoint_seq = state.seq
+        self._open_segment()
+        open(self._path(_DIRTY), "a").close()
+        _fsync_dir(self.directory)
+        self.stats.load_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        self._thread = threading.Thread(target=self._run, name="order-journal", daemon=True)
+        self._thread.start()
+
+    def _open_segment(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        # Anything already in it is past the last intact record: a torn write
+        self._fd = os.open(
+            self._path(_SEGMENT.format(self._state.seq + 1)),
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            0o644,
+        )
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closing:
+                    self._wake.wait()
+                batch, self._pending = self._pending, []
+            if not batch:
+                return  # closing and everything is written
+
+            if not self._failed:
+                data = b"".join(encode_record(seq, event) for seq, event in batch)
+                started = time.perf_counter()
+                try:
+                    _write_all(self._fd, data)
+                    os.fsync(self._fd)
+                except OSError as e:
+                    # Left DIRTY at close: the next start loads from `orders`
+                    self._failed = True
+                    self.stats.write_errors += 1
+                    logger.error(
+                        "Order journal write failed, order changes are refused until restart: %s", e
+                    )
+                else:
+                    self.stats.last_fsync_ms = round((time.perf_counter() - started) * 1000, 3)
+                    self.stats.records += len(batch)
+                    self.stats.batches += 1
+                    self.stats.bytes += len(data)
+                    self.stats.max_batch = max(self.stats.max_batch, len(batch))
+                    for seq, event in batch:
+                        self._state.apply(seq, event)
+                    with self._lock:
+                        self._durable_seq = self._state.seq
+                    if self._state.seq - self._checkpoint_seq >= self.checkpoint_every:
+                        self._checkpoint()
+
+            with self._lock:
+                self._handled_seq = batch[-1][0]
+                self._written.notify_all()
+
+    def _checkpoint(self):
+        write_checkpoint(self.directory, self._state)
+        self._checkpoint_seq = self._state.seq
+        self.stats.checkpoints += 1
+        self._open_segment()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every record appended so far is written (see write_errors)."""
+        with self._lock:
+            target = self._seq
+            return self._written.wait_for(lambda: self._handled_seq >= target, timeout)
+
+    def close(self):
+        """Write what's pending, checkpoint and mark the journal clean."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._closing = True
+            self._wake.notify()
+        self._thread.join()
+        with self._lock:
+            self._thread = None
+            self._closed = True
+        if not self._failed:
+            self._checkpoint()  # the next start replays nothing
+            os.remove(self._path(_DIRTY))
+            _fsync_dir(self.directory)
+        os.close(self._fd)
+        self._fd = None
+        os.close(self._lock_fd)  # releases the flock
+        self._lock_fd = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **asdict(self.stats),
+                "seq": self._seq,
+                "durable_seq": self._durable_seq,
+                "pending": len(self._pending),
+                "failed": self._failed,
+            }
+
+
+journal = OrderJournal(ORDER_JOURNAL_DIR, ORDER_JOURNAL_CHECKPOINT_EVERY)
+
+
+def _event_json(seq: int, event) -> str:
+    fields = event._asdict()
+    if "timestamp" in fields:
+        fields["timestamp"] = fields["timestamp"].isoformat()
+    kind = type(event).__name__[: -len("Event")].lower()
+    return json.dumps({"seq": seq, "event": kind, **fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.journal", description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["replay", "dump", "checkpoint"])
+    parser.add_argument("directory", nargs="?", default=ORDER_JOURNAL_DIR)
+    parser.add_argument("--after", type=int, default=0, help="dump: records after this seq")
+    args = parser.parse_args()
+    if not args.directory:
+        parser.error("no journal directory (argument or ORDER_JOURNAL_DIR)")
+
+    if args.command == "dump":
+        for seq, event in read_journal(args.directory, args.after):
+            print(_event_json(seq, event))
+        return
+
+    started = time.perf_counter()
+    result = replay(args.directory)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+    state = result.state
+    if args.command == "checkpoint":
+        lock_fd = os.open(os.path.join(args.directory, _LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            parser.error("journal is open in a running process")
+        print(write_checkpoint(args.directory, state))
+        os.close(lock_fd)
+        return
+
+    symbols = {}
+    for symbol_id in sorted(state.books.keys() | state.ltp.keys()):
+        orders = state.books.get(symbol_id, {}).values()
+        bids = [o.price for o in orders if o.side == "B"]
+        asks = [o.price for o in orders if o.side == "S"]
+        symbols[symbol_id] = {
+            "bids": len(bids),
+            "asks": len(asks),
+            "best_bid_ticks": max(bids, default=None),
+            "best_ask_ticks": min(asks, default=None),
+            "ltp_ticks": state.ltp.get(symbol_id),
+        }
+    print(json.dumps({
+        "checkpoint_seq": result.checkpoint_seq,
+        "last_seq": state.seq,
+        "replayed": result.records,
+        "elapsed_ms": elapsed_ms,
+        "clean": not os.path.exists(os.path.join(args.directory, _DIRTY)),
+        "symbols": symbols,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,52 @@
+import logging
+import os
+
 import redis.asyncio as redis
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
+from sqlalchemy import inspect
 from .defaults import create_default_symbols, create_default_user
 
-from . import models
-from .database import engine, SessionLocal
-from .routers import auth, orders, symbols, trades, ws_orderbook
+from . import metrics, models, utils
+from .book_feed import book_feed
+from .database import async_engine, engine, SessionLocal
+from .journal import journal
+from .orderbook import order_books
+from .profiler import ProfilingMiddleware, profiler
+from .routers import auth, market, matching, monitoring, orders, symbols, trades, ws_orderbook, ws_trades
+from .sequencer import sequencer
 
 # origins = ["http://localhost:3000"]
 origins = ["https://localhost:3000"]
 # origins = ["*"]
 
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic")
+
+logger = logging.getLogger(__name__)
+
+
+def create_tables():
+    """
+    Create the tables of a fresh database and stamp it at the latest
+    migration; an existing database is left to `alembic upgrade head`.
+    """
+    script = ScriptDirectory(ALEMBIC_DIR)
+    head = script.get_current_head()
+    with engine.begin() as conn:
+        context = MigrationContext.configure(conn)
+        if not set(inspect(conn).get_table_names()) & set(models.Base.metadata.tables):
+            models.Base.metadata.create_all(bind=conn)
+            context.stamp(script, head)
+        elif context.get_current_revision() != head:
+            logger.warning("Database schema is not at migration %s, run `alembic upgrade head`", head)
+
+
+create_tables()
 
 app = FastAPI(
     title="Trading App API",
@@ -29,29 +60,58 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine)
 
 app.include_router(auth.router)
 app.include_router(symbols.router)
 app.include_router(orders.router)
 app.include_router(trades.router)
 app.include_router(ws_orderbook.router)
+app.include_router(ws_trades.router)
+app.include_router(market.router)
+app.include_router(monitoring.router)
+
+@app.on_event("startup")
+def check_matching_engine():
+    matching.check_engine()  # refuses the memory engine with several workers
+
 
 @app.on_event("startup")
 def startup_populate():
     create_default_symbols()
     create_default_user()
 
-@app.on_event("startup")
-async def start_orderbook_updates():
-    import asyncio
 
+@app.on_event("startup")
+def load_order_books():
     db = SessionLocal()
     try:
-        symbol_ids = [s.id for s in db.query(models.Symbol.id).all()]
+        if journal.enabled:
+            journal.open(db)  # last checkpoint + journal tail
+        else:
+            order_books.load_all(db)
     finally:
         db.close()
 
-    asyncio.create_task(ws_orderbook.update_order_book(symbol_ids))
+
+@app.on_event("startup")
+async def start_orderbook_updates():
+    import asyncio
+
+    if book_feed.enabled:
+        # One publisher for all workers, elected through a Redis lock
+        asyncio.create_task(ws_orderbook.report_book_changes())
+        asyncio.create_task(book_feed.run_leader(ws_orderbook.compute_snapshot))
+        asyncio.create_task(book_feed.run_relay(ws_orderbook.relay_snapshot))
+    else:
+        asyncio.create_task(ws_orderbook.update_order_book())
+    asyncio.create_task(ws_orderbook.push_order_book_deltas())
+    ws_trades.trade_feed.bind(asyncio.get_running_loop())
+    market.candle_feed.bind(asyncio.get_running_loop())
+    asyncio.create_task(metrics.probe_loop_lag())
 
 
 @app.on_event("startup")
@@ -60,6 +120,35 @@ async def startup():
     await FastAPILimiter.init(r)
 
 
+@app.on_event("shutdown")
+async def stop_sequencer():
+    await sequencer.stop()
+
+
+@app.on_event("shutdown")
+def stop_profiler():
+    profiler.close()  # writes out a window in progress
+
+
+@app.on_event("shutdown")
+def close_journal():
+    journal.close()
+
+
+@app.on_event("shutdown")
+async def close_book_feed():
+    await book_feed.close()
+
+
+@app.on_event("shutdown")
+def stop_bcrypt_pool():
+    utils.shutdown_pool()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
 
 @app.get("/")
 def root():
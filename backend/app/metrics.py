@@ -0,0 +1,314 @@
+"""In-process metrics in the Prometheus text format, served from `/metrics`."""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; request and DB time from sub-millisecond up to a stuck request
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+FILL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+LOOP_LAG_INTERVAL = 0.5
+
+# (labels, value) pairs of one metric family, labels as {name: value}
+Samples = Iterable[Tuple[Dict[str, object], float]]
+# (name, type, help, samples) produced by a collector at scrape time
+Family = Tuple[str, str, str, Samples]
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for these label values, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        # Unlabelled metrics have a single child
+        return self.labels()
+
+    def expose(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in list(self._children.items()):
+            self._expose_child(lines, dict(zip(self.labelnames, values)), child)
+
+    def _expose_child(self, lines: List[str], labels: Dict[str, object], child):
+        lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.value)}")
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: threading.Lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...], lock: threading.Lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = lock
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Buckets(self.buckets, self._lock)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _expose_child(self, lines: List[str], labels: Dict[str, object], child: _Buckets):
+        with self._lock:
+            counts, total = list(child.counts), child.sum
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            le = _format_labels({**labels, "le": _format_value(bound)})
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[Family]]):
+        """`collect()` returns metric families read at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            metric.expose(lines)
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"),
+))
+http_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in database statements per HTTP request.",
+    ("method", "route"),
+))
+http_rate_limited = registry.register(Counter(
+    "http_requests_rate_limited_total", "Requests rejected by the rate limiter (429).",
+    ("method", "route"),
+))
+match_seconds = registry.register(Histogram(
+    "match_duration_seconds", "match_order time, matching through flush.", ("engine",),
+))
+fills_per_order = registry.register(Histogram(
+    "match_fills_per_order", "Fills generated by one incoming order.", ("engine",),
+    buckets=FILL_BUCKETS,
+))
+ws_send_seconds = registry.register(Histogram(
+    "ws_broadcast_send_seconds", "Broadcast queued-to-sent time per client send.",
+    ("symbol_id",),
+))
+loop_seconds = registry.register(Histogram(
+    "background_loop_iteration_seconds", "One pass of a background loop.", ("loop",),
+))
+loop_lag_seconds = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer.",
+))
+
+
+# ---- DB time per request ----
+
+# One-slot accumulator of the current request, shared with the threads and
+# sequencer jobs running on its behalf; None outside a request
+_db_time: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar(
+    "db_time", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    acc = _db_time.get()
+    started = getattr(context, "_metrics_started", None)
+    if acc is not None and started is not None:
+        acc[0] += time.perf_counter() - started
+
+
+def instrument_engine(engine):
+    """Charge statement time on `engine` (sync, or an AsyncEngine's) to the request."""
+    from sqlalchemy import event
+
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---- HTTP ----
+
+class MetricsMiddleware:
+    """
+    Latency and DB time of each HTTP request, by route template so path
+    parameters don't multiply the series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]  # unless a response starts
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        acc = [0.0]
+        token = _db_time.set(acc)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _db_time.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_seconds.labels(method, path, status[0]).observe(elapsed)
+            http_db_seconds.labels(method, path).observe(acc[0])
+            if status[0] == 429:
+                http_rate_limited.labels(method, path).inc()
+
+
+# ---- Background loops ----
+
+class LoopTimer:
+    """`with timer:` around one pass of a background loop."""
+
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, name: str):
+        self._child = loop_seconds.labels(name)
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._started)
+
+
+async def probe_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """Sleep `interval` over and over; any extra delay is time the loop was busy."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, loop.time() - expected))
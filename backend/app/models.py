@@ -1,11 +1,12 @@
 import enum
 from datetime import datetime
 
-from sqlalchemy import (Column, DateTime, Enum, Float, ForeignKey, Integer,
-                        String)
+from sqlalchemy import (BigInteger, Column, DateTime, Enum, ForeignKey, Index,
+                        Integer, Numeric, String, event, text)
 from sqlalchemy.orm import relationship
 
 from .database import Base
+from .ticks import DEFAULT_TICK_SIZE, tick_sizes
 
 
 class User(Base):
@@ -32,11 +33,25 @@ class Symbol(Base):
     id = Column(Integer, primary_key=True, index=True)
     ticker = Column(String, unique=True, index=True, nullable=False)
     name = Column(String, nullable=False)
+    # Smallest price increment; order and trade prices are stored as multiples of it
+    tick_size = Column(
+        Numeric(18, 8),
+        nullable=False,
+        default=DEFAULT_TICK_SIZE,
+        server_default=str(DEFAULT_TICK_SIZE),
+    )
 
     orders = relationship("Order", back_populates="symbol")
     trades = relationship("Trade", back_populates="symbol")
 
 
+@event.listens_for(Symbol, "load")
+@event.listens_for(Symbol, "refresh")
+def _register_tick_size(target, *args):
+    if target.tick_size is not None:
+        tick_sizes.set(target.id, target.tick_size)
+
+
 # Order status enum
 class OrderStatus(str, enum.Enum):
     pending = "pending"
@@ -45,8 +60,23 @@ class OrderStatus(str, enum.Enum):
     partially_filled = "partially_filled"
 
 
+# Resting limit orders, the only rows matching and the order book read
+OPEN_LIMIT_ORDER = text("type = 'L' AND status IN ('pending', 'partially_filled')")
+
+
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # match_order (SQL engine), get_order_book, order book load
+        Index(
+            "ix_orders_open_book",
+            "symbol_id", "side", "price_ticks", "timestamp",
+            postgresql_where=OPEN_LIMIT_ORDER,
+            sqlite_where=OPEN_LIMIT_ORDER,
+        ),
+        Index("ix_orders_user_id_id", "user_id", "id"),  # get_my_orders
+        Index("ix_orders_symbol_id_id", "symbol_id", "id"),  # get_orders_by_symbol
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
@@ -57,7 +87,7 @@ class Order(Base):
     side = Column(String)  # "buy" or "sell"
     quantity = Column(Integer)
     exec_qty = Column(Integer)
-    price = Column(Float)
+    price_ticks = Column(BigInteger)  # price / symbol.tick_size
     status = Column(Enum(OrderStatus), default=OrderStatus.pending)
     type = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -76,9 +106,19 @@ class Order(Base):
         if self.symbol and not self.ticker:
             self.ticker = self.symbol.ticker
 
+    @property
+    def price(self):
+        return tick_sizes.to_price(self.symbol_id, self.price_ticks)
+
 
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (
+        Index("ix_trades_symbol_id_timestamp", "symbol_id", "timestamp"),  # get_ltp
+        Index("ix_trades_symbol_id_id", "symbol_id", "id"),  # get_trades_by_symbol pages
+        Index("ix_trades_buy_user_id", "buy_user_id"),  # get_my_trades
+        Index("ix_trades_sell_user_id", "sell_user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     buy_order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"))
@@ -87,8 +127,8 @@ class Trade(Base):
     sell_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     symbol_id = Column(Integer, ForeignKey("symbols.id", ondelete="CASCADE"))
     ticker = Column(String, index=True, nullable=False)
-    trade_price = Column(Float)
-    trade_quantity = Column(Float)
+    price_ticks = Column(BigInteger)
+    trade_quantity = Column(Integer)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     buyer = relationship(
@@ -109,3 +149,25 @@ class Trade(Base):
         super().__init__(**kwargs)
         if self.symbol and not self.ticker:
             self.ticker = self.symbol.ticker
+
+    @property
+    def trade_price(self):
+        return tick_sizes.to_price(self.symbol_id, self.price_ticks)
+
+
+class Candle(Base):
+    """OHLCV bar of one symbol's trades over one interval, kept up to date by matching."""
+
+    __tablename__ = "candles"
+
+    symbol_id = Column(
+        Integer, ForeignKey("symbols.id", ondelete="CASCADE"), primary_key=True
+    )
+    interval = Column(Integer, primary_key=True)  # seconds: 1, 60, 300, 3600
+    start = Column(DateTime, primary_key=True)  # bucket start, UTC
+    open_ticks = Column(BigInteger, nullable=False)
+    high_ticks = Column(BigInteger, nullable=False)
+    low_ticks = Column(BigInteger, nullable=False)
+    close_ticks = Column(BigInteger, nullable=False)
+    volume = Column(BigInteger, nullable=False)
+    trades = Column(Integer, nullable=False)
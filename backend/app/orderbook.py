@@ -0,0 +1,439 @@
+import bisect
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import asc, func
+from sqlalchemy.orm import Session
+
+from app.commit_hooks import after_commit
+from app.models import Order, Trade
+from app.ticks import DEFAULT_TICK_SIZE, tick_sizes
+
+OPEN_STATUSES = ("pending", "partially_filled")
+
+
+@dataclass
+class RestingOrder:
+    id: int
+    user_id: int
+    side: str
+    price: int  # ticks
+    quantity: int
+    exec_qty: int
+    timestamp: datetime
+
+    @property
+    def remaining(self) -> int:
+        return self.quantity - self.exec_qty
+
+    @classmethod
+    def from_order(cls, order: Order) -> "RestingOrder":
+        return cls(
+            id=order.id,
+            user_id=order.user_id,
+            side=order.side,
+            price=order.price_ticks,
+            quantity=order.quantity,
+            exec_qty=order.exec_qty or 0,
+            timestamp=order.timestamp,
+        )
+
+
+class PriceLevel:
+    """FIFO queue of resting orders sharing one price."""
+
+    __slots__ = ("price", "orders", "quantity")
+
+    def __init__(self, price: int):
+        self.price = price
+        # {order_id: RestingOrder}, insertion order == time priority
+        self.orders: "OrderedDict[int, RestingOrder]" = OrderedDict()
+        self.quantity = 0  # open quantity across the level
+
+
+class BookSide:
+    def __init__(self, side: str):
+        self.side = side
+        self.prices: List[int] = []  # ascending, in ticks
+        self.levels: Dict[int, PriceLevel] = {}
+
+    def best(self) -> Optional[PriceLevel]:
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.side == "B" else self.prices[0]
+        return self.levels[price]
+
+    def iter_levels(self) -> Iterator[PriceLevel]:
+        """Levels best price first."""
+        prices = reversed(self.prices) if self.side == "B" else self.prices
+        for price in prices:
+            yield self.levels[price]
+
+    def add(self, order: RestingOrder):
+        level = self.levels.get(order.price)
+        if level is None:
+            level = self.levels[order.price] = PriceLevel(order.price)
+            bisect.insort(self.prices, order.price)
+        level.orders[order.id] = order
+        level.quantity += order.remaining
+
+    def remove(self, order: RestingOrder):
+        level = self.levels[order.price]
+        del level.orders[order.id]
+        level.quantity -= order.remaining
+        if not level.orders:
+            self._drop_level(level)
+
+    def _drop_level(self, level: PriceLevel):
+        del self.levels[level.price]
+        del self.prices[bisect.bisect_left(self.prices, level.price)]
+
+
+class DepthSide:
+    """Open quantity per price of one side, as of the last commit."""
+
+    def __init__(self, side: str):
+        self.side = side
+        self.prices: List[int] = []  # ascending, in ticks
+        self.quantities: Dict[int, int] = {}
+
+    def set(self, price: int, quantity: int):
+        if quantity > 0:
+            if price not in self.quantities:
+                bisect.insort(self.prices, price)
+            self.quantities[price] = quantity
+        elif self.quantities.pop(price, None) is not None:
+            del self.prices[bisect.bisect_left(self.prices, price)]
+
+    def iter_levels(self) -> Iterator[Tuple[int, int]]:
+        """(price, quantity), best price first."""
+        prices = reversed(self.prices) if self.side == "B" else self.prices
+        for price in prices:
+            yield price, self.quantities[price]
+
+
+class OrderBook:
+    """
+    Price-time priority book for one symbol.
+    Holds only open LIMIT orders; callers serialize access through `lock`.
+    Matching changes the book before its transaction commits, so readers
+    (WebSocket depth and deltas) only get the committed view: commit()
+    copies the changed levels into it once the DB has them.
+    Prices are integer ticks inside the book; committed_depth(),
+    drain_changes() and price() hand out prices in the symbol's currency.
+    """
+
+    def __init__(self, symbol_id: int, tick_size: Decimal = DEFAULT_TICK_SIZE):
+        self.symbol_id = symbol_id
+        self.tick_size = tick_size
+        self.bids = BookSide("B")
+        self.asks = BookSide("S")
+        self.orders: Dict[int, RestingOrder] = {}
+        self.ltp: Optional[int] = None  # ticks
+        self.version = 0  # bumped on every change
+        self.lock = threading.RLock()
+        # Changes since the last commit()
+        self._changed_levels: Dict[Tuple[str, int], None] = {}
+        self._trades: List[Tuple[int, int]] = []
+        self._resync = True  # nothing committed yet: copy every level
+        # Committed view, bumped by commit(), lets readers skip no-ops
+        self.committed_version = 0
+        self.committed_ltp: Optional[int] = None
+        self._depth = {"B": DepthSide("B"), "S": DepthSide("S")}
+        # Committed changes since the last drain_changes(), for delta streaming
+        self._unsent_levels: Dict[Tuple[str, int], int] = {}
+        self._unsent_trades: List[Tuple[int, int]] = []
+        self._unsent_resync = False
+
+    def _side(self, side: str) -> BookSide:
+        return self.bids if side == "B" else self.asks
+
+    def price(self, ticks: Optional[int]) -> Optional[float]:
+        return None if ticks is None else float(ticks * self.tick_size)
+
+    def add(self, order: RestingOrder):
+        if order.remaining <= 0:
+            return
+        self.orders[order.id] = order
+        self._side(order.side).add(order)
+        self._changed_levels[(order.side, order.price)] = None
+        self.version += 1
+
+    def remove(self, order_id: int) -> Optional[RestingOrder]:
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self._side(order.side).remove(order)
+            self._changed_levels[(order.side, order.price)] = None
+            self.version += 1
+        return order
+
+    def reduce(self, order_id: int, quantity: int) -> bool:
+        """
+        Lower a resting order's total quantity in place; it keeps its place
+        in the level queue. False if it isn't resting or the new quantity
+        isn't between its executed and current quantity.
+        """
+        order = self.orders.get(order_id)
+        if order is None or not order.exec_qty < quantity <= order.quantity:
+            return False
+        level = self._side(order.side).levels[order.price]
+        level.quantity -= order.quantity - quantity
+        order.quantity = quantity
+        self._changed_levels[(order.side, order.price)] = None
+        self.version += 1
+        return True
+
+    def fill(self, order_id: int, quantity: int, price: int):
+        """Apply a fill decided elsewhere (SQL matching engine)."""
+        order = self.orders.get(order_id)
+        if order is not None:
+            side = self._side(order.side)
+            level = side.levels[order.price]
+            order.exec_qty += quantity
+            level.quantity -= quantity
+            if order.remaining <= 0:
+                del level.orders[order_id]
+                del self.orders[order_id]
+                if not level.orders:
+                    side._drop_level(level)
+            self._changed_levels[(order.side, order.price)] = None
+        self._trades.append((price, quantity))
+        self.ltp = price
+        self.version += 1
+
+    def committed_depth(self, levels: Optional[int] = 5) -> dict:
+        """Top `levels` price levels of each side (all with None) as of the last commit()."""
+        with self.lock:
+            return {
+                "bids" if side == "B" else "asks": [
+                    {"price": self.price(price), "quantity": quantity}
+                    for price, quantity in islice(self._depth[side].iter_levels(), levels)
+                ]
+                for side in ("B", "S")
+            }
+
+    def commit(self):
+        """
+        Make the changes so far visible to readers. Called once they are
+        committed (or after a reload from the DB), before the symbol's next
+        job can change the book again.
+        """
+        with self.lock:
+            if self._resync:
+                for side in (self.bids, self.asks):
+                    depth = self._depth[side.side] = DepthSide(side.side)
+                    for level in side.iter_levels():
+                        depth.set(level.price, level.quantity)
+                self._unsent_levels = {}
+                self._unsent_trades = []
+                self._unsent_resync = True
+            else:
+                for side, price in self._changed_levels:
+                    level = self._side(side).levels.get(price)
+                    quantity = level.quantity if level else 0
+                    self._depth[side].set(price, quantity)
+                    self._unsent_levels[(side, price)] = quantity
+                self._unsent_trades += self._trades
+            self._changed_levels = {}
+            self._trades = []
+            self._resync = False
+            self.committed_ltp = self.ltp
+            self.committed_version += 1
+
+    def match(
+        self, side: str, order_type: str, price: Optional[int], quantity: int
+    ) -> List[Tuple[RestingOrder, int]]:
+        """
+        Consume resting liquidity for an incoming order.
+        Returns (resting order, fill qty) pairs in execution order; resting
+        orders are already updated/removed from the book.
+        """
+        opposite = self.asks if side == "B" else self.bids
+        fills = []
+        remaining = quantity
+
+        while remaining > 0:
+            level = opposite.best()
+            if level is None:
+                break
+            if order_type == "L":
+                if side == "B" and level.price > price:
+                    break
+                if side == "S" and level.price < price:
+                    break
+
+            while remaining > 0 and level.orders:
+                resting = next(iter(level.orders.values()))
+                fill_qty = min(remaining, resting.remaining)
+                resting.exec_qty += fill_qty
+                level.quantity -= fill_qty
+                remaining -= fill_qty
+                fills.append((resting, fill_qty))
+                self._trades.append((resting.price, fill_qty))
+                if resting.remaining == 0:
+                    del level.orders[resting.id]
+                    del self.orders[resting.id]
+
+            self._changed_levels[(opposite.side, level.price)] = None
+            if not level.orders:
+                opposite._drop_level(level)
+
+        if fills:
+            self.ltp = fills[-1][0].price
+            self.version += 1
+        return fills
+
+    def drain_changes(self) -> dict:
+        """
+        Committed levels touched (with their open quantity, 0 = removed) and
+        trades since the previous call. `resync` means the book was rebuilt
+        and consumers should take a full snapshot instead.
+        """
+        with self.lock:
+            changes = {
+                "levels": [
+                    {"side": side, "price": self.price(price), "quantity": quantity}
+                    for (side, price), quantity in self._unsent_levels.items()
+                ],
+                "trades": [
+                    {"price": self.price(p), "quantity": q} for p, q in self._unsent_trades
+                ],
+                "resync": self._unsent_resync,
+            }
+            self._unsent_levels = {}
+            self._unsent_trades = []
+            self._unsent_resync = False
+            return changes
+
+
+class OrderBookRegistry:
+    """Per-symbol books, loaded lazily from the `orders` table."""
+
+    def __init__(self):
+        self._books: Dict[int, OrderBook] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int], None]] = []
+
+    def add_listener(self, listener: Callable[[int], None]):
+        """`listener(symbol_id)` is called after a change to that book is committed."""
+        self._listeners.append(listener)
+
+    def publish(self, symbol_id: int):
+        """
+        The book matches the DB again (a commit, or a reload after a
+        rollback): make it visible to readers and tell the listeners.
+        """
+        book = self._books.get(symbol_id)
+        if book is not None:
+            book.commit()
+        for listener in self._listeners:
+            listener(symbol_id)
+
+    def stage(self, db: Session, symbol_id: int):
+        """publish() once `db` commits; nothing if it rolls back."""
+        after_commit(db, self.publish, symbol_id)
+
+    def loaded(self) -> Dict[int, OrderBook]:
+        """Books currently in memory, by symbol id."""
+        return dict(self._books)
+
+    def install(self, books: Dict[int, OrderBook]):
+        """Replace every book at once, e.g. with books replayed from the journal."""
+        for book in books.values():
+            book.commit()
+        with self._lock:
+            self._books = books
+
+    def peek(self, symbol_id: int) -> Optional[OrderBook]:
+        """Book for `symbol_id` if it is already loaded, without touching the DB."""
+        return self._books.get(symbol_id)
+
+    def get(self, db: Session, symbol_id: int) -> OrderBook:
+        book = self._books.get(symbol_id)
+        if book is None:
+            with self._lock:
+                book = self._books.get(symbol_id)
+                if book is None:
+                    book = self._load(db, symbol_id)
+                    book.commit()
+                    self._books[symbol_id] = book
+        return book
+
+    def reload(self, db: Session, symbol_id: int) -> OrderBook:
+        """Rebuild a book from the DB, e.g. after a rolled back transaction."""
+        fresh = self._load(db, symbol_id)
+        book = self._books.get(symbol_id)
+        if book is None:
+            fresh.commit()
+            self._books[symbol_id] = fresh
+            return fresh
+        with book.lock:
+            book.bids, book.asks, book.orders = fresh.bids, fresh.asks, fresh.orders
+            book.ltp, book.tick_size = fresh.ltp, fresh.tick_size
+            book.version += 1
+            book._resync = True
+        return book
+
+    def load_all(self, db: Session):
+        tick_sizes.load_all(db)
+        open_orders = (
+            db.query(Order)
+            .filter(Order.type == "L", Order.status.in_(OPEN_STATUSES))
+            .order_by(asc(Order.timestamp), asc(Order.id))
+            .all()
+        )
+        books: Dict[int, OrderBook] = {}
+        for o in open_orders:
+            book = books.get(o.symbol_id)
+            if book is None:
+                book = books[o.symbol_id] = OrderBook(o.symbol_id, tick_sizes.get(o.symbol_id))
+            book.add(RestingOrder.from_order(o))
+
+        last_trades = (
+            db.query(Trade.symbol_id, Trade.price_ticks)
+            .filter(
+                Trade.id.in_(
+                    db.query(func.max(Trade.id)).group_by(Trade.symbol_id)
+                )
+            )
+            .all()
+        )
+        for symbol_id, price in last_trades:
+            book = books.get(symbol_id)
+            if book is None:
+                book = books[symbol_id] = OrderBook(symbol_id, tick_sizes.get(symbol_id))
+            book.ltp = price
+
+        self.install(books)
+
+    def _load(self, db: Session, symbol_id: int) -> OrderBook:
+        book = OrderBook(symbol_id, tick_sizes.get(symbol_id, db))
+        open_orders = (
+            db.query(Order)
+            .filter(
+                Order.symbol_id == symbol_id,
+                Order.type == "L",
+                Order.status.in_(OPEN_STATUSES),
+            )
+            .order_by(asc(Order.timestamp), asc(Order.id))
+            .all()
+        )
+        for o in open_orders:
+            book.add(RestingOrder.from_order(o))
+
+        last_trade = (
+            db.query(Trade.price_ticks)
+            .filter(Trade.symbol_id == symbol_id)
+            .order_by(Trade.timestamp.desc(), Trade.id.desc())
+            .first()
+        )
+        book.ltp = last_trade.price_ticks if last_trade else None
+        return book
+
+
+order_books = OrderBookRegistry()
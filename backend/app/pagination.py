@@ -0,0 +1,97 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Type
+
+from fastapi import Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+
+DEFAULT_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "500"))
+MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "5000"))
+# Rows fetched per round trip from the server-side cursor when streaming
+STREAM_BATCH_SIZE = int(os.getenv("LIST_STREAM_BATCH_SIZE", "1000"))
+
+
+@dataclass
+class Page:
+    cursor: Optional[int]
+    limit: Optional[int]
+    start: Optional[datetime]
+    end: Optional[datetime]
+    format: str
+
+
+def page_params(
+    cursor: Optional[int] = Query(
+        None, description="Return rows with id greater than this (the previous page's `X-Next-Cursor`)."
+    ),
+    limit: Optional[int] = Query(
+        None, ge=1, description=f"Page size, default {DEFAULT_PAGE_SIZE} with a `cursor`, "
+                                f"max {MAX_PAGE_SIZE}. Without `limit` or `cursor` the whole list "
+                                "comes back unpaged. Unbounded for `ndjson` unless given."
+    ),
+    start: Optional[datetime] = Query(None, description="Only rows with timestamp >= start."),
+    end: Optional[datetime] = Query(None, description="Only rows with timestamp < end."),
+    format: str = Query(
+        "json", pattern="^(json|ndjson)$",
+        description="`ndjson` streams one JSON object per line, for bulk export."
+    ),
+) -> Page:
+    return Page(cursor=cursor, limit=limit, start=start, end=end, format=format)
+
+
+def keyset(stmt: Select, model, page: Page) -> Select:
+    """Cursor/time-range filters, ordered by id so pages are stable."""
+    if page.cursor is not None:
+        stmt = stmt.where(model.id > page.cursor)
+    if page.start is not None:
+        stmt = stmt.where(model.timestamp >= page.start)
+    if page.end is not None:
+        stmt = stmt.where(model.timestamp < page.end)
+    return stmt.order_by(model.id)
+
+
+async def paginate(
+    db: AsyncSession,
+    stmt: Select,
+    model,
+    page: Page,
+    schema: Type[BaseModel],
+    response: Response,
+):
+    """
+    One page as a JSON list, with `X-Next-Cursor` set when more rows follow,
+    or the whole result streamed as NDJSON. Callers that ask for neither a
+    `limit` nor a `cursor` get the whole list, as before paging existed.
+    """
+    stmt = keyset(stmt, model, page)
+    if page.format == "ndjson":
+        if page.limit is not None:
+            stmt = stmt.limit(page.limit)
+        return StreamingResponse(
+            stream_ndjson(stmt, schema), media_type="application/x-ndjson"
+        )
+
+    if page.limit is None and page.cursor is None:
+        return (await db.execute(stmt)).scalars().all()
+
+    limit = min(page.limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    result = await db.execute(stmt.limit(limit + 1))  # one extra: is there more?
+    rows = result.scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+
+async def stream_ndjson(stmt: Select, schema: Type[BaseModel]):
+    # Own session: the request's session may be closed before the body is sent
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for row in result.scalars():
+            yield schema.model_validate(row, from_attributes=True).model_dump_json() + "\n"
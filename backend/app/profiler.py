@@ -0,0 +1,290 @@
+"""On-demand sampling profiler (collapsed stacks in PROFILE_DIR), off until an admin turns it on."""
+import asyncio
+import contextvars
+import itertools
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_HEADER = "X-Profile"
+# Longest window, and longest request profiling stays armed
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "600"))
+# Requests profiled at the same time; more tagged requests just run
+PROFILE_MAX_REQUESTS = int(os.getenv("PROFILE_MAX_REQUESTS", "8"))
+
+_HEADER = PROFILE_HEADER.lower().encode()
+_ids = itertools.count(1)
+_labels: Dict[CodeType, str] = {}
+
+# The request profile of the current request, None when it isn't profiled
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar(
+    "profile", default=None
+)
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = "/".join(code.co_filename.split(os.sep)[-2:])
+        label = _labels[code] = f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+def _stack(frame: Optional[FrameType], stop: Optional[FrameType] = None) -> Tuple[Tuple[str, ...], bool]:
+    """Labels of `frame` and its callers, outermost first, up to (not including) `stop`."""
+    labels = []
+    while frame is not None:
+        if frame is stop:
+            labels.reverse()
+            return tuple(labels), True
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels), stop is None
+
+
+def _await_stack(task: asyncio.Task, marker: FrameType) -> Tuple[str, ...]:
+    """Where a suspended task waits: its chain of awaiting coroutines below `marker`."""
+    labels, seen = [], False
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        if seen:
+            labels.append(_label(frame.f_code))
+        seen = seen or frame is marker
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return tuple(labels)
+
+
+class Profile:
+    def __init__(self, kind: str, name: str, deadline: Optional[float] = None):
+        self.id = next(_ids)
+        self.kind = kind  # "window" or "request"
+        self.name = name  # root frame of a request profile
+        self.started = datetime.now()
+        self.deadline = deadline  # time.monotonic()
+        self.done = False
+        self.samples: Counter = Counter()
+        # Request profiles only: where the request runs
+        self.loop_thread: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.marker: Optional[FrameType] = None
+        self.threads: Dict[int, FrameType] = {}  # thread id -> frame of `call_profiled`
+
+    def sample(self, frames: Dict[int, FrameType], names: Dict[int, str], own: int):
+        if self.kind == "window":
+            for tid, frame in frames.items():
+                if tid != own:
+                    stack, _ = _stack(frame)
+                    self.samples[(names.get(tid, str(tid)),) + stack] += 1
+            return
+
+        stack, running = _stack(frames.get(self.loop_thread), self.marker)
+        if running:
+            self.samples[stack] += 1
+            return
+        waiting = _await_stack(self.task, self.marker)
+        workers = list(self.threads.items())
+        for tid, call_frame in workers:
+            stack, _ = _stack(frames.get(tid), call_frame)
+            self.samples[waiting + stack] += 1
+        if not workers:
+            self.samples[waiting + ("(waiting)",)] += 1
+
+    def collapsed(self) -> str:
+        root = (self.name,) if self.kind == "request" else ()
+        return "".join(
+            f"{';'.join(root + stack)} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+class SamplingProfiler:
+    """
+    One sampler thread, running only while some profile is active, that
+    reads every thread's stack each interval and hands them to the
+    active profiles, then writes out the finished ones.
+    """
+
+    def __init__(self, directory: str, interval: float):
+        self.directory = directory
+        self.interval = interval
+        self.token: Optional[str] = None  # request profiling armed
+        self.armed_until = 0.0
+        self.window: Optional[Profile] = None
+        self.files = deque(maxlen=50)  # most recent profiles written
+        self.write_errors = 0
+        self._profiles: List[Profile] = []
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start_window(self, seconds: float) -> Profile:
+        profile = Profile("window", "window", time.monotonic() + seconds)
+        self.window = profile
+        self._add(profile)
+        return profile
+
+    def arm(self, seconds: float) -> str:
+        """Profile requests carrying the returned token for `seconds`."""
+        self.armed_until = time.monotonic() + seconds
+        self.token = secrets.token_urlsafe(16)
+        return self.token
+
+    def disarm(self):
+        self.token = None
+
+    def stop(self):
+        """Disarm and end the window early; what was sampled is still written."""
+        self.disarm()
+        if self.window is not None:
+            self.window.done = True
+
+    def begin_request(self, scope: dict, marker: FrameType) -> Optional[Profile]:
+        """A profile for this request if it carries the armed token."""
+        token = self.token
+        if token is None:
+            return None
+        if time.monotonic() >= self.armed_until:
+            self.disarm()
+            return None
+        value = next((v for k, v in scope["headers"] if k == _HEADER), None)
+        if value is None or not secrets.compare_digest(value, token.encode()):
+            return None
+        profile = Profile("request", f'{scope["method"]} {scope["path"]}')
+        profile.loop_thread = threading.get_ident()
+        profile.task = asyncio.current_task()
+        profile.marker = marker
+        return profile if self._add(profile, PROFILE_MAX_REQUESTS) else None
+
+    def end_request(self, profile: Profile, scope: dict):
+        route = scope.get("route")
+        if route is not None:
+            profile.name = f'{scope["method"]} {route.path}'
+        profile.done = True
+
+    def _add(self, profile: Profile, limit: Optional[int] = None) -> bool:
+        with self._lock:
+            if limit is not None and sum(p.kind == profile.kind for p in self._profiles) >= limit:
+                return False
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+
+            now = time.monotonic()
+            finished = [p for p in profiles if p.done or (p.deadline and now >= p.deadline)]
+            active = [p for p in profiles if p not in finished]
+            if active:
+                frames = sys._current_frames()
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for profile in active:
+                    profile.sample(frames, names, own)
+                del frames
+            for profile in finished:
+                self._write(profile)
+                with self._lock:
+                    self._profiles.remove(profile)
+                if profile is self.window:
+                    self.window = None
+            time.sleep(self.interval)
+
+    def _write(self, profile: Profile):
+        if not profile.samples:
+            return  # a request shorter than one interval
+        name = f"{profile.kind}-{profile.started:%Y%m%dT%H%M%S}-{profile.id}.folded"
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w") as f:
+                f.write(profile.collapsed())
+        except OSError:
+            self.write_errors += 1
+            return
+        self.files.append(path)
+
+    def close(self, timeout: float = 2.0):
+        self.stop()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        window = self.window
+        with self._lock:
+            in_flight = sum(p.kind == "request" for p in self._profiles)
+        return {
+            "directory": self.directory,
+            "interval_ms": self.interval * 1000,
+            "window": {"id": window.id, "seconds_left": round(max(0.0, window.deadline - now), 1)}
+            if window is not None
+            else None,
+            "requests": {
+                "armed": self.token is not None and now < self.armed_until,
+                "header": PROFILE_HEADER,
+                "seconds_left": round(max(0.0, self.armed_until - now), 1) if self.token else 0.0,
+                "in_flight": in_flight,
+            },
+            "files": list(self.files),
+            "write_errors": self.write_errors,
+        }
+
+
+profiler = SamplingProfiler(PROFILE_DIR, PROFILE_INTERVAL_MS / 1000)
+
+
+def call_profiled(fn, *args):
+    """
+    Run `fn(*args)` in a worker thread on behalf of the current request,
+    so a request profile follows it there.
+    """
+    profile = _current.get()
+    if profile is None:
+        return fn(*args)
+    tid = threading.get_ident()
+    profile.threads[tid] = sys._getframe()
+    try:
+        return fn(*args)
+    finally:
+        profile.threads.pop(tid, None)
+
+
+class ProfilingMiddleware:
+    """Starts a request profile for requests carrying the armed `X-Profile` token."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if profiler.token is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = profiler.begin_request(scope, sys._getframe())
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            profiler.end_request(profile, scope)
@@ -1,12 +1,16 @@
+import os
+
 import bleach
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import auth, models, schemas, utils
 from ..auth import ALGORITHM, SECRET_KEY
-from ..database import get_db
+from ..database import get_async_db
+from ..user_cache import CurrentUser, user_cache
 
 
 def sanitize_str(value: str) -> str:
@@ -15,10 +19,42 @@ def sanitize_str(value: str) -> str:
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# bcrypt requests allowed in flight per worker, the rest get 503 right away
+PASSWORD_MAX_CONCURRENCY = int(os.getenv("PASSWORD_MAX_CONCURRENCY", "16"))
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+
+class ConcurrencyLimit:
+    """
+    Dependency admitting at most `limit` concurrent requests. Excess requests
+    are rejected immediately instead of queueing behind the bcrypt pool.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+password_slots = ConcurrencyLimit(PASSWORD_MAX_CONCURRENCY)
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -27,9 +63,19 @@ def get_current_user(
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    # Cache first, then the token's own uid/role claims, the DB last
+    user = await user_cache.get(username) or await user_cache.from_claims(payload)
+    if user is not None:
+        return user
+
+    result = await db.execute(
+        select(models.User).where(models.User.username == username)
+    )
+    db_user = result.scalars().first()
+    if db_user is None:
         raise HTTPException(status_code=401, detail="User not found")
+    user = CurrentUser.from_model(db_user)
+    await user_cache.put(user)
     return user
 
 
@@ -38,16 +84,19 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @router.post("/register", response_model=schemas.UserResponse, summary="Register a new user",
     description="Creates a new user account with username, email, and password. "
-                "If no role is provided, the default role is **trader**."
+                "If no role is provided, the default role is **trader**.",
+    dependencies=[Depends(password_slots)],
 )
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = (
-        db.query(models.User).filter(models.User.username == user.username).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(models.User).where(models.User.username == user.username)
     )
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    hashed_pw = utils.hash_password(user.password)
+    # bcrypt is CPU bound, runs in its own process pool
+    hashed_pw = await utils.hash_password_async(user.password)
     new_user = models.User(
         username=sanitize_str(user.username),
         email=sanitize_str(user.email),
@@ -55,25 +104,34 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         role=sanitize_str(user.role) if user.role else "trader",
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    # The name may have belonged to a deleted user
+    await user_cache.invalidate(new_user.username)
     return new_user
 
 
 @router.post("/login", summary="User login",
     description="Authenticates a user with username and password. "
-                "Returns a JWT access token if credentials are valid."
+                "Returns a JWT access token if credentials are valid. "
+                "Answers 503 when too many logins are already being checked.",
+    dependencies=[Depends(password_slots)],
 )
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = (
-        db.query(models.User).filter(models.User.username == user.username).first()
+async def login(user: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(models.User).where(models.User.username == user.username)
     )
-    if not db_user or not utils.verify_password(user.password, db_user.hashed_password):
+    db_user = result.scalars().first()
+    if not db_user or not await utils.verify_password_async(
+        user.password, db_user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
 
-    token = auth.create_access_token({"sub": db_user.username})
+    token = auth.create_access_token(
+        {"sub": db_user.username, "uid": db_user.id, "role": db_user.role}
+    )
     return {"access_token": token, "token_type": "bearer"}
 
 
@@ -82,5 +140,26 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 @router.get("/me", response_model=schemas.UserResponse, summary="Get current user profile",
     description="Returns details (id, username, email, role) of the currently authenticated user."
 )
-def read_users_me(current_user: models.User = Depends(get_current_user)):
-    return current_user
+async def read_users_me(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # The cached user only carries id/username/role
+    user = await db.get(models.User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+
+@router.get("/cache", summary="User cache statistics",
+    description="Hit/miss counters of the authenticated-user cache. "
+                "`misses` are requests that still queried the `users` table. "
+                "Only users with role `admin` can access this endpoint."
+)
+async def user_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access cache stats",
+        )
+    return user_cache.get_stats()
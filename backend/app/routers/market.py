@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import candles
+from app.database import get_async_db
+from app.models import *
+from app.schemas import *
+
+from .auth import get_current_user
+from .ws_orderbook import StreamFeed, manager, reject_unknown_symbol
+
+router = APIRouter(tags=["market"])
+
+candle_feed = StreamFeed("candles")
+candles.add_listener(candle_feed.notify)
+
+MAX_CANDLES = 5000
+
+
+@router.get("/market/candles", response_model=List[CandleResponse], summary="Get OHLCV candles",
+    description="Candles of one symbol for `interval` **1s, 1m, 5m or 1h**, oldest first. "
+                "With `start`, up to `limit` candles from `start` on (page forward from the last "
+                "`start` + interval); without it, the latest `limit` candles before `end`. "
+                "Intervals without trades have no candle."
+)
+async def get_candles(
+    symbol_id: int,
+    interval: str = Query("1m", pattern="^(1s|1m|5m|1h)$"),
+    start: Optional[datetime] = Query(None, description="Candles starting at or after this."),
+    end: Optional[datetime] = Query(None, description="Candles starting before this."),
+    limit: int = Query(500, ge=1, le=MAX_CANDLES),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    seconds = candles.INTERVALS[interval]
+    # Primary key (symbol_id, interval, start): a range scan either way
+    stmt = select(Candle).where(Candle.symbol_id == symbol_id, Candle.interval == seconds)
+    if end is not None:
+        stmt = stmt.where(Candle.start < candles.utc_naive(end))
+    if start is not None:
+        stmt = stmt.where(Candle.start >= candles.bucket_start(start, seconds))
+        stmt = stmt.order_by(Candle.start).limit(limit)
+        rows = (await db.execute(stmt)).scalars().all()
+    else:
+        stmt = stmt.order_by(Candle.start.desc()).limit(limit)
+        rows = list(reversed((await db.execute(stmt)).scalars().all()))
+    return [candles.candle_entry(c) for c in rows]
+
+
+@router.websocket("/ws/candles/{symbol_id}")
+async def candles_websocket(websocket: WebSocket, symbol_id: int):
+    if await reject_unknown_symbol(websocket, symbol_id):
+        return
+    await manager.connect(websocket, symbol_id, "candles")
+    try:
+        while True:
+            await websocket.receive_text()  # keep connection alive
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+
+@router.get("/ws/candles/{symbol_id}", tags=["WebSocket"])
+async def ws_candles_docs(symbol_id: int):
+    """
+    Summary:
+        Live Candles WebSocket Stream (Documentation Only)
+
+    Description:
+        This endpoint is for **documentation purposes only**.
+        The actual connection must be made using **WebSocket**:
+
+        ```
+        wss://<your-server>/ws/candles/{symbol_id}
+        ```
+
+        - Every committed match pushes the updated candle of each interval (1s, 1m, 5m, 1h) it
+          touched, with its totals so far:
+        ```json
+        {
+            "type": "candles",
+            "symbol_id": 1,
+            "candles": [
+                {"symbol_id": 1, "interval": "1m", "start": "2025-08-21T10:31:00",
+                 "open": 150.5, "high": 151.25, "low": 150.25, "close": 151.0,
+                 "volume": 1200, "trades": 14}
+            ]
+        }
+        ```
+        - Replace the candle with the same `interval` and `start`; a new `start` opens a new one.
+        - Nothing is sent on connect: subscribe first, then load history from
+          `GET /market/candles`, so no update falls in between.
+    """
+    return {
+        "note": "This is documentation only. Use WebSocket at ws://<your-server>/ws/candles/{symbol_id}"
+    }
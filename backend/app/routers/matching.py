@@ -105,17 +105,281 @@
 
 
 
-from sqlalchemy import asc, desc
+import os
+import sys
+import time
+from typing import List, NamedTuple
+
+from sqlalchemy import Integer, String, asc, cast, column, desc, insert, update, values
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
+from app import metrics
+from app.candles import update_candles
+from app.journal import FillEvent, journal
 from app.models import Order, Trade
+from app.orderbook import OPEN_STATUSES, RestingOrder, order_books
+from app.trade_tape import tape_entry, trade_tape
+
+# "memory" matches against the in-process order book, "sql" against the
+# orders table (kept as a fallback and to cross-check the two engines).
+MATCHING_ENGINE = os.getenv("MATCHING_ENGINE", "memory")
+
+
+def server_workers() -> int:
+    """
+    Worker processes the app was started with: uvicorn/gunicorn `--workers`
+    (workers inherit the command line) or WEB_CONCURRENCY.
+    """
+    argv = sys.argv
+    for i, arg in enumerate(argv):
+        if arg.startswith("--workers="):
+            return int(arg.split("=", 1)[1])
+        if arg in ("--workers", "-w") and i + 1 < len(argv):
+            return int(argv[i + 1])
+    return int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def check_engine():
+    """
+    The memory engine keeps the books and the sequencer in one process:
+    two workers would each match against their own copy of a book and
+    could both fill the same resting order.
+    """
+    if MATCHING_ENGINE == "memory" and server_workers() > 1:
+        raise RuntimeError(
+            "MATCHING_ENGINE=memory needs a single worker process; "
+            "run one worker or set MATCHING_ENGINE=sql"
+        )
+
+
+class Fill(NamedTuple):
+    """One execution against a resting order, and that order's state after it."""
+
+    order_id: int
+    user_id: int
+    price: int  # ticks
+    quantity: int
+    exec_qty: int
+    remaining: int
+
 
 def match_order(new_order: Order, db: Session):
+    """
+    Match a new order using the configured engine.
+    Assumes db session is managed by the caller (no nested db.begin()).
+    """
+    started = time.perf_counter()
+    if MATCHING_ENGINE == "sql":
+        fills = match_order_sql(new_order, db)
+        _sync_book(new_order, fills, db)
+    else:
+        fills = match_order_memory(new_order, db)
+    journal.record_order(db, new_order)
+    write_fills(new_order, fills, db)
+    db.flush()
+    metrics.match_seconds.labels(MATCHING_ENGINE).observe(time.perf_counter() - started)
+    metrics.fills_per_order.labels(MATCHING_ENGINE).observe(len(fills))
+
+
+def _final_status(new_order: Order, remaining_qty: int) -> str:
+    if remaining_qty == 0:
+        return "filled"
+    if new_order.type == "M":
+        return "cancelled"
+    if new_order.exec_qty > 0:
+        return "partially_filled"
+    return "pending"
+
+
+def write_fills(new_order: Order, fills: List[Fill], db: Session):
+    """
+    Persist a match: one multi-row INSERT for the trades, one upsert for the
+    candles and one UPDATE for every resting order touched, instead of a
+    statement per fill.
+    """
+    if not fills:
+        return
+
+    buy = new_order.side == "B"
+    resting_id = Trade.sell_order_id if buy else Trade.buy_order_id
+    printed = db.execute(
+        # RETURNING order isn't guaranteed without forcing row-at-a-time
+        # inserts; a match fills each resting order once, so key by it
+        insert(Trade).returning(resting_id, Trade.id, Trade.timestamp),
+        [
+            {
+                "buy_order_id": new_order.id if buy else f.order_id,
+                "buy_user_id": new_order.user_id if buy else f.user_id,
+                "sell_order_id": f.order_id if buy else new_order.id,
+                "sell_user_id": f.user_id if buy else new_order.user_id,
+                "symbol_id": new_order.symbol_id,
+                "ticker": new_order.ticker,
+                "price_ticks": f.price,
+                "trade_quantity": f.quantity,
+            }
+            for f in fills
+        ],
+    ).all()
+    printed = {order_id: (trade_id, timestamp) for order_id, trade_id, timestamp in printed}
+    trades, executions = [], []
+    for f in fills:
+        trade_id, timestamp = printed[f.order_id]
+        trades.append(
+            tape_entry(new_order.symbol_id, trade_id, f.price, f.quantity, timestamp)
+        )
+        executions.append((timestamp, f.price, f.quantity))
+    # Printed on /ws/trades once the caller commits
+    trade_tape.stage(db, new_order.symbol_id, trades)
+    update_candles(db, new_order.symbol_id, executions)
+    if journal.enabled:
+        journal.record(db, [
+            FillEvent(f.order_id, new_order.symbol_id, printed[f.order_id][0],
+                      new_order.id, f.price, f.quantity, f.exec_qty)
+            for f in fills
+        ])
+
+    rows = [
+        (f.order_id, f.exec_qty, "filled" if f.remaining == 0 else "partially_filled")
+        for f in fills
+    ]
+    if db.get_bind().dialect.name == "postgresql":
+        # UPDATE orders SET ... FROM (VALUES (id, exec_qty, status), ...) AS fills
+        v = values(
+            column("id", Integer),
+            column("exec_qty", Integer),
+            column("status", String),
+            name="fills",
+        ).data(rows)
+        db.execute(
+            update(Order)
+            .where(Order.id == v.c.id)
+            .values(
+                exec_qty=v.c.exec_qty,
+                status=cast(v.c.status, Order.__table__.c.status.type),
+            )
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        # No VALUES-as-table here; executemany UPDATE by primary key
+        db.execute(
+            update(Order),
+            [{"id": i, "exec_qty": q, "status": st} for i, q, st in rows],
+        )
+
+    # Resting orders loaded in this session (SQL engine, earlier orders of a
+    # batch) must not keep the pre-match values
+    for f in fills:
+        order = db.identity_map.get(db.identity_key(Order, f.order_id))
+        if order is not None:
+            db.expire(order, ["exec_qty", "status"])
+
+
+def match_order_memory(new_order: Order, db: Session) -> List[Fill]:
+    """
+    Match a new order against the in-memory book for its symbol.
+    Returns the fills; only write_fills touches the DB.
+    """
+    book = order_books.get(db, new_order.symbol_id)
+
+    with book.lock:
+        # An order handed to the matcher is the aggressor, never resting
+        book.remove(new_order.id)
+
+        # An amended order re-enters with what it already executed
+        open_qty = new_order.quantity - (new_order.exec_qty or 0)
+        fills = [
+            Fill(r.id, r.user_id, r.price, fill_qty, r.exec_qty, r.remaining)
+            for r, fill_qty in book.match(
+                new_order.side, new_order.type, new_order.price_ticks, open_qty
+            )
+        ]
+
+        remaining_qty = open_qty - sum(f.quantity for f in fills)
+        if new_order.type == "L" and remaining_qty > 0:
+            resting_order = RestingOrder.from_order(new_order)
+            resting_order.exec_qty = new_order.quantity - remaining_qty
+            book.add(resting_order)
+
+    # Book is updated; the outcome is persisted outside the lock so readers
+    # of the book (order book snapshots) never wait on the DB
+    new_order.exec_qty = new_order.quantity - remaining_qty
+    new_order.status = _final_status(new_order, remaining_qty)
+    return fills
+
+
+def _sync_book(new_order: Order, fills: List[Fill], db: Session):
+    """Mirror the outcome of a SQL match into the in-memory book (depth cache)."""
+    book = order_books.get(db, new_order.symbol_id)
+    with book.lock:
+        book.remove(new_order.id)
+        for f in fills:
+            book.fill(f.order_id, f.quantity, f.price)
+        if new_order.type == "L" and new_order.exec_qty < new_order.quantity:
+            book.add(RestingOrder.from_order(new_order))
+
+
+def pull_orders(db: Session, symbol_id: int, order_ids: List[int]) -> List[int]:
+    """
+    Take open resting orders of one symbol out of the matcher before they are
+    cancelled, each in O(1) through the book's order-id index.
+    Returns the ids actually pulled; the others were no longer open.
+    """
+    if not order_ids:
+        return []
+    book = order_books.get(db, symbol_id)
+
+    if MATCHING_ENGINE == "sql":
+        order_ids = [
+            order_id
+            for (order_id,) in db.query(Order.id)
+            .filter(Order.id.in_(order_ids), Order.status.in_(OPEN_STATUSES))
+            .with_for_update()
+        ]
+        with book.lock:
+            for order_id in order_ids:
+                book.remove(order_id)
+        return order_ids
+
+    with book.lock:
+        return [order_id for order_id in order_ids if book.remove(order_id) is not None]
+
+
+def reduce_order(db: Session, order: Order, quantity: int) -> bool:
+    """
+    Lower a resting order's quantity without touching its time priority.
+    False if the order is no longer resting.
+    """
+    book = order_books.get(db, order.symbol_id)
+
+    if MATCHING_ENGINE == "sql":
+        locked = (
+            db.query(Order.id)
+            .filter(Order.id == order.id, Order.status.in_(OPEN_STATUSES))
+            .with_for_update()
+            .first()
+        )
+        if locked is None:
+            return False
+        # Priority comes from the row's timestamp; the book is only depth here
+        with book.lock:
+            book.reduce(order.id, quantity)
+        journal.record_reduce(db, order, quantity)
+        return True
+
+    with book.lock:
+        reduced = book.reduce(order.id, quantity)
+    if reduced:
+        journal.record_reduce(db, order, quantity)
+    return reduced
+
+
+def match_order_sql(new_order: Order, db: Session) -> List[Fill]:
     """
     Match a new order with opposite orders in a concurrency-safe way.
     Assumes db session is managed by the caller (no nested db.begin()).
     """
-    remaining_qty = new_order.quantity
+    remaining_qty = new_order.quantity - (new_order.exec_qty or 0)
+    fills = []
 
     try:
         # Determine opposite orders
@@ -128,11 +392,11 @@ def match_order(new_order: Order, db: Session):
                     Order.type == "L",
                     Order.status.in_(["pending", "partially_filled"]),
                 )
-                .order_by(asc(Order.price), asc(Order.timestamp))
+                .order_by(asc(Order.price_ticks), asc(Order.timestamp))
                 .with_for_update()  # row-level lock
             )
             if new_order.type == "L":
-                query = query.filter(Order.price <= new_order.price)
+                query = query.filter(Order.price_ticks <= new_order.price_ticks)
         else:
             query = (
                 db.query(Order)
@@ -142,11 +406,11 @@ def match_order(new_order: Order, db: Session):
                     Order.type == "L",
                     Order.status.in_(["pending", "partially_filled"]),
                 )
-                .order_by(desc(Order.price), asc(Order.timestamp))
+                .order_by(desc(Order.price_ticks), asc(Order.timestamp))
                 .with_for_update()
             )
             if new_order.type == "L":
-                query = query.filter(Order.price >= new_order.price)
+                query = query.filter(Order.price_ticks >= new_order.price_ticks)
 
         opposite_orders = query.all()
 
@@ -155,7 +419,7 @@ def match_order(new_order: Order, db: Session):
             if new_order.type == "M":
                 new_order.status = "cancelled"
                 new_order.exec_qty = 0
-            return
+            return fills
 
         # Match with opposite orders
         for o in opposite_orders:
@@ -167,36 +431,18 @@ def match_order(new_order: Order, db: Session):
                 continue
 
             fill_qty = min(remaining_qty, available_qty)
-            trade_price = o.price
-
-            trade = Trade(
-                buy_order_id=new_order.id if new_order.side == "B" else o.id,
-                buy_user_id=new_order.user_id if new_order.side == "B" else o.user_id,
-                sell_order_id=new_order.id if new_order.side == "S" else o.id,
-                sell_user_id=new_order.user_id if new_order.side == "S" else o.user_id,
-                symbol_id=new_order.symbol_id,
-                ticker=new_order.ticker,
-                trade_price=trade_price,
-                trade_quantity=fill_qty,
-            )
-            db.add(trade)
-
-            # Update matched order
-            o.exec_qty += fill_qty
-            o.status = "filled" if o.exec_qty == o.quantity else "partially_filled"
+            exec_qty = o.exec_qty + fill_qty
 
+            # Trades and the matched order's new state are written in bulk
             remaining_qty -= fill_qty
+            fills.append(
+                Fill(o.id, o.user_id, o.price_ticks, fill_qty, exec_qty, o.quantity - exec_qty)
+            )
 
         # Update new order status
         new_order.exec_qty = new_order.quantity - remaining_qty
-        if remaining_qty == 0:
-            new_order.status = "filled"
-        elif new_order.type == "M" and remaining_qty > 0:
-            new_order.status = "cancelled"
-        elif new_order.exec_qty > 0:
-            new_order.status = "partially_filled"
-        else:
-            new_order.status = "pending"
+        new_order.status = _final_status(new_order, remaining_qty)
+        return fills
 
     except SQLAlchemyError as e:
         # The caller should rollback the session, just raise the exception
@@ -0,0 +1,193 @@
+import os
+import secrets
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.book_feed import book_feed
+from app.group_commit import commit_stats
+from app.journal import journal
+from app.metrics import registry
+from app.models import User
+from app.profiler import PROFILE_HEADER, PROFILE_MAX_SECONDS, profiler
+from app.sequencer import sequencer
+
+from .auth import get_current_user
+from .ws_orderbook import manager
+
+router = APIRouter(tags=["monitoring"])
+
+# Scrapers don't log in; when set, `/metrics` wants `Authorization: Bearer <token>`
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def per_symbol(name: str, kind: str, help: str, stats: Dict[int, dict], key: str, ms: bool = False):
+    """One metric family from a {symbol_id: stats} dict; `ms` values become seconds."""
+    return name, kind, help, [
+        ({"symbol_id": sid}, s[key] / 1000 if ms else s[key]) for sid, s in stats.items()
+    ]
+
+
+def collect_sequencer():
+    stats = sequencer.stats()
+    return [
+        per_symbol("sequencer_queue_depth", "gauge", "Jobs waiting per symbol.", stats, "depth"),
+        per_symbol("sequencer_jobs_total", "counter", "Jobs started per symbol.", stats, "processed"),
+        per_symbol("sequencer_wait_avg_seconds", "gauge", "Mean queue wait before a job started.",
+                   stats, "avg_wait_ms", ms=True),
+        per_symbol("sequencer_wait_max_seconds", "gauge", "Longest queue wait before a job started.",
+                   stats, "max_wait_ms", ms=True),
+        per_symbol("sequencer_groups_total", "counter", "Grouped runs per symbol.", stats, "groups"),
+    ]
+
+
+def collect_commits():
+    stats = commit_stats.stats()
+    return [
+        per_symbol("order_commits_total", "counter", "/orders/new commits per symbol.", stats, "commits"),
+        per_symbol("order_commit_orders_total", "counter", "Orders carried by those commits.",
+                   stats, "orders"),
+        per_symbol("order_commit_failures_total", "counter", "Commits that raised.", stats, "failed"),
+        per_symbol("order_commit_avg_seconds", "gauge", "Mean commit latency.", stats,
+                   "avg_commit_ms", ms=True),
+        per_symbol("order_commit_max_seconds", "gauge", "Longest commit.", stats,
+                   "max_commit_ms", ms=True),
+    ]
+
+
+def collect_websockets():
+    stats = manager.get_stats()
+    return [
+        ("ws_connections", "gauge", "Accepted WebSocket connections.",
+         [({}, len(manager.subscribers))]),
+        per_symbol("ws_subscribers", "gauge", "Subscriptions per symbol, all streams.",
+                   stats, "subscribers"),
+        per_symbol("ws_broadcasts_total", "counter", "Broadcasts per symbol.", stats, "messages"),
+        per_symbol("ws_sends_total", "counter", "Per-client broadcast sends.", stats, "sent"),
+        per_symbol("ws_dropped_total", "counter", "Sends dropped on a full client queue.",
+                   stats, "dropped"),
+        per_symbol("ws_evicted_total", "counter", "Clients evicted as slow or dead.",
+                   stats, "evicted"),
+    ]
+
+
+def collect_journal():
+    if not journal.enabled:
+        return []
+    stats = journal.get_stats()
+    return [
+        (f"order_journal_{key}_total", "counter", help, [({}, stats[key])])
+        for key, help in (
+            ("records", "Journal records written."),
+            ("batches", "Journal writes, one fsync each."),
+            ("bytes", "Journal bytes written."),
+            ("checkpoints", "Checkpoints written."),
+            ("write_errors", "Failed journal writes."),
+        )
+    ] + [
+        ("order_journal_pending", "gauge", "Records not yet durable.", [({}, stats["pending"])]),
+        ("order_journal_failed", "gauge", "1 once a write failed; order changes are refused.",
+         [({}, int(stats["failed"]))]),
+    ]
+
+
+def collect_book_feed():
+    if not book_feed.enabled:
+        return []
+    stats = book_feed.get_stats()
+    return [
+        ("book_feed_leader", "gauge", "1 on the publishing worker.", [({}, int(stats["leader"]))]),
+        ("book_feed_published_total", "counter", "Snapshots published.", [({}, stats["published"])]),
+        ("book_feed_relayed_total", "counter", "Snapshots relayed to local sockets.",
+         [({}, stats["relayed"])]),
+        ("book_feed_errors_total", "counter", "Snapshot and Redis errors.",
+         [({"kind": "compute"}, stats["compute_errors"]), ({"kind": "redis"}, stats["redis_errors"])]),
+    ]
+
+
+for collect in (collect_sequencer, collect_commits, collect_websockets, collect_journal, collect_book_feed):
+    registry.add_collector(collect)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrics",
+    description="Request latency and DB time per route, match time, fills per order, "
+                "WebSocket fan-out, background loop timings and event loop lag, in the "
+                "Prometheus text format. Needs `Authorization: Bearer <METRICS_TOKEN>` "
+                "when `METRICS_TOKEN` is set."
+)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and not secrets.compare_digest(
+        authorization or "", f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access metrics",
+        )
+    # On the event loop, like the WebSocket state it reads
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/profile", summary="Get profiler status (admin only)",
+    description="The running window profile, whether request profiling is armed, and the "
+                "latest profiles written (collapsed stacks, for flamegraph.pl or speedscope)."
+)
+async def get_profile_status(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access profiling",
+        )
+    return profiler.status()
+
+
+@router.post("/profile/window", summary="Profile the whole process for a while (admin only)",
+    description="Samples every thread (request handlers, sequencer jobs, background loops "
+                "such as update_order_book) for `seconds`, then writes one profile."
+)
+async def start_window_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access profiling",
+        )
+    if profiler.window is not None:
+        raise HTTPException(status_code=409, detail="A window profile is already running")
+    profiler.start_window(seconds)
+    return profiler.status()
+
+
+@router.post("/profile/requests", summary="Profile requests carrying a header (admin only)",
+    description=f"For `seconds`, requests sent with `{PROFILE_HEADER}: <token>` are profiled "
+                "one by one, each into its own file. Arming again replaces the token."
+)
+async def arm_request_profiling(
+    seconds: float = Query(300, gt=0, le=PROFILE_MAX_SECONDS),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access profiling",
+        )
+    token = profiler.arm(seconds)
+    return {"header": PROFILE_HEADER, "token": token, "seconds": seconds}
+
+
+@router.post("/profile/stop", summary="Stop profiling (admin only)",
+    description="Disarms request profiling and ends the window profile early, writing "
+                "what it sampled so far."
+)
+async def stop_profiling(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access profiling",
+        )
+    profiler.stop()
+    return profiler.status()
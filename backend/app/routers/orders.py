@@ -1,84 +1,308 @@
-from typing import List
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
 
 import redis.asyncio as redis  # Use redis-py async client
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Response, status
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import distinct, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import SessionLocal, get_async_db
+from app.group_commit import (ORDER_GROUP_COMMIT, ORDER_GROUP_COMMIT_MAX,
+                              ORDER_GROUP_COMMIT_WINDOW_MS, commit_stats)
+from app.journal import journal
 from app.models import *
+from app.orderbook import OPEN_STATUSES, order_books
+from app.pagination import Page, page_params, paginate
 from app.schemas import *
+from app.sequencer import sequencer
+from app.ticks import tick_sizes
 
 from .auth import get_current_user
-from .matching import match_order
+from .matching import match_order, pull_orders, reduce_order
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
+def require_journal():
+    # No order changes once the journal can't record them
+    if journal.failed:
+        raise HTTPException(status_code=503, detail="Order journal unavailable")
+
+
 # Create a new order
 @router.post(
     "/new",
     response_model=OrderResponse,
-    dependencies=[Depends(RateLimiter(times=2, seconds=15))],
+    dependencies=[Depends(require_journal), Depends(RateLimiter(times=2, seconds=15))],
     summary="Create a new order",
     description="Allows an authenticated user to create a **new order**. "
                 "The ticker is auto-filled from the selected symbol. "
                 "Rate limited to **2 requests every 15 seconds**."
 )
-def create_order(
+async def create_order(
     order: OrderCreate,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    # No queue for a symbol that doesn't exist
+    await require_symbol(order.symbol_id)
+    # Orders for one symbol are applied one at a time by its sequencer queue
+    if ORDER_GROUP_COMMIT:
+        # Queued with other new orders of the symbol, answered after their shared commit
+        return await sequencer.submit_grouped(
+            order.symbol_id,
+            place_order_group,
+            (order, current_user.id),
+            ORDER_GROUP_COMMIT_WINDOW_MS / 1000,
+            ORDER_GROUP_COMMIT_MAX,
+        )
+    return await sequencer.submit(
+        order.symbol_id, session_job, place_order, order, current_user.id
+    )
+
+
+def session_job(fn, *args):
+    """
+    Run `fn(db, *args)` on the sequencer thread with a Session opened by the
+    job itself, never one tied to the request that queued it (grouped orders
+    open theirs in place_order_group).
+    """
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
 
+
+def place_order(db: Session, order: OrderCreate, user_id: int) -> Order:
     # Check if the symbol exists
     symbol = db.query(Symbol).filter(Symbol.id == order.symbol_id).first()
     if not symbol:
         raise HTTPException(status_code=404, detail="Symbol not found")
-    print("symbol", symbol)
 
+    price_ticks = price_in_ticks(db, symbol, order)
     db_order = Order(
-        user_id=current_user.id,
+        user_id=user_id,
         symbol_id=symbol.id,
         ticker=symbol.ticker,  # auto-fill ticker from symbol
         side=order.side,
         quantity=order.quantity,
         exec_qty=0,
-        price=order.price,
+        price_ticks=price_ticks,
         type=order.type,
     )
 
-
-    # db.add(db_order)
-    # db.commit()
-    # db.refresh(db_order)
-
-    # match_order(db_order, db)
-
     db.add(db_order)
     db.flush()  # generate ID for trades
 
-    match_order(db_order, db)
-
     try:
+        match_order(db_order, db)
+        order_books.stage(db, symbol.id)  # book visible once committed
+        started = time.perf_counter()
         db.commit()  # commit everything atomically
-    except SQLAlchemyError:
+    except Exception:
         db.rollback()  # revert everything
+        commit_stats.record_failure(symbol.id)
+        order_books.reload(db, symbol.id)  # drop fills that never committed
+        order_books.publish(symbol.id)
         raise  # propagate the error
+    commit_stats.record(symbol.id, 1, time.perf_counter() - started)
     db.refresh(db_order)
+    return db_order
 
 
-    return db_order
+def place_order_group(items: List[Tuple[OrderCreate, int]]) -> list:
+    """
+    Accept a group of new orders for one symbol, (order, user_id) in queue
+    order, with a single commit. Each order is matched inside its own
+    savepoint so one that fails doesn't take the others down. Returns the
+    Order or the exception for each item; nobody is answered before the
+    shared commit, so an acknowledged order is as durable as with
+    place_order.
+    """
+    symbol_id = items[0][0].symbol_id
+    db = SessionLocal()
+    try:
+        symbol = db.query(Symbol).filter(Symbol.id == symbol_id).first()
+        if not symbol:
+            return [HTTPException(status_code=404, detail="Symbol not found")] * len(items)
+
+        outcomes = []
+        try:
+            for order, user_id in items:
+                savepoint = None
+                try:
+                    price_ticks = price_in_ticks(db, symbol, order)
+                    savepoint = db.begin_nested()
+                    db_order = Order(
+                        user_id=user_id,
+                        symbol_id=symbol.id,
+                        ticker=symbol.ticker,
+                        side=order.side,
+                        quantity=order.quantity,
+                        exec_qty=0,
+                        price_ticks=price_ticks,
+                        type=order.type,
+                    )
+                    db.add(db_order)
+                    db.flush()
+                    match_order(db_order, db)
+                    savepoint.commit()
+                except Exception as e:
+                    # This order only: the others of the group still go through
+                    if savepoint is not None:
+                        savepoint.rollback()
+                        # Book back to what this transaction holds so far
+                        order_books.reload(db, symbol.id)
+                    outcomes.append(e)
+                    continue
+                outcomes.append(db_order)
+
+            order_books.stage(db, symbol.id)
+            started = time.perf_counter()
+            db.commit()  # one commit (one WAL flush) for the group
+        except Exception:
+            db.rollback()
+            commit_stats.record_failure(symbol.id)
+            order_books.reload(db, symbol.id)
+            order_books.publish(symbol.id)
+            raise
+        accepted = [o for o in outcomes if isinstance(o, Order)]
+        commit_stats.record(symbol.id, len(accepted), time.perf_counter() - started)
+
+        # Load them before the session closes; one query for the group
+        if accepted:
+            db.query(Order).filter(Order.id.in_([o.id for o in accepted])).all()
+        return outcomes
+    finally:
+        db.close()
+
+
+async def require_symbol(symbol_id: int):
+    if not await tick_sizes.exists(symbol_id):
+        raise HTTPException(status_code=404, detail="Symbol not found")
+
+
+def price_in_ticks(db: Session, symbol: Symbol, order) -> int:
+    # Market orders never rest, their price is only rounded
+    try:
+        return tick_sizes.to_ticks(symbol.id, order.price, db, exact=order.type == "L")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Submit several orders (and cancels) for one symbol in one request
+@router.post(
+    "/batch",
+    response_model=OrderBatchResponse,
+    dependencies=[Depends(require_journal), Depends(RateLimiter(times=2, seconds=15))],
+    summary="Submit a batch of orders",
+    description="Cancels and then places up to **100 orders each** for a single symbol, "
+                "matched in sequence and committed in **one transaction**. "
+                "Cancels that can't be applied are reported per order and don't fail the batch. "
+                "Rate limited like `/orders/new`."
+)
+async def create_order_batch(
+    batch: OrderBatch,
+    current_user: User = Depends(get_current_user),
+):
+    await require_symbol(batch.symbol_id)
+    return await sequencer.submit(
+        batch.symbol_id, session_job, place_order_batch, batch, current_user.id
+    )
+
+
+def place_order_batch(db: Session, batch: OrderBatch, user_id: int) -> dict:
+    symbol = db.query(Symbol).filter(Symbol.id == batch.symbol_id).first()
+    if not symbol:
+        raise HTTPException(status_code=404, detail="Symbol not found")
+    # Reject the whole batch before touching anything if one price is off-tick
+    prices = [price_in_ticks(db, symbol, item) for item in batch.orders]
+
+    owned = {
+        order_id
+        for (order_id,) in db.query(Order.id).filter(
+            Order.id.in_(batch.cancels),
+            Order.user_id == user_id,
+            Order.symbol_id == symbol.id,
+        )
+    }
+    db_orders = []
+    try:
+        pulled = set(
+            pull_orders(
+                db,
+                symbol.id,
+                [order_id for order_id in dict.fromkeys(batch.cancels) if order_id in owned],
+            )
+        )
+        if pulled:
+            db.execute(
+                update(Order)
+                .where(Order.id.in_(pulled))
+                .values(status=OrderStatus.cancelled)
+            )
+            journal.record_cancels(db, symbol.id, sorted(pulled))
+        cancels = []
+        for order_id in batch.cancels:
+            if order_id not in owned:
+                cancels.append(
+                    {"order_id": order_id, "cancelled": False, "detail": "Order not found"}
+                )
+            elif order_id not in pulled:
+                cancels.append(
+                    {"order_id": order_id, "cancelled": False, "detail": "Order is not open"}
+                )
+            else:
+                pulled.discard(order_id)  # a repeated id reports "not open"
+                cancels.append({"order_id": order_id, "cancelled": True})
+
+        for item, price_ticks in zip(batch.orders, prices):
+            db_order = Order(
+                user_id=user_id,
+                symbol_id=symbol.id,
+                ticker=symbol.ticker,
+                side=item.side,
+                quantity=item.quantity,
+                exec_qty=0,
+                price_ticks=price_ticks,
+                type=item.type,
+            )
+            db.add(db_order)
+            db.flush()
+            match_order(db_order, db)
+            db_orders.append(db_order)
+        order_ids = [o.id for o in db_orders]
+
+        order_books.stage(db, symbol.id)
+        db.commit()  # one commit for the whole batch
+    except Exception:
+        db.rollback()
+        order_books.reload(db, symbol.id)
+        order_books.publish(symbol.id)
+        raise
+
+    # One query reloads every expired order instead of a refresh per order
+    if order_ids:
+        db.query(Order).filter(Order.id.in_(order_ids)).all()
+    return {"cancels": cancels, "orders": db_orders}
 
 
 # Get all orders (for admin or general purpose)
 @router.get("/all", response_model=List[OrderResponse], summary="Get all orders (admin only)",
-    description="Returns a list of **all orders in the system**. "
+    description="Returns a list of **all orders in the system**, oldest first, all at once "
+                "or one page at a time with `limit`/`cursor` (see `X-Next-Cursor`), "
+                "or everything as NDJSON with `format=ndjson`. "
                 "Only users with role `admin` can access this endpoint."
 )
-def get_all_orders(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+async def get_all_orders(
+    response: Response,
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
 ):
 
     if current_user.role != "admin":
@@ -87,67 +311,253 @@ def get_all_orders(
             detail="Not authorized to access all orders",
         )
 
-    orders = db.query(Order).all()
-    return orders
+    return await paginate(db, select(Order), Order, page, OrderResponse, response)
+
+
+# Matching queue depth / wait per symbol
+@router.get("/queues", summary="Get matching queue stats (admin only)",
+    description="Returns, per symbol, the number of orders waiting for the matcher "
+                "and how long they waited before being processed."
+)
+async def get_queue_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access queue stats",
+        )
+    return sequencer.stats()
+
+
+# Orders per commit and commit latency of /orders/new
+@router.get("/commits", summary="Get order commit stats (admin only)",
+    description="Returns, per symbol, how many orders each `/orders/new` commit carried "
+                "(more than one with `ORDER_GROUP_COMMIT`) and how long the commits took."
+)
+async def get_commit_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access commit stats",
+        )
+    return commit_stats.stats()
 
 
 # Get current user's orders
 @router.get("/me", response_model=List[OrderResponse], summary="Get my orders",
-    description="Fetches all orders that belong to the **currently authenticated user**."
+    description="Fetches the orders that belong to the **currently authenticated user**, "
+                "paginated like `/orders/all`."
 )
-def get_my_orders(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+async def get_my_orders(
+    response: Response,
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
 ):
-    orders = (
-        db.query(Order)
-        .filter(Order.user_id == current_user.id)
-        .options(joinedload(Order.user), joinedload(Order.symbol))
-        .all()
+    stmt = select(Order).where(Order.user_id == current_user.id)
+    return await paginate(db, stmt, Order, page, OrderResponse, response)
+
+
+def cancel_open_orders(
+    db: Session, symbol_id: int, user_id: int, order_ids: Optional[List[int]] = None
+) -> List[int]:
+    """
+    Cancel a user's open orders on one symbol (all of them, or only
+    `order_ids`) with a single UPDATE. Runs as a job on the symbol's
+    sequencer, so it never interleaves with matching.
+    """
+    query = db.query(Order.id).filter(
+        Order.symbol_id == symbol_id,
+        Order.user_id == user_id,
+        Order.status.in_(OPEN_STATUSES),
+    )
+    if order_ids is not None:
+        query = query.filter(Order.id.in_(order_ids))
+
+    try:
+        pulled = pull_orders(db, symbol_id, [order_id for (order_id,) in query])
+        if not pulled:
+            return pulled
+        db.execute(
+            update(Order)
+            .where(Order.id.in_(pulled))
+            .values(status=OrderStatus.cancelled)
+        )
+        journal.record_cancels(db, symbol_id, pulled)
+        order_books.stage(db, symbol_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        order_books.reload(db, symbol_id)
+        order_books.publish(symbol_id)
+        raise
+    return pulled
+
+
+def cancel_one(db: Session, symbol_id: int, user_id: int, order_id: int) -> Order:
+    if not cancel_open_orders(db, symbol_id, user_id, [order_id]):
+        raise HTTPException(
+            status_code=400,
+            detail="Only pending or partially filled orders can be cancelled",
+        )
+    return db.get(Order, order_id)
+
+
+# Cancel all open orders of the current user
+@router.delete("/cancel-all", response_model=CancelAllResponse, summary="Cancel all my open orders",
+    dependencies=[Depends(require_journal)],
+    description="Cancels every **pending or partially filled** order of the current user, "
+                "or only those on `symbol_id` when it is given. "
+                "Each symbol is cancelled in one step on its matching queue."
+)
+async def cancel_all_orders(
+    symbol_id: Optional[int] = None,
+    async_db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    stmt = select(distinct(Order.symbol_id)).where(
+        Order.user_id == current_user.id, Order.status.in_(OPEN_STATUSES)
     )
-    return orders
+    if symbol_id is not None:
+        stmt = stmt.where(Order.symbol_id == symbol_id)
+    symbol_ids = (await async_db.execute(stmt)).scalars().all()
+
+    cancelled = []
+    for sid in symbol_ids:
+        cancelled += await sequencer.submit(
+            sid, session_job, cancel_open_orders, sid, current_user.id
+        )
+    return {"cancelled": cancelled}
 
 
 # Cancel an order
 @router.delete("/cancel/{order_id}", response_model=OrderResponse, summary="Cancel an order",
+    dependencies=[Depends(require_journal)],
     description="Cancels an **existing order** by its ID. "
-                "Only the order owner can cancel it, and only if its status is **pending**."
+                "Only the order owner can cancel it, and only while it is **pending** or "
+                "**partially filled**; the unfilled remainder leaves the book."
 )
-def cancel_order(
+async def cancel_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
+    result = await async_db.execute(
+        select(Order.symbol_id).where(
+            Order.id == order_id, Order.user_id == current_user.id
+        )
+    )
+    symbol_id = result.scalar()
+    if symbol_id is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    # Same queue as matching for this symbol, no race with an incoming order
+    return await sequencer.submit(
+        symbol_id, session_job, cancel_one, symbol_id, current_user.id, order_id
+    )
+
+
+# Amend an order in place instead of cancel + new
+@router.patch(
+    "/{order_id}",
+    response_model=OrderResponse,
+    dependencies=[Depends(require_journal), Depends(RateLimiter(times=2, seconds=15))],
+    summary="Amend an order",
+    description="Changes the **quantity** and/or **price** of an open limit order. "
+                "`quantity` is the new total, including what already executed. "
+                "Reducing the quantity keeps the order's **time priority**; a price change "
+                "or a quantity increase sends it to the back of the queue and may match "
+                "straight away. Rate limited like `/orders/new`."
+)
+async def amend_order(
+    order_id: int,
+    amend: OrderAmend,
+    async_db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    if amend.quantity is None and amend.price is None:
+        raise HTTPException(status_code=400, detail="Nothing to amend")
+    result = await async_db.execute(
+        select(Order.symbol_id).where(
+            Order.id == order_id, Order.user_id == current_user.id
+        )
+    )
+    symbol_id = result.scalar()
+    if symbol_id is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    return await sequencer.submit(
+        symbol_id, session_job, amend_one, symbol_id, current_user.id, order_id, amend
+    )
+
+
+def amend_one(
+    db: Session, symbol_id: int, user_id: int, order_id: int, amend: OrderAmend
+) -> Order:
     order = (
         db.query(Order)
-        .filter(Order.id == order_id, Order.user_id == current_user.id)
+        .filter(
+            Order.id == order_id,
+            Order.user_id == user_id,
+            Order.status.in_(OPEN_STATUSES),
+        )
         .first()
     )
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    if order.status != OrderStatus.pending:
+    if order is None:
         raise HTTPException(
-            status_code=400, detail="Only pending orders can be cancelled"
+            status_code=400,
+            detail="Only pending or partially filled orders can be amended",
         )
 
-    order.status = OrderStatus.cancelled
-    db.commit()
+    quantity = order.quantity if amend.quantity is None else amend.quantity
+    price_ticks = order.price_ticks
+    if amend.price is not None:
+        try:
+            price_ticks = tick_sizes.to_ticks(symbol_id, amend.price, db)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if quantity <= order.exec_qty:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Quantity must exceed the executed quantity ({order.exec_qty})",
+        )
+    if quantity == order.quantity and price_ticks == order.price_ticks:
+        return order
+
+    try:
+        if price_ticks == order.price_ticks and quantity < order.quantity:
+            # Same price, smaller size: stays where it is in the queue
+            if not reduce_order(db, order, quantity):
+                raise HTTPException(status_code=400, detail="Order is not open")
+            order.quantity = quantity
+        else:
+            # Re-enters as a new aggressor, behind everything at its price
+            if not pull_orders(db, symbol_id, [order.id]):
+                raise HTTPException(status_code=400, detail="Order is not open")
+            order.quantity = quantity
+            order.price_ticks = price_ticks
+            order.timestamp = datetime.utcnow()
+            match_order(order, db)
+        order_books.stage(db, symbol_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        order_books.reload(db, symbol_id)
+        order_books.publish(symbol_id)
+        raise
     db.refresh(order)
     return order
 
 
 @router.get("/symbol/{symbol_id}", response_model=List[OrderResponse], summary="Get orders by symbol",
-    description="Fetches all orders that are linked to a given **symbol ID**. "
-                "Includes related user and symbol details."
+    description="Fetches the orders that are linked to a given **symbol ID**, "
+                "paginated like `/orders/all`."
 )
-def get_orders_by_symbol(
+async def get_orders_by_symbol(
     symbol_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
 ):
-    orders = (
-        db.query(Order)
-        .filter(Order.symbol_id == symbol_id)
-        .options(joinedload(Order.user), joinedload(Order.symbol))
-        .all()
-    )
-    return orders
+    stmt = select(Order).where(Order.symbol_id == symbol_id)
+    return await paginate(db, stmt, Order, page, OrderResponse, response)
@@ -1,10 +1,11 @@
 from typing import List
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import models, schemas
-from app.database import get_db
+from app.database import get_async_db
 
 from .auth import get_current_user
 
@@ -15,7 +16,9 @@ router = APIRouter()
     description="Fetches a list of all available **symbols/instruments** in the system. "
                 "Accessible by any authenticated user."
 )
-def get_symbols(
-    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+async def get_symbols(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user),
 ):
-    return db.query(models.Symbol).all()
+    result = await db.execute(select(models.Symbol))
+    return result.scalars().all()
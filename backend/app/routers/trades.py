@@ -1,10 +1,12 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import *
+from app.pagination import Page, page_params, paginate
 from app.schemas import *
 
 from .auth import get_current_user
@@ -14,11 +16,16 @@ router = APIRouter(prefix="/trades", tags=["trades"])
 
 # Get all trades (admin/general purpose)
 @router.get("/all", response_model=List[TradeResponse], summary="Get all trades",
-    description="Retrieve a list of all executed trades in the system. "
+    description="Retrieve executed trades, oldest first, all at once or one page at a time with "
+                "`limit`/`cursor` (see `X-Next-Cursor`), "
+                "or everything as NDJSON with `format=ndjson`. "
                 "⚠️ Only users with the **admin** role are allowed to access this endpoint."
 )
-def get_all_trades(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+async def get_all_trades(
+    response: Response,
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
 ):
 
     if current_user.role != "admin":
@@ -27,34 +34,38 @@ def get_all_trades(
             detail="Not authorized to access all trades",
         )
 
-    trades = db.query(Trade).all()
-    return trades
+    return await paginate(db, select(Trade), Trade, page, TradeResponse, response)
 
 
 # Get trades of current user
 @router.get("/me", response_model=List[TradeResponse], summary="Get my trades",
-    description="Fetch all trades where the current authenticated user was involved "
-                "(either as a **buyer** or a **seller**)."
+    description="Fetch trades where the current authenticated user was involved "
+                "(either as a **buyer** or a **seller**), paginated like `/trades/all`."
 )
-def get_my_trades(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+async def get_my_trades(
+    response: Response,
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
 ):
-    trades = (
-        db.query(Trade)
-        .filter(
-            (Trade.buy_user_id == current_user.id)
-            | (Trade.sell_user_id == current_user.id)
-        )
-        .all()
+    stmt = select(Trade).where(
+        (Trade.buy_user_id == current_user.id)
+        | (Trade.sell_user_id == current_user.id)
     )
-    return trades
+    return await paginate(db, stmt, Trade, page, TradeResponse, response)
 
 
 # Get trades by symbol
 @router.get("/symbol/{symbol_id}", response_model=List[TradeResponse], summary="Get trades by symbol",
-    description="Fetch all trades for a specific **symbol** identified by its `symbol_id`. "
+    description="Fetch trades for a specific **symbol** identified by its `symbol_id`, "
+                "paginated like `/trades/all`. "
                 "Useful for analyzing the trade history of a particular instrument."
 )
-def get_trades_by_symbol(symbol_id: int, db: Session = Depends(get_db)):
-    trades = db.query(Trade).filter(Trade.symbol_id == symbol_id).all()
-    return trades
+async def get_trades_by_symbol(
+    symbol_id: int,
+    response: Response,
+    page: Page = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
+):
+    stmt = select(Trade).where(Trade.symbol_id == symbol_id)
+    return await paginate(db, stmt, Trade, page, TradeResponse, response)
@@ -1,38 +1,308 @@
 import asyncio
-from typing import Dict, List
+import json
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
 from sqlalchemy import func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app import metrics
+from app.book_feed import book_feed
 from app.database import SessionLocal
-from app.models import Order, Trade
+from app.models import Order, Trade, User
+from app.orderbook import OrderBook, order_books
+from app.ticks import tick_sizes
+from app.trade_tape import trade_tape
+
+from . import matching
+from .auth import get_current_user
 
 router = APIRouter()
 
 
+# Full snapshots pushed to delta-mode subscribers so they can resync
+SNAPSHOT_INTERVAL = float(os.getenv("ORDERBOOK_SNAPSHOT_INTERVAL", "10"))
+# Per-client outbound buffering: a client that can't keep up loses messages
+# instead of holding back everyone else, and is evicted once a send stalls
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Streams one /ws/market socket may follow
+WS_MAX_SUBSCRIPTIONS = int(os.getenv("WS_MAX_SUBSCRIPTIONS", "100"))
+
+
+class BroadcastStats:
+    __slots__ = (
+        "messages", "sent", "dropped", "evicted", "send_time", "max_send_time", "histogram",
+    )
+
+    def __init__(self, symbol_id: int):
+        self.messages = 0  # broadcasts for the symbol
+        self.sent = 0  # per-client broadcast sends completed
+        self.dropped = 0  # per-client broadcasts dropped on a full queue
+        self.evicted = 0  # clients disconnected for being slow/dead
+        self.send_time = 0.0  # queued -> sent, summed over `sent`
+        self.max_send_time = 0.0
+        self.histogram = metrics.ws_send_seconds.labels(symbol_id)
+
+
+class Subscriber:
+    """
+    One socket with a bounded outbound queue drained by its own task, and the
+    (mode, symbol_id) streams it follows.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.topics: Set[Tuple[str, int]] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.task = asyncio.create_task(self._run())
+
+    def offer(self, text: str, stats: Optional[BroadcastStats] = None) -> bool:
+        try:
+            self.queue.put_nowait((text, time.perf_counter(), stats))
+        except asyncio.QueueFull:
+            if stats is not None:
+                stats.dropped += 1
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            text, queued_at, stats = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), SEND_TIMEOUT)
+            except Exception:
+                # Timed out or dead socket: only this client is affected
+                manager.evict(self.websocket)
+                return
+            if stats is None:
+                continue
+            elapsed = time.perf_counter() - queued_at
+            stats.sent += 1
+            stats.send_time += elapsed
+            stats.max_send_time = max(stats.max_send_time, elapsed)
+            stats.histogram.observe(elapsed)
+
+
 class ConnectionManager:
+    """
+    Sockets and their subscriptions, indexed both ways so subscribe,
+    unsubscribe and disconnect cost O(subscriptions of that socket)
+    whatever the number of clients or symbols.
+    """
+
     def __init__(self):
-        # {symbol_id: [WebSocket, ...]}
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        # {WebSocket: Subscriber}, every accepted socket
+        self.subscribers: Dict[WebSocket, Subscriber] = {}
+        # {symbol_id: {WebSocket: Subscriber}}, periodic top-5 snapshots (default)
+        self.active_connections: Dict[int, Dict[WebSocket, Subscriber]] = {}
+        # {symbol_id: {WebSocket: Subscriber}}, event-driven deltas
+        self.delta_connections: Dict[int, Dict[WebSocket, Subscriber]] = {}
+        # {symbol_id: {WebSocket: Subscriber}}, trade prints (see ws_trades)
+        self.trade_connections: Dict[int, Dict[WebSocket, Subscriber]] = {}
+        # {symbol_id: {WebSocket: Subscriber}}, candle updates (see market)
+        self.candle_connections: Dict[int, Dict[WebSocket, Subscriber]] = {}
+        # {symbol_id: BroadcastStats}
+        self.stats: Dict[int, BroadcastStats] = {}
 
-    async def connect(self, websocket: WebSocket, symbol_id: int):
+    def _connections(self, mode: str) -> Dict[int, Dict[WebSocket, Subscriber]]:
+        if mode == "trades":
+            return self.trade_connections
+        if mode == "candles":
+            return self.candle_connections
+        return self.delta_connections if mode == "delta" else self.active_connections
+
+    async def connect(
+        self, websocket: WebSocket, symbol_id: Optional[int] = None, mode: str = "snapshot"
+    ):
         await websocket.accept()
-        self.active_connections.setdefault(symbol_id, []).append(websocket)
+        self.subscribers[websocket] = Subscriber(websocket)
+        if symbol_id is not None:
+            self.subscribe(websocket, symbol_id, mode)
+
+    def subscribe(self, websocket: WebSocket, symbol_id: int, mode: str = "snapshot") -> bool:
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return False
+        if symbol_id not in self.stats:
+            self.stats[symbol_id] = BroadcastStats(symbol_id)
+        subscriber.topics.add((mode, symbol_id))
+        self._connections(mode).setdefault(symbol_id, {})[websocket] = subscriber
+        return True
 
-    def disconnect(self, websocket: WebSocket):
-        for conns in self.active_connections.values():
-            if websocket in conns:
-                conns.remove(websocket)
+    def unsubscribe(self, websocket: WebSocket, symbol_id: int, mode: str = "snapshot") -> bool:
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None or (mode, symbol_id) not in subscriber.topics:
+            return False
+        subscriber.topics.discard((mode, symbol_id))
+        connections = self._connections(mode)
+        conns = connections[symbol_id]
+        del conns[websocket]
+        if not conns:
+            del connections[symbol_id]
+        return True
 
-    async def broadcast(self, symbol_id: int, message: dict):
-        for connection in self.active_connections.get(symbol_id, []):
-            await connection.send_json(message)
+    def disconnect(self, websocket: WebSocket) -> bool:
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return False
+        for mode, symbol_id in list(subscriber.topics):
+            self.unsubscribe(websocket, symbol_id, mode)
+        del self.subscribers[websocket]
+        subscriber.task.cancel()
+        return True
+
+    def evict(self, websocket: WebSocket):
+        """Drop a slow or dead client; its handler sees the close and exits."""
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return
+        for symbol_id in {symbol_id for _, symbol_id in subscriber.topics}:
+            self.stats[symbol_id].evicted += 1
+        self.disconnect(websocket)
+        asyncio.create_task(self._close(websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def send(self, websocket: WebSocket, message: dict):
+        await self.send_text(websocket, dumps(message))
+
+    async def send_text(self, websocket: WebSocket, text: str):
+        """Queue a message for one client, behind anything already queued for it."""
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is not None:
+            subscriber.offer(text)
+
+    async def broadcast(self, symbol_id: int, message: dict, mode: str = "snapshot"):
+        """Serialize once and queue for every subscriber; never waits on a socket."""
+        if self._connections(mode).get(symbol_id):
+            await self.broadcast_text(symbol_id, dumps(message), mode)
+
+    async def broadcast_text(self, symbol_id: int, text: str, mode: str = "snapshot"):
+        self.broadcast_nowait(symbol_id, text, mode)
+
+    def broadcast_nowait(self, symbol_id: int, text: str, mode: str = "snapshot"):
+        """broadcast_text for plain callbacks; queues only, so nothing to await."""
+        conns = self._connections(mode).get(symbol_id)
+        if not conns:
+            return
+        stats = self.stats[symbol_id]
+        stats.messages += 1
+        for subscriber in conns.values():
+            subscriber.offer(text, stats)
+
+    def get_stats(self) -> Dict[int, dict]:
+        result = {}
+        for symbol_id, s in self.stats.items():
+            result[symbol_id] = {
+                "subscribers": len(self.active_connections.get(symbol_id, ()))
+                + len(self.delta_connections.get(symbol_id, ()))
+                + len(self.trade_connections.get(symbol_id, ()))
+                + len(self.candle_connections.get(symbol_id, ())),
+                "messages": s.messages,
+                "sent": s.sent,
+                "dropped": s.dropped,
+                "evicted": s.evicted,
+                "avg_send_ms": round(s.send_time / s.sent * 1000, 3) if s.sent else 0.0,
+                "max_send_ms": round(s.max_send_time * 1000, 3),
+            }
+        return result
+
+
+def dumps(message: dict) -> str:
+    # Same encoding as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
 
 
 manager = ConnectionManager()
 
 
+class BookEvents:
+    """Collects symbols whose book changed; notify() is safe from any thread."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._dirty: Set[int] = set()
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._dirty = set()
+
+    def notify(self, symbol_id: int):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._mark, symbol_id)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    def _mark(self, symbol_id: int):
+        self._dirty.add(symbol_id)
+        self._event.set()
+
+    async def wait(self, timeout: float) -> Set[int]:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+
+class StreamFeed:
+    """
+    Hands updates committed on any thread to the event loop and broadcasts
+    them to the `mode` stream as {"type": mode, "symbol_id": ..., mode: items}.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def notify(self, symbol_id: int, items: List[dict]):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._broadcast, symbol_id, items)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    def _broadcast(self, symbol_id: int, items: List[dict]):
+        if symbol_id not in manager._connections(self.mode):
+            return
+        manager.broadcast_nowait(
+            symbol_id,
+            dumps({"type": self.mode, "symbol_id": symbol_id, self.mode: items}),
+            mode=self.mode,
+        )
+
+
+book_events = BookEvents()
+order_books.add_listener(book_events.notify)
+# Shared feed only: changes reported to the publishing worker through Redis
+feed_events = BookEvents()
+order_books.add_listener(feed_events.notify)
+
+# {symbol_id: last delta sequence number}
+delta_seq: Dict[int, int] = {}
+
+
+# DB-side aggregation: snapshots under the sql engine and for the shared feed,
+# and a cross-check of the in-memory book against the orders/trades tables.
+# Both block: from async code go through fetch_order_book().
 def get_ltp(db: Session, symbol_id: int):
     trade = (
         db.query(Trade)
@@ -42,15 +312,15 @@ def get_ltp(db: Session, symbol_id: int):
     )
     if trade:
         # return {"price": trade.price, "quantity": trade.quantity, "timestamp": trade.timestamp}
-        return trade.trade_price
+        return tick_sizes.to_price(symbol_id, trade.price_ticks)
     return None
 
 
-async def get_order_book(db: Session, symbol_id: int):
+def get_order_book(db: Session, symbol_id: int):
     # Aggregate bids
     bids = (
         db.query(
-            Order.price, func.sum(Order.quantity - Order.exec_qty).label("quantity")
+            Order.price_ticks, func.sum(Order.quantity - Order.exec_qty).label("quantity")
         )
         .filter(
             Order.symbol_id == symbol_id,
@@ -58,15 +328,15 @@ async def get_order_book(db: Session, symbol_id: int):
             Order.type == "L",
             Order.status.in_(["pending", "partially_filled"]),
         )
-        .group_by(Order.price)
-        .order_by(Order.price.desc())
+        .group_by(Order.price_ticks)
+        .order_by(Order.price_ticks.desc())
         .all()
     )
 
     # Aggregate asks
     asks = (
         db.query(
-            Order.price, func.sum(Order.quantity - Order.exec_qty).label("quantity")
+            Order.price_ticks, func.sum(Order.quantity - Order.exec_qty).label("quantity")
         )
         .filter(
             Order.symbol_id == symbol_id,
@@ -74,57 +344,370 @@ async def get_order_book(db: Session, symbol_id: int):
             Order.type == "L",
             Order.status.in_(["pending", "partially_filled"]),
         )
-        .group_by(Order.price)
-        .order_by(Order.price.asc())
+        .group_by(Order.price_ticks)
+        .order_by(Order.price_ticks.asc())
         .all()
     )
 
     order_book = {
         "bids": [
-            {"price": b.price, "quantity": b.quantity} for b in bids[:5]
+            {"price": tick_sizes.to_price(symbol_id, b.price_ticks), "quantity": b.quantity}
+            for b in bids[:5]
         ],  # top 5 bids
         "asks": [
-            {"price": a.price, "quantity": a.quantity} for a in asks[:5]
+            {"price": tick_sizes.to_price(symbol_id, a.price_ticks), "quantity": a.quantity}
+            for a in asks[:5]
         ],  # top 5 asks
     }
 
     return order_book
 
 
-async def update_order_book(symbol_ids: List[int]):
+def _fetch_order_book(symbol_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            "symbol_id": symbol_id,
+            "order_book": get_order_book(db, symbol_id),
+            "ltp": get_ltp(db, symbol_id),
+        }
+    finally:
+        db.close()
+
+
+async def fetch_order_book(symbol_id: int) -> dict:
+    """Snapshot aggregated by the DB, computed off the event loop."""
+    return await run_in_threadpool(_fetch_order_book, symbol_id)
+
+
+def _load_book(symbol_id: int) -> OrderBook:
+    db = SessionLocal()
+    try:
+        return order_books.get(db, symbol_id)
+    finally:
+        db.close()
+
+
+async def trade_replay(symbol_id: int) -> dict:
+    if not trade_tape.loaded(symbol_id):
+        await run_in_threadpool(trade_tape.load, symbol_id)
+    return {
+        "type": "replay",
+        "symbol_id": symbol_id,
+        "trades": trade_tape.recent(symbol_id),
+    }
+
+
+async def get_book(symbol_id: int) -> OrderBook:
+    book = order_books.peek(symbol_id)
+    if book is None:
+        # First subscriber of a book not loaded yet, don't block the loop
+        book = await run_in_threadpool(_load_book, symbol_id)
+    return book
+
+
+def book_snapshot(book: OrderBook) -> dict:
+    return {
+        "symbol_id": book.symbol_id,
+        "order_book": book.committed_depth(),
+        "ltp": book.price(book.committed_ltp),
+    }
+
+
+def delta_snapshot(book: OrderBook) -> dict:
+    """Full depth for delta-mode clients; deltas with seq <= `seq` are included."""
+    return {
+        "type": "snapshot",
+        "symbol_id": book.symbol_id,
+        "seq": delta_seq.get(book.symbol_id, 0),
+        "order_book": book.committed_depth(levels=None),
+        "ltp": book.price(book.committed_ltp),
+    }
+
+
+async def send_delta(book: OrderBook):
+    """Drain pending book changes and push them to delta subscribers."""
+    changes = book.drain_changes()
+    symbol_id = book.symbol_id
+    if symbol_id not in manager.delta_connections:
+        return
+    if changes["resync"]:
+        await manager.broadcast(symbol_id, delta_snapshot(book), mode="delta")
+        return
+    if not changes["levels"] and not changes["trades"]:
+        return
+
+    seq = delta_seq[symbol_id] = delta_seq.get(symbol_id, 0) + 1
+    await manager.broadcast(
+        symbol_id,
+        {
+            "type": "delta",
+            "symbol_id": symbol_id,
+            "seq": seq,
+            "levels": changes["levels"],
+            "trades": changes["trades"],
+            "ltp": book.price(book.committed_ltp),
+        },
+        mode="delta",
+    )
+
+
+def snapshots_from_db() -> bool:
+    """
+    Under the sql engine a worker's book only has its own matches; without
+    the shared feed, snapshots are aggregated from the DB as before.
+    """
+    return matching.MATCHING_ENGINE == "sql" and not book_feed.enabled
+
+
+async def update_order_book():
+    # {symbol_id: committed book version last broadcast}
+    sent_versions: Dict[int, int] = {}
+    # {symbol_id: DB snapshot last broadcast}
+    sent_texts: Dict[int, str] = {}
+    timer = metrics.LoopTimer("update_order_book")
     while True:
-        db = SessionLocal()
-        try:
-            for symbol_id in symbol_ids:
-                order_book = await get_order_book(db, symbol_id)
-                ltp = get_ltp(db, symbol_id)
-                await manager.broadcast(
-                    symbol_id,
-                    {"symbol_id": symbol_id, "order_book": order_book, "ltp": ltp},
-                )
-        finally:
-            db.close()
+        with timer:
+            # Only symbols somebody is subscribed to, and only if the book moved
+            for symbol_id, conns in list(manager.active_connections.items()):
+                if conns and snapshots_from_db():
+                    text = dumps(await fetch_order_book(symbol_id))
+                    if sent_texts.get(symbol_id) != text:
+                        sent_texts[symbol_id] = text
+                        await manager.broadcast_text(symbol_id, text)
+                    continue
+                book = order_books.peek(symbol_id)
+                if not conns or book is None:
+                    continue
+                if sent_versions.get(symbol_id) == book.committed_version:
+                    continue
+                sent_versions[symbol_id] = book.committed_version
+                await manager.broadcast(symbol_id, book_snapshot(book))
         await asyncio.sleep(2)
 
 
+async def report_book_changes():
+    """Shared feed: mark the symbols this worker changed for the publisher."""
+    feed_events.bind(asyncio.get_running_loop())
+    while True:
+        await book_feed.mark_dirty(await feed_events.wait(book_feed.interval))
+
+
+async def compute_snapshot(symbol_id: int) -> str:
+    """Shared feed, publishing worker only: one snapshot for every worker."""
+    # From the DB whatever the engine: a worker's book only has its own matches
+    return dumps(await fetch_order_book(symbol_id))
+
+
+async def relay_snapshot(symbol_id: int, text: str):
+    await manager.broadcast_text(symbol_id, text)
+
+
+async def send_book_snapshot(websocket: WebSocket, book: OrderBook):
+    text = await book_feed.get(book.symbol_id) if book_feed.enabled else None
+    if text is not None:
+        await manager.send_text(websocket, text)
+        return
+    if not book_feed.enabled and not snapshots_from_db():
+        await manager.send(websocket, book_snapshot(book))
+        return
+    if not book_feed.enabled:
+        await manager.send(websocket, await fetch_order_book(book.symbol_id))
+        return
+    # Nothing published for this symbol yet: the DB's, and have the publisher do it
+    await manager.send(websocket, await fetch_order_book(book.symbol_id))
+    await book_feed.mark_dirty([book.symbol_id])
+
+
+async def push_order_book_deltas():
+    """Push deltas as soon as a book change is committed, plus periodic snapshots."""
+    loop = asyncio.get_running_loop()
+    book_events.bind(loop)
+    next_snapshot = loop.time() + SNAPSHOT_INTERVAL
+    timer = metrics.LoopTimer("push_order_book_deltas")
+
+    while True:
+        dirty = await book_events.wait(max(0.0, next_snapshot - loop.time()))
+        with timer:
+            for symbol_id in dirty:
+                book = order_books.peek(symbol_id)
+                if book is not None:
+                    await send_delta(book)
+
+            if loop.time() >= next_snapshot:
+                for symbol_id in list(manager.delta_connections):
+                    book = order_books.peek(symbol_id)
+                    if book is not None:
+                        await send_delta(book)
+                        await manager.broadcast(symbol_id, delta_snapshot(book), mode="delta")
+                next_snapshot = loop.time() + SNAPSHOT_INTERVAL
+
+
+def wants_snapshot(text: str) -> bool:
+    if text.strip() == "snapshot":
+        return True
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(message, dict) and message.get("type") == "snapshot"
+
+
+def deltas_available() -> bool:
+    """
+    Deltas come from this worker's book, which sees every change only with
+    the memory engine; under the sql engine other workers' fills are missing.
+    """
+    return matching.MATCHING_ENGINE == "memory"
+
+
+async def reject_unknown_symbol(websocket: WebSocket, symbol_id: int) -> bool:
+    """
+    Refuse the handshake for a symbol that doesn't exist, before any stats,
+    book or subscription is created for it.
+    """
+    if await tick_sizes.exists(symbol_id):
+        return False
+    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    return True
+
+
 @router.websocket("/ws/orderbook/{symbol_id}")
-async def websocket_endpoint(websocket: WebSocket, symbol_id: int):
-    await manager.connect(websocket, symbol_id)
-    db = SessionLocal()
+async def websocket_endpoint(websocket: WebSocket, symbol_id: int, mode: str = "snapshot"):
+    if await reject_unknown_symbol(websocket, symbol_id):
+        return
+    mode = "delta" if mode == "delta" else "snapshot"
+    if mode == "delta" and not deltas_available():
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await manager.connect(websocket, symbol_id, mode)
     try:
+        book = await get_book(symbol_id)
+
         # Send initial order book once
-        order_book = await get_order_book(db, symbol_id)
-        ltp = get_ltp(db, symbol_id)
-        await websocket.send_json(
-            {"symbol_id": symbol_id, "order_book": order_book, "ltp": ltp}
-        )
+        await send_snapshot(websocket, book, mode)
 
         while True:
-            await websocket.receive_text()  # keep connection alive
+            text = await websocket.receive_text()  # keep connection alive
+            if not wants_snapshot(text):
+                continue
+            await resync(websocket, book, mode)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
+
+
+async def send_snapshot(websocket: WebSocket, book: OrderBook, mode: str):
+    if mode == "delta":
+        await manager.send(websocket, delta_snapshot(book))
+    else:
+        await send_book_snapshot(websocket, book)
+
+
+async def resync(websocket: WebSocket, book: OrderBook, mode: str):
+    # Client detected a gap: flush pending deltas, then resend everything
+    if mode == "delta":
+        await send_delta(book)
+    await send_snapshot(websocket, book, mode)
+
+
+@router.websocket("/ws/market")
+async def market_websocket(websocket: WebSocket):
+    """Any number of order-book streams over one socket, see the GET route."""
+    await manager.connect(websocket)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue  # keep-alive
+            if isinstance(message, dict):
+                await handle_market_message(websocket, message)
+    except WebSocketDisconnect:
+        pass
     finally:
-        db.close()
+        manager.disconnect(websocket)
+
+
+async def handle_market_message(websocket: WebSocket, message: dict):
+    action = message.get("type")
+    mode = message.get("mode")
+    if mode not in ("delta", "trades", "candles"):
+        mode = "snapshot"
+    symbol_ids = message.get("symbol_ids")
+    if symbol_ids is None:
+        symbol_ids = [message.get("symbol_id")]
+    if not isinstance(symbol_ids, list) or not all(
+        isinstance(symbol_id, int) for symbol_id in symbol_ids
+    ):
+        await manager.send(websocket, {"type": "error", "detail": "Invalid symbol_id(s)"})
+        return
+    subscriber = manager.subscribers.get(websocket)
+    if subscriber is None:
+        return  # evicted, the close is on its way
+
+    if action == "subscribe":
+        topics = subscriber.topics | {(mode, symbol_id) for symbol_id in symbol_ids}
+        if len(topics) > WS_MAX_SUBSCRIPTIONS:
+            await manager.send(websocket, {
+                "type": "error",
+                "detail": f"At most {WS_MAX_SUBSCRIPTIONS} subscriptions per connection",
+            })
+            return
+        if mode == "delta" and not deltas_available():
+            await manager.send(
+                websocket, {"type": "error", "detail": "Delta mode needs MATCHING_ENGINE=memory"}
+            )
+            return
+        unknown = [symbol_id for symbol_id in symbol_ids if not await tick_sizes.exists(symbol_id)]
+        if unknown:
+            await manager.send(
+                websocket, {"type": "error", "detail": f"Unknown symbol_id(s): {unknown}"}
+            )
+            return
+        for symbol_id in symbol_ids:
+            if (mode, symbol_id) in subscriber.topics:
+                continue
+            if mode == "trades":
+                # Replay taken and subscription made without yielding: no gap
+                replay = await trade_replay(symbol_id)
+                manager.subscribe(websocket, symbol_id, mode)
+                await manager.send(websocket, replay)
+                continue
+            if mode == "candles":
+                manager.subscribe(websocket, symbol_id, mode)  # updates only
+                continue
+            book = await get_book(symbol_id)
+            manager.subscribe(websocket, symbol_id, mode)
+            await send_snapshot(websocket, book, mode)
+    elif action == "unsubscribe":
+        for symbol_id in symbol_ids:
+            manager.unsubscribe(websocket, symbol_id, mode)
+    elif action == "snapshot":
+        for symbol_id in symbol_ids:
+            if (mode, symbol_id) not in subscriber.topics or mode == "candles":
+                continue
+            if mode == "trades":
+                await manager.send(websocket, await trade_replay(symbol_id))
+            else:
+                await resync(websocket, await get_book(symbol_id), mode)
+    else:
+        await manager.send(websocket, {"type": "error", "detail": "Unknown message type"})
+
+
+@router.get("/ws/stats", tags=["WebSocket"], summary="Get WebSocket fan-out stats (admin only)",
+    description="Per symbol: subscribers, broadcasts, sends, messages dropped for slow "
+                "clients, evictions and queued-to-sent latency."
+)
+def get_ws_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access WebSocket stats",
+        )
+    return manager.get_stats()
 
 
 
@@ -142,10 +725,36 @@ async def ws_orderbook_docs(symbol_id: int):
         wss://<your-server>/ws/orderbook/{symbol_id}
         ```
 
+        An unknown `symbol_id` is refused with close code 1008.
+
         Once connected:
         - The server will immediately send the latest **order book** and **last traded price (LTP)**.  
-        - Updates will then be broadcasted every **2 seconds**.  
+        - The book is checked every **2 seconds** and broadcast only if it changed.  
+          With several workers and `ORDERBOOK_REDIS_URL` set, one worker computes these
+          snapshots and the others relay them through Redis. Under `MATCHING_ENGINE=sql`
+          without it, each worker aggregates them from the DB.  
         - You can send any small message (like `"ping"`) to keep the connection alive.  
+        - Send `"snapshot"` (or `{"type": "snapshot"}`) to get a fresh snapshot immediately.  
+
+        ### Delta mode (`?mode=delta`, `MATCHING_ENGINE=memory` only, refused with 1008 otherwise):
+        - The first message is a full-depth snapshot: `{"type": "snapshot", "seq": 41, ...}`.  
+        - Every committed match/cancel is pushed right away as a delta with the next `seq`:
+        ```json
+        {
+            "type": "delta",
+            "symbol_id": 1,
+            "seq": 42,
+            "levels": [
+                {"side": "S", "price": 102.0, "quantity": 15},
+                {"side": "B", "price": 101.0, "quantity": 0}
+            ],
+            "trades": [{"price": 102.0, "quantity": 25}],
+            "ltp": 102.0
+        }
+        ```
+        - `quantity` is the new open quantity of the level, `0` means the level is gone.  
+        - A full snapshot is re-sent periodically; deltas with `seq` <= the snapshot's `seq` are already in it.  
+        - On a gap in `seq`, send `"snapshot"` to resync.  
 
         ### Response Format:
         ```json
@@ -169,7 +778,45 @@ async def ws_orderbook_docs(symbol_id: int):
         - `bids` → top 5 buy orders, sorted by **highest price first**  
         - `asks` → top 5 sell orders, sorted by **lowest price first**  
         - `ltp` → last traded price for the symbol  
+        - Each client has a bounded send queue: a client that falls behind misses messages,
+          and one whose send stalls for `WS_SEND_TIMEOUT` seconds is disconnected (code 1013).  
     """
     return {
         "note": "This is documentation only. Use WebSocket at ws://<your-server>/ws/orderbook/{symbol_id}"
     }
+
+
+@router.get("/ws/market", tags=["WebSocket"])
+async def ws_market_docs():
+    """
+    Summary:
+        Multi-symbol Market WebSocket (Documentation Only)
+
+    Description:
+        One connection for any number of order books:
+
+        ```
+        wss://<your-server>/ws/market
+        ```
+
+        Send JSON messages to manage subscriptions (`mode` is `"snapshot"` (default), `"delta"`,
+        `"trades"` or `"candles"`):
+        ```json
+        {"type": "subscribe", "symbol_ids": [1, 2, 3], "mode": "delta"}
+        {"type": "unsubscribe", "symbol_id": 2, "mode": "delta"}
+        {"type": "snapshot", "symbol_id": 1, "mode": "delta"}
+        ```
+
+        - Each subscribe is answered with the stream's initial snapshot, then messages flow
+          exactly as on `/ws/orderbook/{symbol_id}` (or `/ws/trades/{symbol_id}`,
+          `/ws/candles/{symbol_id}`, which has no initial message); every message carries its
+          `symbol_id`.  
+        - `snapshot` resyncs a stream you are subscribed to.  
+        - At most `WS_MAX_SUBSCRIPTIONS` (100) streams per connection, on existing symbols
+          only; errors come back as `{"type": "error", "detail": "..."}`.  
+        - `delta` streams need `MATCHING_ENGINE=memory`.  
+        - All streams of a connection share one send queue, so a slow client is dropped as a whole.  
+    """
+    return {
+        "note": "This is documentation only. Use WebSocket at ws://<your-server>/ws/market"
+    }
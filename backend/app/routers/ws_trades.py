@@ -0,0 +1,78 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from app.trade_tape import trade_tape
+
+from .ws_orderbook import StreamFeed, manager, reject_unknown_symbol, trade_replay
+
+router = APIRouter()
+
+
+trade_feed = StreamFeed("trades")
+trade_tape.add_listener(trade_feed.notify)
+
+
+@router.websocket("/ws/trades/{symbol_id}")
+async def trades_websocket(websocket: WebSocket, symbol_id: int):
+    if await reject_unknown_symbol(websocket, symbol_id):
+        return
+    await manager.connect(websocket)
+    try:
+        # Replay taken and subscription made without yielding: no gap
+        replay = await trade_replay(symbol_id)
+        manager.subscribe(websocket, symbol_id, "trades")
+        await manager.send(websocket, replay)
+
+        while True:
+            text = await websocket.receive_text()  # keep connection alive
+            if text.strip() == "replay":
+                await manager.send(websocket, await trade_replay(symbol_id))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+
+@router.get("/ws/trades/{symbol_id}", tags=["WebSocket"])
+async def ws_trades_docs(symbol_id: int):
+    """
+    Summary:
+        Trade Tape WebSocket Stream (Documentation Only)
+
+    Description:
+        This endpoint is for **documentation purposes only**.
+        The actual connection must be made using **WebSocket**:
+
+        ```
+        wss://<your-server>/ws/trades/{symbol_id}
+        ```
+
+        Once connected:
+        - The server first replays the most recent trades (`TRADE_REPLAY_SIZE`, 50 by default),
+          oldest first:
+        ```json
+        {
+            "type": "replay",
+            "symbol_id": 1,
+            "trades": [
+                {"id": 981, "price": 101.75, "quantity": 20, "timestamp": "2025-01-01T10:00:00.120000"}
+            ]
+        }
+        ```
+        - Every committed match is then pushed right away with all the trades it printed:
+        ```json
+        {
+            "type": "trades",
+            "symbol_id": 1,
+            "trades": [
+                {"id": 982, "price": 102.0, "quantity": 25, "timestamp": "2025-01-01T10:00:01.450000"}
+            ]
+        }
+        ```
+        - Trade `id`s increase; skip any trade whose `id` you already have (a trade printed
+          while you connect can appear in both the replay and the first push).
+        - Send `"replay"` to receive the replay buffer again.
+        - Full history stays available through `GET /trades/symbol/{symbol_id}`.
+    """
+    return {
+        "note": "This is documentation only. Use WebSocket at ws://<your-server>/ws/trades/{symbol_id}"
+    }
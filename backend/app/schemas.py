@@ -2,7 +2,7 @@ import enum
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr, constr
+from pydantic import BaseModel, EmailStr, conlist, constr
 
 
 class UserCreate(BaseModel):
@@ -60,6 +60,7 @@ class SymbolResponse(BaseModel):
     id: int
     name: str
     ticker: str
+    tick_size: float
 
     class Config:
         orm_mode = True
@@ -68,6 +69,7 @@ class SymbolResponse(BaseModel):
                 "id": 1,
                 "name": "Stock1",
                 "ticker": "stk1",
+                "tick_size": 0.01,
             }
         }
 
@@ -132,6 +134,59 @@ class OrderResponse(BaseModel):
         }
 
 
+class OrderBatchItem(BaseModel):
+    side: constr(to_lower=False, pattern="^(B|S)$")
+    quantity: int
+    price: float
+    type: constr(to_lower=False, pattern="^(M|L)$")
+
+
+class OrderBatch(BaseModel):
+    symbol_id: int
+    cancels: conlist(int, max_length=100) = []  # applied before the new orders
+    orders: conlist(OrderBatchItem, max_length=100) = []
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "symbol_id": 1,
+                "cancels": [101, 102],
+                "orders": [
+                    {"side": "B", "quantity": 100, "price": 150.0, "type": "L"},
+                    {"side": "S", "quantity": 100, "price": 151.0, "type": "L"},
+                ],
+            }
+        }
+
+
+class BatchCancelResult(BaseModel):
+    order_id: int
+    cancelled: bool
+    detail: Optional[str] = None
+
+
+class OrderBatchResponse(BaseModel):
+    cancels: List[BatchCancelResult]
+    orders: List[OrderResponse]
+
+
+class OrderAmend(BaseModel):
+    quantity: Optional[int] = None  # new total quantity, including what already executed
+    price: Optional[float] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "quantity": 80,
+                "price": 150.25,
+            }
+        }
+
+
+class CancelAllResponse(BaseModel):
+    cancelled: List[int]  # ids of the orders cancelled
+
+
 class TradeCreate(BaseModel):
     buy_order_id: int
     buy_user_id: int
@@ -140,7 +195,7 @@ class TradeCreate(BaseModel):
     symbol_id: int
     ticker: str
     trade_price: float
-    trade_quantity: float
+    trade_quantity: int
 
     class Config:
         schema_extra = {
@@ -167,7 +222,7 @@ class TradeResponse(BaseModel):
     symbol_id: int
     ticker: str
     trade_price: float
-    trade_quantity: float
+    trade_quantity: int
     timestamp: datetime
 
     class Config:
@@ -186,3 +241,30 @@ class TradeResponse(BaseModel):
                 "timestamp": "2025-08-21T10:31:00Z",
             }
         }
+
+
+class CandleResponse(BaseModel):
+    symbol_id: int
+    interval: str
+    start: datetime  # bucket start, UTC
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+    trades: int
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "symbol_id": 1,
+                "interval": "1m",
+                "start": "2025-08-21T10:31:00",
+                "open": 150.5,
+                "high": 151.25,
+                "low": 150.25,
+                "close": 151.0,
+                "volume": 1200,
+                "trades": 14,
+            }
+        }
@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.profiler import call_profiled
+
+
+@dataclass
+class QueueStats:
+    processed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    last_wait: float = 0.0
+    groups: int = 0  # submit_grouped runs
+    grouped: int = 0  # jobs in them
+    max_group: int = 0
+
+
+class MatchingSequencer:
+    """
+    Single writer per symbol: one asyncio queue and one consumer task per
+    symbol_id. Jobs for the same symbol run strictly in submission order,
+    jobs for different symbols run in parallel on the threadpool.
+    Consecutive jobs submitted with `submit_grouped` for the same function
+    are handed to it together, in order. Jobs run in their submitter's
+    context, so per-request state (e.g. DB time) follows them.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._stats: Dict[int, QueueStats] = {}
+
+    async def submit(self, symbol_id: int, fn: Callable[..., Any], *args) -> Any:
+        """Enqueue a blocking job for `symbol_id` and wait for its result."""
+        return await self._enqueue(symbol_id, (fn, args, None))
+
+    async def submit_grouped(
+        self,
+        symbol_id: int,
+        fn: Callable[[List[Any]], List[Any]],
+        item: Any,
+        window: float,
+        max_size: int,
+    ) -> Any:
+        """
+        Enqueue `item` for `fn(items)`, which gets up to `max_size` items of
+        consecutive jobs for the same `fn`, waiting up to `window` seconds
+        for more after the first. `fn` returns one outcome per item, an
+        exception instance to raise it to that item's caller.
+        """
+        return await self._enqueue(symbol_id, (fn, item, (window, max_size)))
+
+    async def _enqueue(self, symbol_id: int, job: tuple) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First use, or the app was restarted on a new loop (TestClient)
+            self._loop = loop
+            self._queues.clear()
+            self._workers.clear()
+
+        queue = self._queues.get(symbol_id)
+        if queue is None:
+            queue = self._queues[symbol_id] = asyncio.Queue()
+            self._stats.setdefault(symbol_id, QueueStats())
+            self._workers[symbol_id] = loop.create_task(
+                self._consume(symbol_id, queue)
+            )
+
+        future = loop.create_future()
+        queue.put_nowait((*job, future, time.perf_counter(), contextvars.copy_context()))
+        return await future
+
+    async def _consume(self, symbol_id: int, queue: asyncio.Queue):
+        stats = self._stats[symbol_id]
+        carry = None  # job read while collecting a group, not part of it
+        while True:
+            job, carry = carry or await queue.get(), None
+            fn, args, group, future, enqueued_at, context = job
+
+            if group is not None:
+                jobs, carry = await self._collect(queue, job, *group)
+                for queued in jobs:
+                    self._count_wait(stats, queued[4])
+                jobs = [j for j in jobs if not j[3].cancelled()]
+                if jobs:
+                    stats.groups += 1
+                    stats.grouped += len(jobs)
+                    stats.max_group = max(stats.max_group, len(jobs))
+                    await self._run_group(fn, jobs)
+                continue
+
+            self._count_wait(stats, enqueued_at)
+            if future.cancelled():
+                # Caller went away before its turn, nothing was applied
+                continue
+            try:
+                result = await run_in_threadpool(context.run, call_profiled, fn, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    @staticmethod
+    def _count_wait(stats: QueueStats, enqueued_at: float):
+        wait = time.perf_counter() - enqueued_at
+        stats.processed += 1
+        stats.total_wait += wait
+        stats.last_wait = wait
+        stats.max_wait = max(stats.max_wait, wait)
+
+    @staticmethod
+    async def _collect(
+        queue: asyncio.Queue, first: tuple, window: float, max_size: int
+    ) -> Tuple[List[tuple], Optional[tuple]]:
+        """`first` plus the grouped jobs for the same function right behind it."""
+        jobs = [first]
+        deadline = time.perf_counter() + window
+        while len(jobs) < max_size:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if job[2] is None or job[0] is not first[0]:
+                return jobs, job  # runs after the group, order is kept
+            jobs.append(job)
+        return jobs, None
+
+    @staticmethod
+    async def _run_group(fn: Callable, jobs: List[tuple]):
+        try:
+            # One transaction for all: charged to the first submitter
+            outcomes = await run_in_threadpool(
+                jobs[0][5].run, call_profiled, fn, [j[1] for j in jobs]
+            )
+        except Exception as e:
+            outcomes = [e] * len(jobs)
+        for job, outcome in zip(jobs, outcomes):
+            future = job[3]
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def stop(self):
+        for task in self._workers.values():
+            task.cancel()
+        self._workers.clear()
+        self._queues.clear()
+
+    def stats(self) -> Dict[int, dict]:
+        """Per-symbol queue depth and wait time (ms) before a job started."""
+        result = {}
+        for symbol_id, s in self._stats.items():
+            queue = self._queues.get(symbol_id)
+            result[symbol_id] = {
+                "depth": queue.qsize() if queue else 0,
+                "processed": s.processed,
+                "avg_wait_ms": round(s.total_wait / s.processed * 1000, 3)
+                if s.processed
+                else 0.0,
+                "max_wait_ms": round(s.max_wait * 1000, 3),
+                "last_wait_ms": round(s.last_wait * 1000, 3),
+                "groups": s.groups,
+                "avg_group": round(s.grouped / s.groups, 2) if s.groups else 0.0,
+                "max_group": s.max_group,
+            }
+        return result
+
+
+sequencer = MatchingSequencer()
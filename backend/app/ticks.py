@@ -0,0 +1,87 @@
+import os
+import threading
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_TICK_SIZE = Decimal(os.getenv("DEFAULT_TICK_SIZE", "0.01"))
+# price_ticks is a BIGINT column
+MAX_TICKS = 2**63 - 1
+
+
+class TickSizes:
+    """
+    Tick size per symbol. Prices are stored, matched and aggregated as
+    integer ticks; these helpers convert at the API/WebSocket edge.
+    """
+
+    def __init__(self):
+        self._sizes: Dict[int, Decimal] = {}
+        self._lock = threading.Lock()
+
+    def set(self, symbol_id: int, tick_size):
+        self._sizes[symbol_id] = Decimal(str(tick_size))
+
+    def load_all(self, db: Session):
+        from app.models import Symbol
+
+        rows = db.query(Symbol.id, Symbol.tick_size).all()
+        with self._lock:
+            for symbol_id, tick_size in rows:
+                self.set(symbol_id, tick_size)
+
+    def get(self, symbol_id: int, db: Optional[Session] = None) -> Decimal:
+        size = self._sizes.get(symbol_id)
+        if size is None:
+            # Symbol created by another worker since startup
+            if db is None:
+                from app.database import SessionLocal
+
+                with SessionLocal() as own:
+                    self.load_all(own)
+            else:
+                self.load_all(db)
+            # Unknown symbol: has no orders or trades to price anyway
+            size = self._sizes.get(symbol_id, DEFAULT_TICK_SIZE)
+        return size
+
+    def known(self, symbol_id: int, db: Optional[Session] = None) -> bool:
+        """Whether the symbol exists; an id not seen yet rereads the table."""
+        if symbol_id not in self._sizes:
+            self.get(symbol_id, db)
+        return symbol_id in self._sizes
+
+    async def exists(self, symbol_id: int) -> bool:
+        """`known` for async callers, the table reread off the event loop."""
+        if symbol_id in self._sizes:
+            return True
+        return await run_in_threadpool(self.known, symbol_id)
+
+    def to_ticks(
+        self, symbol_id: int, price, db: Optional[Session] = None, exact: bool = True
+    ) -> int:
+        """
+        Price -> integer ticks. With `exact`, a price that isn't a multiple of
+        the tick size raises ValueError instead of being rounded; so does a
+        price that isn't finite or doesn't fit in a BIGINT of ticks.
+        """
+        size = self.get(symbol_id, db)
+        ticks = Decimal(str(price)) / size
+        if not ticks.is_finite():
+            raise ValueError("Price must be a finite number")
+        if exact and ticks != ticks.to_integral_value():
+            raise ValueError(f"Price must be a multiple of the tick size {size.normalize()}")
+        ticks = int(ticks.to_integral_value(rounding=ROUND_HALF_UP))
+        if abs(ticks) > MAX_TICKS:
+            raise ValueError("Price is out of range")
+        return ticks
+
+    def to_price(self, symbol_id: int, ticks: Optional[int]) -> Optional[float]:
+        if ticks is None:
+            return None
+        return float(ticks * self.get(symbol_id))
+
+
+tick_sizes = TickSizes()
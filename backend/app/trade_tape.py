@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.commit_hooks import after_commit
+from app.ticks import tick_sizes
+
+# Trades replayed to a new /ws/trades subscriber
+TRADE_REPLAY_SIZE = int(os.getenv("TRADE_REPLAY_SIZE", "50"))
+
+
+def tape_entry(symbol_id: int, trade_id: int, price_ticks: int, quantity: int,
+               timestamp) -> dict:
+    return {
+        "id": trade_id,
+        "price": tick_sizes.to_price(symbol_id, price_ticks),
+        "quantity": quantity,
+        "timestamp": timestamp.isoformat(),
+    }
+
+
+class TradeTape:
+    """
+    Recent trades per symbol. Matching stages trades on its Session; they
+    reach the tape and its listeners only once that Session commits, so a
+    rolled-back match is never printed. Trade ids increase, which is what
+    subscribers use to skip a trade seen both in a replay and live.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tapes: Dict[int, Deque[dict]] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int, List[dict]], None]] = []
+
+    def add_listener(self, listener: Callable[[int, List[dict]], None]):
+        """Called with (symbol_id, trades) after each commit, on the committing thread."""
+        self._listeners.append(listener)
+
+    def stage(self, db: Session, symbol_id: int, trades: List[dict]):
+        after_commit(db, self._publish, symbol_id, trades)
+
+    def _publish(self, symbol_id: int, trades: List[dict]):
+        with self._lock:
+            tape = self._tapes.get(symbol_id)
+            if tape is not None:
+                last_id = tape[-1]["id"] if tape else 0
+                tape.extend(t for t in trades if t["id"] > last_id)
+        for listener in self._listeners:
+            listener(symbol_id, trades)
+
+    def loaded(self, symbol_id: int) -> bool:
+        return symbol_id in self._tapes
+
+    def load(self, symbol_id: int):
+        """Fill a symbol's tape from the trades table (blocking)."""
+        from app.database import SessionLocal
+        from app.models import Trade
+
+        # Held across the query: a trade committed meanwhile is either in the
+        # result or appended after it, never lost
+        with self._lock:
+            if symbol_id in self._tapes:
+                return
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(
+                        Trade.id, Trade.price_ticks, Trade.trade_quantity, Trade.timestamp
+                    )
+                    .filter(Trade.symbol_id == symbol_id)
+                    .order_by(Trade.id.desc())
+                    .limit(self.size)
+                    .all()
+                )
+            finally:
+                db.close()
+            self._tapes[symbol_id] = deque(
+                (
+                    tape_entry(symbol_id, r.id, r.price_ticks, r.trade_quantity, r.timestamp)
+                    for r in reversed(rows)
+                ),
+                maxlen=self.size,
+            )
+
+    def recent(self, symbol_id: int) -> List[dict]:
+        with self._lock:
+            return list(self._tapes.get(symbol_id, ()))
+
+
+trade_tape = TradeTape(TRADE_REPLAY_SIZE)
+
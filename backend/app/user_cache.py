@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.auth import ACCESS_TOKEN_EXPIRE_MINUTES
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Optional shared tier, e.g. redis://redis:6379/1; unset = in-process only
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL")
+
+
+@dataclass
+class CurrentUser:
+    """What request handlers need from the authenticated user."""
+
+    id: int
+    username: str
+    role: str
+
+    @classmethod
+    def from_model(cls, user) -> "CurrentUser":
+        return cls(id=user.id, username=user.username, role=user.role)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    redis_hits: int = 0
+    token_hits: int = 0  # resolved from the JWT claims alone
+    misses: int = 0  # fell through to the DB
+    invalidations: int = 0
+    redis_errors: int = 0
+
+
+class UserCache:
+    """
+    TTL-bounded LRU of authenticated users keyed by token subject, with an
+    optional Redis tier shared between workers. `invalidate` must be called
+    whenever a user row changes; it also stops older tokens' claims from
+    being trusted. Other workers drop their local copy within `ttl`.
+    """
+
+    def __init__(self, ttl: float, maxsize: int, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, CurrentUser]]" = OrderedDict()
+        self._invalidated: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._redis = (
+            redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+            if redis_url
+            else None
+        )
+        self.stats = CacheStats()
+
+    async def get(self, username: str) -> Optional[CurrentUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(username)
+                    self.stats.hits += 1
+                    return entry[1]
+                del self._entries[username]
+
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self._key(username))
+            except redis.RedisError:
+                self.stats.redis_errors += 1
+                raw = None
+            if raw is not None:
+                user = CurrentUser(**json.loads(raw))
+                self._store(user)
+                self.stats.redis_hits += 1
+                return user
+        return None
+
+    async def from_claims(self, payload: dict) -> Optional[CurrentUser]:
+        """
+        User built from the token's `uid`/`role` claims, unless the user was
+        invalidated after the token was issued.
+        """
+        username, uid, role = payload.get("sub"), payload.get("uid"), payload.get("role")
+        if uid is None or role is None:
+            return None
+        invalidated_at = self._invalidated.get(username)
+        if self._redis is not None:
+            try:
+                shared = await self._redis.get(self._invalidated_key(username))
+            except redis.RedisError:
+                self.stats.redis_errors += 1
+                return None  # can't tell, let the DB decide
+            if shared is not None:
+                invalidated_at = max(invalidated_at or 0, float(shared))
+        if invalidated_at is not None and payload.get("iat", 0) <= invalidated_at:
+            return None
+        user = CurrentUser(id=uid, username=username, role=role)
+        self._store(user)
+        self.stats.token_hits += 1
+        return user
+
+    async def put(self, user: CurrentUser):
+        self.stats.misses += 1
+        self._store(user)
+        if self._redis is not None:
+            try:
+                await self._redis.set(
+                    self._key(user.username), json.dumps(asdict(user)), ex=int(self.ttl)
+                )
+            except redis.RedisError:
+                self.stats.redis_errors += 1
+
+    async def invalidate(self, username: str):
+        now = time.time()
+        with self._lock:
+            self._entries.pop(username, None)
+            self._invalidated[username] = now
+            # Tokens issued before this are expired anyway
+            horizon = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            for name in [n for n, t in self._invalidated.items() if t < horizon]:
+                del self._invalidated[name]
+        self.stats.invalidations += 1
+        if self._redis is not None:
+            try:
+                await self._redis.delete(self._key(username))
+                await self._redis.set(
+                    self._invalidated_key(username),
+                    str(now),
+                    ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+                )
+            except redis.RedisError:
+                self.stats.redis_errors += 1
+
+    def _store(self, user: CurrentUser):
+        with self._lock:
+            self._entries[user.username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return f"user:{username}"
+
+    @staticmethod
+    def _invalidated_key(username: str) -> str:
+        return f"user:{username}:invalidated"
+
+    def get_stats(self) -> dict:
+        s = self.stats
+        lookups = s.hits + s.redis_hits + s.token_hits + s.misses
+        return {
+            **asdict(s),
+            "size": len(self._entries),
+            "hit_ratio": round((lookups - s.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = UserCache(USER_CACHE_TTL, USER_CACHE_SIZE, USER_CACHE_REDIS_URL)
@@ -1,7 +1,21 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from app.profiler import call_profiled
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Processes dedicated to bcrypt; 0 = run in the shared threadpool instead
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -9,3 +23,35 @@ def hash_password(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that already runs threads and an event loop is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=BCRYPT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def _run_bcrypt(fn, *args):
+    if BCRYPT_WORKERS <= 0:
+        return await run_in_threadpool(call_profiled, fn, *args)
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_bcrypt(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_bcrypt(verify_password, plain_password, hashed_password)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
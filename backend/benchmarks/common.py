@@ -0,0 +1,77 @@
+"""
+Shared setup for the benchmark scripts.
+
+Import this module before anything from `app`: it points DATABASE_URL at
+BENCH_DATABASE_URL (default: a local SQLite file) so app.database builds
+its engines against the benchmark database.
+"""
+import os
+import random
+
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", "sqlite:///./bench.db")
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import Base, Order, Symbol, Trade, User  # noqa: E402
+
+
+def percentile(values, q):
+    """`q` quantile of sorted durations in seconds, in ms."""
+    return round(values[max(int(len(values) * q) - 1, 0)] * 1000, 2)
+
+
+def reset_schema():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def seed(symbols: int, orders: int, trades: int = 1, users: int = 1, seed: int = 42):
+    """
+    Recreate the schema with `symbols` symbols, each holding `orders` open
+    limit orders (bids 90-99, asks 101-110 at the default 0.01 tick) and
+    `trades` trades.
+    Returns the symbol ids.
+    """
+    reset_schema()
+    rnd = random.Random(seed)
+    db = SessionLocal()
+    try:
+        user_ids = []
+        for i in range(users):
+            user = User(
+                username=f"bench{i}", email=f"bench{i}@example.com", hashed_password="x"
+            )
+            db.add(user)
+            db.flush()
+            user_ids.append(user.id)
+
+        for i in range(symbols):
+            symbol = Symbol(ticker=f"b{i}", name=f"Bench {i}")
+            db.add(symbol)
+            db.flush()
+            rows = []
+            for _ in range(orders):
+                side = rnd.choice("BS")
+                price = rnd.randint(90, 99) if side == "B" else rnd.randint(101, 110)
+                rows.append(
+                    Order(
+                        user_id=rnd.choice(user_ids), symbol_id=symbol.id,
+                        ticker=symbol.ticker, side=side, quantity=rnd.randint(1, 100),
+                        exec_qty=0, price_ticks=price * 100, type="L", status="pending",
+                    )
+                )
+            db.add_all(rows)
+            db.flush()
+            for _ in range(trades):
+                buy, sell = rnd.sample(rows, 2)
+                db.add(
+                    Trade(
+                        buy_order_id=buy.id, buy_user_id=buy.user_id,
+                        sell_order_id=sell.id, sell_user_id=sell.user_id,
+                        symbol_id=symbol.id, ticker=symbol.ticker,
+                        price_ticks=10000, trade_quantity=1,
+                    )
+                )
+            db.commit()
+        return [s.id for s in db.query(Symbol.id).order_by(Symbol.id)]
+    finally:
+        db.close()
@@ -0,0 +1,142 @@
+"""
+Persisting a market order that sweeps a deep book.
+
+Rests `--levels` asks of `--per-level` orders each, then sends one market
+buy for the whole side and times match + commit. Compares writing the fills
+as one ORM Trade object and one UPDATE per resting order (old) against the
+bulk INSERT / single UPDATE in matching.write_fills.
+
+    cd backend
+    python -m benchmarks.deep_sweep --levels 200 --per-level 3
+    BENCH_DATABASE_URL=postgresql://postgres:postgres@db:5432/bench_db \\
+        python -m benchmarks.deep_sweep
+
+Seeds (and wipes) the target database; don't point it at real data.
+"""
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+
+from sqlalchemy import event, update
+
+from benchmarks.common import SessionLocal, engine, seed
+from app.models import Order, Symbol, Trade, User
+from app.orderbook import order_books
+from app.routers import matching
+
+
+def write_fills_per_row(new_order, fills, db):
+    # What match_order did before: ORM Trade per fill, UPDATE per resting order
+    for f in fills:
+        buy = new_order.side == "B"
+        db.add(
+            Trade(
+                buy_order_id=new_order.id if buy else f.order_id,
+                buy_user_id=new_order.user_id if buy else f.user_id,
+                sell_order_id=f.order_id if buy else new_order.id,
+                sell_user_id=f.user_id if buy else new_order.user_id,
+                symbol_id=new_order.symbol_id,
+                ticker=new_order.ticker,
+                price_ticks=f.price,
+                trade_quantity=f.quantity,
+            )
+        )
+        db.execute(
+            update(Order)
+            .where(Order.id == f.order_id)
+            .values(
+                exec_qty=f.exec_qty,
+                status="filled" if f.remaining == 0 else "partially_filled",
+            )
+        )
+
+
+def seed_book(levels: int, per_level: int) -> tuple:
+    symbol_id = seed(1, 0, trades=0)[0]
+    db = SessionLocal()
+    try:
+        symbol = db.get(Symbol, symbol_id)
+        user_id = db.query(User.id).scalar()
+        db.add_all(
+            Order(
+                user_id=user_id, symbol_id=symbol.id, ticker=symbol.ticker, side="S",
+                quantity=10, exec_qty=0, price_ticks=10000 + level, type="L",
+                status="pending",
+            )
+            for level in range(levels)
+            for _ in range(per_level)
+        )
+        db.commit()
+        return symbol.id, symbol.ticker, user_id
+    finally:
+        db.close()
+
+
+def sweep(levels: int, per_level: int) -> tuple:
+    """Time match + commit of one market buy for the whole ask side."""
+    symbol_id, ticker, user_id = seed_book(levels, per_level)
+    order_books._books.clear()
+
+    statements = Counter()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[statement.split()[0]] += 1
+
+    db = SessionLocal()
+    try:
+        order_books.get(db, symbol_id)
+        event.listen(engine, "before_cursor_execute", count)
+        start = time.perf_counter()
+        new_order = Order(
+            user_id=user_id, symbol_id=symbol_id, ticker=ticker, side="B",
+            quantity=levels * per_level * 10, exec_qty=0, price_ticks=0, type="M",
+        )
+        db.add(new_order)
+        db.flush()
+        matching.match_order(new_order, db)
+        db.commit()
+        elapsed = time.perf_counter() - start
+        event.remove(engine, "before_cursor_execute", count)
+        assert new_order.status == "filled"
+        return elapsed, dict(statements)
+    finally:
+        db.close()
+
+
+def run_mode(args) -> dict:
+    times, statements = [], {}
+    for _ in range(args.repeat):
+        elapsed, statements = sweep(args.levels, args.per_level)
+        times.append(elapsed)
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 2),
+        "min_ms": round(min(times) * 1000, 2),
+        "statements": statements,
+    }
+
+
+def main(args):
+    matching.MATCHING_ENGINE = args.engine
+    results = {"database": engine.url.render_as_string(hide_password=True),
+               "engine": args.engine, "fills": args.levels * args.per_level}
+
+    bulk = matching.write_fills
+    matching.write_fills = write_fills_per_row
+    try:
+        results["per_row"] = run_mode(args)
+    finally:
+        matching.write_fills = bulk
+    results["bulk"] = run_mode(args)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--levels", type=int, default=200)
+    parser.add_argument("--per-level", type=int, default=3, help="resting orders per level")
+    parser.add_argument("--engine", choices=("memory", "sql"), default="memory")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+"""
+Event-loop lag while refreshing order books for many symbols.
+
+Compares the old refresh (blocking SQL aggregation on the event loop), the
+same queries pushed to the threadpool, and the in-memory book snapshot.
+
+    cd backend
+    python -m benchmarks.event_loop_lag --symbols 200 --orders 200
+    BENCH_DATABASE_URL=postgresql://postgres:postgres@db:5432/bench_db \\
+        python -m benchmarks.event_loop_lag
+
+Seeds (and wipes) the target database; don't point it at real data.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks.common import SessionLocal, engine, seed
+from app.orderbook import order_books
+from app.routers import ws_orderbook
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(loop.time() - start - PROBE_INTERVAL)
+
+
+async def refresh_inline(symbol_ids):
+    # What update_order_book used to do: blocking queries on the loop
+    db = SessionLocal()
+    try:
+        for symbol_id in symbol_ids:
+            ws_orderbook.get_order_book(db, symbol_id)
+            ws_orderbook.get_ltp(db, symbol_id)
+    finally:
+        db.close()
+
+
+async def refresh_threadpool(symbol_ids):
+    for symbol_id in symbol_ids:
+        await ws_orderbook.fetch_order_book(symbol_id)
+
+
+async def refresh_cache(symbol_ids):
+    for symbol_id in symbol_ids:
+        ws_orderbook.book_snapshot(order_books.peek(symbol_id))
+
+
+async def run_mode(refresh, symbol_ids, duration: float, interval: float) -> dict:
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    refreshes, refresh_time = 0, 0.0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await refresh(symbol_ids)
+        refresh_time += time.perf_counter() - start
+        refreshes += 1
+        await asyncio.sleep(interval)
+    stop.set()
+    await probe_task
+
+    lags.sort()
+    return {
+        "refreshes": refreshes,
+        "avg_refresh_ms": round(refresh_time / refreshes * 1000, 2),
+        "lag_p50_ms": round(statistics.median(lags) * 1000, 2),
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1] * 1000, 2),
+        "lag_max_ms": round(lags[-1] * 1000, 2),
+    }
+
+
+async def main(args):
+    symbol_ids = seed(args.symbols, args.orders)
+    db = SessionLocal()
+    try:
+        order_books.load_all(db)
+        for symbol_id in symbol_ids:
+            order_books.get(db, symbol_id)
+    finally:
+        db.close()
+
+    results = {"database": engine.url.render_as_string(hide_password=True),
+               "symbols": args.symbols, "orders_per_symbol": args.orders}
+    for name, refresh in (
+        ("inline_sql", refresh_inline),
+        ("threadpool_sql", refresh_threadpool),
+        ("memory_cache", refresh_cache),
+    ):
+        results[name] = await run_mode(refresh, symbol_ids, args.duration, args.interval)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=200, help="open orders per symbol")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per mode")
+    parser.add_argument("--interval", type=float, default=0.2, help="pause between refreshes")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+"""
+Query plans and latency of the order/trade access paths, with and without
+the composite indexes declared on Order and Trade.
+
+    cd backend
+    python -m benchmarks.index_plans --symbols 20 --orders 20000 --trades 20000
+    BENCH_DATABASE_URL=postgresql://postgres:postgres@db:5432/bench_db \\
+        python -m benchmarks.index_plans
+
+Seeds (and wipes) the target database; don't point it at real data.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.common import engine, seed
+from sqlalchemy import asc, desc, func, select, text
+
+from app.models import Order, Trade
+
+# Indexes added for these access paths (see the matching Alembic revision)
+INDEX_NAMES = {
+    "ix_orders_open_book",
+    "ix_orders_user_id_id",
+    "ix_orders_symbol_id_id",
+    "ix_trades_symbol_id_timestamp",
+    "ix_trades_buy_user_id",
+    "ix_trades_sell_user_id",
+}
+OPEN = ["pending", "partially_filled"]
+
+
+def queries(symbol_id: int, user_id: int) -> dict:
+    """The statements behind match_order (SQL engine), the order book and the listings."""
+    return {
+        "match_scan": select(Order)
+        .where(
+            Order.symbol_id == symbol_id,
+            Order.side == "S",
+            Order.type == "L",
+            Order.status.in_(OPEN),
+            Order.price_ticks <= 10500,
+        )
+        .order_by(asc(Order.price_ticks), asc(Order.timestamp)),
+        "order_book_bids": select(
+            Order.price_ticks, func.sum(Order.quantity - Order.exec_qty)
+        )
+        .where(
+            Order.symbol_id == symbol_id,
+            Order.side == "B",
+            Order.type == "L",
+            Order.status.in_(OPEN),
+        )
+        .group_by(Order.price_ticks)
+        .order_by(desc(Order.price_ticks)),
+        "orders_by_symbol": select(Order).where(Order.symbol_id == symbol_id),
+        "my_orders": select(Order).where(Order.user_id == user_id),
+        "ltp": select(Trade.price_ticks)
+        .where(Trade.symbol_id == symbol_id)
+        .order_by(desc(Trade.timestamp))
+        .limit(1),
+        "my_trades": select(Trade).where(
+            (Trade.buy_user_id == user_id) | (Trade.sell_user_id == user_id)
+        ),
+    }
+
+
+def explain(conn, stmt) -> list:
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    if engine.dialect.name == "postgresql":
+        rows = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql)).all()
+        return [r[0] for r in rows]
+    rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+    return [r[-1] for r in rows]
+
+
+def measure(symbol_ids, user_id: int, repeat: int) -> dict:
+    result = {}
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE orders"))
+            conn.execute(text("ANALYZE trades"))
+        for name, stmt in queries(symbol_ids[0], user_id).items():
+            plan = explain(conn, stmt)
+            timings = []
+            for i in range(repeat):
+                per_symbol = queries(symbol_ids[i % len(symbol_ids)], user_id)[name]
+                start = time.perf_counter()
+                conn.execute(per_symbol).all()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            result[name] = {
+                "p50_ms": round(statistics.median(timings) * 1000, 3),
+                "p99_ms": round(timings[int(len(timings) * 0.99) - 1] * 1000, 3),
+                "plan": plan,
+            }
+    return result
+
+
+def main(args):
+    symbol_ids = seed(args.symbols, args.orders, args.trades, users=args.users)
+    indexes = [
+        ix
+        for table in (Order.__table__, Trade.__table__)
+        for ix in table.indexes
+        if ix.name in INDEX_NAMES
+    ]
+
+    for ix in indexes:
+        ix.drop(bind=engine)
+    before = measure(symbol_ids, user_id=1, repeat=args.repeat)
+
+    for ix in indexes:
+        ix.create(bind=engine)
+    after = measure(symbol_ids, user_id=1, repeat=args.repeat)
+
+    report = {
+        "database": engine.url.render_as_string(hide_password=True),
+        "symbols": args.symbols,
+        "orders_per_symbol": args.orders,
+        "trades_per_symbol": args.trades,
+        "before": before,
+        "after": after,
+    }
+    print(json.dumps(report, indent=2))
+    print("\nquery              before p50 ms   after p50 ms")
+    for name in before:
+        print(f"{name:<18} {before[name]['p50_ms']:>13} {after[name]['p50_ms']:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=5000, help="open orders per symbol")
+    parser.add_argument("--trades", type=int, default=5000, help="trades per symbol")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50, help="runs per query")
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+"""
+Order-endpoint latency during a login storm.
+
+Runs the app in-process, keeps `--logins` concurrent login loops going and
+meanwhile times a sequential probe against a threadpool-bound order endpoint
+(DELETE /orders/cancel/{id}) and an async one (GET /orders/me). Modes:
+
+    threadpool   bcrypt in FastAPI's shared threadpool, no login cap (old)
+    process      bcrypt in the dedicated process pool, no login cap
+    capped       process pool plus the login concurrency cap
+
+    cd backend
+    python -m benchmarks.login_storm --logins 64 --duration 10
+
+Seeds (and wipes) the target database; don't point it at real data.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import SessionLocal, engine, percentile, seed
+from app import auth, utils
+from app.main import app
+from app.models import Order, User
+from app.routers.auth import password_slots
+
+PASSWORD = "benchpass"
+
+
+async def login_loop(client, stop: asyncio.Event, statuses: Counter):
+    while not stop.is_set():
+        r = await client.post("/auth/login", json={"username": "bench0", "password": PASSWORD})
+        statuses[r.status_code] += 1
+        if r.status_code == 503:
+            await asyncio.sleep(0.05)
+
+
+async def probe(client, headers, order_ids, stop: asyncio.Event, cancel_lat, list_lat):
+    while not stop.is_set() and order_ids:
+        start = time.perf_counter()
+        await client.delete(f"/orders/cancel/{order_ids.pop()}", headers=headers)
+        cancel_lat.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await client.get("/orders/me", params={"limit": 50}, headers=headers)
+        list_lat.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def run_mode(workers: int, cap: int, args, headers, order_ids) -> dict:
+    utils.shutdown_pool()
+    utils.BCRYPT_WORKERS = workers
+    password_slots.limit = cap
+    if workers:
+        # Warm the pool so process start-up isn't billed to the first logins
+        await utils.hash_password_async(PASSWORD)
+
+    statuses, cancel_lat, list_lat = Counter(), [], []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tasks = [
+            asyncio.create_task(login_loop(client, stop, statuses))
+            for _ in range(args.logins)
+        ]
+        probe_task = asyncio.create_task(
+            probe(client, headers, order_ids, stop, cancel_lat, list_lat)
+        )
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks, probe_task)
+
+    cancel_lat.sort()
+    list_lat.sort()
+    return {
+        "logins_ok": statuses[200],
+        "logins_rejected": statuses[503],
+        "logins_per_s": round(statuses[200] / args.duration, 1),
+        "cancel_p50_ms": round(statistics.median(cancel_lat) * 1000, 2),
+        "cancel_p99_ms": percentile(cancel_lat, 0.99),
+        "list_p50_ms": round(statistics.median(list_lat) * 1000, 2),
+        "list_p99_ms": percentile(list_lat, 0.99),
+    }
+
+
+async def main(args):
+    seed(1, args.orders)
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "bench0").one()
+        user.hashed_password = utils.hash_password(PASSWORD)
+        user.role = "trader"
+        db.commit()
+        token = auth.create_access_token(
+            {"sub": user.username, "uid": user.id, "role": user.role}
+        )
+        order_ids = [o.id for o in db.query(Order.id).order_by(Order.id)]
+    finally:
+        db.close()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = {"database": engine.url.render_as_string(hide_password=True),
+               "concurrent_logins": args.logins, "cpu_count": os.cpu_count()}
+    for name, workers, cap in (
+        ("threadpool", 0, args.logins),
+        ("process", args.workers, args.logins),
+        ("capped", args.workers, args.cap),
+    ):
+        results[name] = await run_mode(workers, cap, args, headers, order_ids)
+    utils.shutdown_pool()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=64, help="concurrent login loops")
+    parser.add_argument("--orders", type=int, default=5000, help="open orders to cancel")
+    parser.add_argument("--workers", type=int, default=utils.BCRYPT_WORKERS,
+                        help="bcrypt processes")
+    parser.add_argument("--cap", type=int, default=password_slots.limit,
+                        help="login concurrency cap for the capped mode")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,368 @@
+"""
+Matching engine and order-book benchmark suite.
+
+Runs synthetic order flow through the order path (insert, match_order,
+commit, one session per order like a request) for every combination of
+matching engine, flow, book depth and symbol count, and reports orders/sec,
+p50/p99 latency of the whole order and of match_order alone, and SQL
+statements per order. Also times get_order_book (SQL aggregation) against
+the in-memory snapshot by depth, ConnectionManager.broadcast by subscriber
+count, and measures memory per resting order in the in-memory book.
+
+Flows (deterministic for a given --seed):
+  uniform  random side, 80% limit orders within 100 ticks of the mid, 20% market
+  bursty   runs of aggressive orders on one side, then runs of passive refills
+  sweep    ten levels rested on one side, then one market order taking them all
+
+Results are JSON: keep one file per commit and pass an older one to
+--compare to get the change of every metric.
+
+    cd backend
+    python -m benchmarks.suite --quick
+    python -m benchmarks.suite --output bench-$(git rev-parse --short HEAD).json \\
+        --compare bench-base.json
+    BENCH_DATABASE_URL=postgresql://postgres:postgres@db:5432/bench_db \\
+        python -m benchmarks.suite --engines memory,sql --depths 1000,10000
+
+Seeds (and wipes) the target database; don't point it at real data.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+import sqlalchemy
+from sqlalchemy import event
+
+from benchmarks.common import SessionLocal, engine, percentile, seed
+from app.models import Order, Symbol, User
+from app.orderbook import OrderBookRegistry, order_books
+from app.routers import matching
+from app.routers.ws_orderbook import ConnectionManager, book_snapshot, get_order_book
+
+MID = 10000  # ticks; common.seed rests bids at 9000-9900 and asks at 10100-11000
+
+
+def uniform(rnd: random.Random):
+    while True:
+        side = rnd.choice("BS")
+        if rnd.random() < 0.2:
+            yield side, "M", 0, rnd.randint(1, 100)
+        else:
+            yield side, "L", MID + rnd.randint(-100, 100), rnd.randint(1, 100)
+
+
+def bursty(rnd: random.Random):
+    while True:
+        side = rnd.choice("BS")
+        sign = 1 if side == "B" else -1
+        for _ in range(rnd.randint(20, 80)):  # through the touch
+            yield side, "L", MID + sign * rnd.randint(0, 200), rnd.randint(1, 100)
+        for _ in range(rnd.randint(20, 80)):  # refills away from it
+            refill = rnd.choice("BS")
+            sign = -1 if refill == "B" else 1
+            yield refill, "L", MID + sign * rnd.randint(1, 200), rnd.randint(1, 100)
+
+
+def sweep(rnd: random.Random, levels: int = 10, per_level: int = 3):
+    side = "S"
+    while True:
+        sign = 1 if side == "S" else -1
+        for level in range(1, levels + 1):
+            for _ in range(per_level):
+                yield side, "L", MID + sign * level, 10
+        yield ("B" if side == "S" else "S"), "M", 0, levels * per_level * 10
+        side = "B" if side == "S" else "S"
+
+
+FLOWS = {"uniform": uniform, "bursty": bursty, "sweep": sweep}
+
+
+def count_statements(counter: Counter):
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter[statement.split()[0].upper()] += 1
+
+    return count
+
+
+def run_orders(engine_name: str, flow: str, depth: int, symbols: int, orders: int,
+               rnd_seed: int) -> dict:
+    """Send `orders` orders of `flow`, round-robin over the symbols."""
+    symbol_ids = seed(symbols, depth, seed=rnd_seed)
+    matching.MATCHING_ENGINE = engine_name
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).scalar()
+        tickers = dict(db.query(Symbol.id, Symbol.ticker))
+        order_books.install({})
+        order_books.load_all(db)  # like app startup, not timed
+    finally:
+        db.close()
+
+    flows = [FLOWS[flow](random.Random(rnd_seed + i)) for i in range(symbols)]
+    latencies, match_latencies = [], []
+    statements = Counter()
+    listener = count_statements(statements)
+    event.listen(engine, "before_cursor_execute", listener)
+    started = time.perf_counter()
+    try:
+        for i in range(orders):
+            index = i % symbols
+            side, order_type, price, quantity = next(flows[index])
+            db = SessionLocal()
+            try:
+                t0 = time.perf_counter()
+                order = Order(
+                    user_id=user_id, symbol_id=symbol_ids[index],
+                    ticker=tickers[symbol_ids[index]], side=side, quantity=quantity,
+                    exec_qty=0, price_ticks=price, type=order_type,
+                )
+                db.add(order)
+                db.flush()
+                t1 = time.perf_counter()
+                matching.match_order(order, db)
+                t2 = time.perf_counter()
+                db.commit()
+                latencies.append(time.perf_counter() - t0)
+                match_latencies.append(t2 - t1)
+            finally:
+                db.close()
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", listener)
+
+    latencies.sort()
+    match_latencies.sort()
+    return {
+        "params": {"engine": engine_name, "flow": flow, "depth": depth, "symbols": symbols,
+                   "orders": orders},
+        "orders_per_sec": round(orders / elapsed, 1),
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "match_p50_ms": percentile(match_latencies, 0.5),
+        "match_p99_ms": percentile(match_latencies, 0.99),
+        "statements_per_order": round(sum(statements.values()) / orders, 2),
+        "statements": dict(statements),
+    }
+
+
+def run_snapshot(depth: int, calls: int, rnd_seed: int) -> dict:
+    """get_order_book (SQL) against the in-memory book snapshot, same depth."""
+    symbol_id = seed(1, depth, seed=rnd_seed)[0]
+    db = SessionLocal()
+    try:
+        order_books.install({})
+        book = order_books.get(db, symbol_id)
+        sql, memory = [], []
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            get_order_book(db, symbol_id)
+            t1 = time.perf_counter()
+            book_snapshot(book)
+            memory.append(time.perf_counter() - t1)
+            sql.append(t1 - t0)
+    finally:
+        db.close()
+    sql.sort()
+    memory.sort()
+    return {
+        "params": {"depth": depth, "calls": calls},
+        "sql_p50_ms": percentile(sql, 0.5),
+        "sql_p99_ms": percentile(sql, 0.99),
+        "memory_p50_ms": percentile(memory, 0.5),
+        "memory_p99_ms": percentile(memory, 0.99),
+    }
+
+
+class CountingSocket:
+    """Stands in for a WebSocket; counts what the manager sends it."""
+
+    def __init__(self, delivered: dict):
+        self.delivered = delivered
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.delivered["count"] += 1
+        if self.delivered["count"] >= self.delivered["target"]:
+            self.delivered["done"].set()
+
+
+async def run_broadcast(subscribers: int, messages: int) -> dict:
+    """
+    Time of the broadcast call itself (serialize + queue) and until every
+    subscriber's sender task has handed the message to its socket.
+    """
+    manager = ConnectionManager()
+    delivered = {"count": 0, "target": 0, "done": asyncio.Event()}
+    sockets = [CountingSocket(delivered) for _ in range(subscribers)]
+    for ws in sockets:
+        await manager.connect(ws, 1)
+    message = {
+        "symbol_id": 1,
+        "order_book": {
+            "bids": [{"price": 99.0 - i, "quantity": 100} for i in range(5)],
+            "asks": [{"price": 101.0 + i, "quantity": 100} for i in range(5)],
+        },
+        "ltp": 100.0,
+    }
+
+    calls, fanouts = [], []
+    try:
+        for i in range(messages):
+            delivered["target"] = subscribers * (i + 1)
+            delivered["done"].clear()
+            t0 = time.perf_counter()
+            await manager.broadcast(1, message)
+            calls.append(time.perf_counter() - t0)
+            await delivered["done"].wait()
+            fanouts.append(time.perf_counter() - t0)
+    finally:
+        for ws in sockets:
+            manager.disconnect(ws)
+    calls.sort()
+    fanouts.sort()
+    return {
+        "params": {"subscribers": subscribers, "messages": messages},
+        "call_p50_ms": percentile(calls, 0.5),
+        "call_p99_ms": percentile(calls, 0.99),
+        "fanout_p50_ms": percentile(fanouts, 0.5),
+        "fanout_p99_ms": percentile(fanouts, 0.99),
+    }
+
+
+def run_memory(depth: int, rnd_seed: int) -> dict:
+    """Bytes the in-memory book keeps per resting order once loaded."""
+    symbol_id = seed(1, depth, trades=0, seed=rnd_seed)[0]
+    registry = OrderBookRegistry()
+    db = SessionLocal()
+    try:
+        db.query(Symbol).all()  # connection and tick size cache, not the book's
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        book = registry.get(db, symbol_id)
+    finally:
+        db.close()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        "params": {"depth": depth},
+        "resting_orders": len(book.orders),
+        "levels": len(book.bids.levels) + len(book.asks.levels),
+        "bytes_per_order": round(retained / max(len(book.orders), 1), 1),
+    }
+
+
+def git_commit() -> dict:
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "."],
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": head, "dirty": dirty}
+
+
+def compare(before: dict, after: dict) -> dict:
+    """Change of every numeric metric present in both runs, by scenario and params."""
+    def index(results):
+        return {
+            (section, json.dumps(entry["params"], sort_keys=True)): entry
+            for section in ("orders", "snapshot", "broadcast", "memory")
+            for entry in results.get(section, [])
+        }
+
+    old, changes = index(before), {}
+    for (section, params), entry in index(after).items():
+        previous = old.get((section, params))
+        if previous is None:
+            continue
+        metrics = {}
+        for name, value in entry.items():
+            was = previous.get(name)
+            if name == "params" or not isinstance(value, (int, float)) or not isinstance(
+                was, (int, float)
+            ):
+                continue
+            metrics[name] = {
+                "before": was,
+                "after": value,
+                "change_pct": round((value - was) / was * 100, 1) if was else None,
+            }
+        changes.setdefault(section, []).append({"params": json.loads(params), **metrics})
+    return changes
+
+
+def split(value: str, cast=str) -> list:
+    return [cast(v) for v in value.split(",") if v]
+
+
+def main(args):
+    if args.quick:
+        args.depths, args.symbols, args.orders = "100,1000", "1,4", 300
+        args.subscribers, args.messages, args.snapshot_calls = "10,1000", 20, 50
+
+    results = {
+        "meta": {
+            **git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "database": engine.url.render_as_string(hide_password=True),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "args": vars(args),
+        },
+        "orders": [],
+        "snapshot": [],
+        "broadcast": [],
+        "memory": [],
+    }
+    for engine_name in split(args.engines):
+        for flow in split(args.flows):
+            for depth in split(args.depths, int):
+                for symbols in split(args.symbols, int):
+                    results["orders"].append(
+                        run_orders(engine_name, flow, depth, symbols, args.orders, args.seed)
+                    )
+    for depth in split(args.depths, int):
+        results["snapshot"].append(run_snapshot(depth, args.snapshot_calls, args.seed))
+        results["memory"].append(run_memory(depth, args.seed))
+    for subscribers in split(args.subscribers, int):
+        results["broadcast"].append(asyncio.run(run_broadcast(subscribers, args.messages)))
+
+    if args.compare:
+        with open(args.compare) as f:
+            results["compare"] = compare(json.load(f), results)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engines", default="memory,sql", help="comma separated: memory, sql")
+    parser.add_argument("--flows", default="uniform,bursty,sweep")
+    parser.add_argument("--depths", default="100,10000", help="resting orders per symbol")
+    parser.add_argument("--symbols", default="1,10")
+    parser.add_argument("--orders", type=int, default=1000, help="orders per run")
+    parser.add_argument("--subscribers", default="10,1000,10000")
+    parser.add_argument("--messages", type=int, default=50, help="broadcasts per run")
+    parser.add_argument("--snapshot-calls", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    main(parser.parse_args())
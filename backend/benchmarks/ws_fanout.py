@@ -0,0 +1,185 @@
+"""
+WebSocket broadcast latency with thousands of subscribers.
+
+Starts `--gateways` gateway processes (the app's WebSocket routes only),
+spreads `--clients` local WebSocket clients across them, each following
+`--per-client` symbols over one /ws/market socket, then broadcasts
+`--messages` snapshots round-robin over the symbols and reports delivery and
+broadcast-to-receive latency percentiles. Without `--broker` each gateway is
+asked to broadcast over HTTP; with it, every snapshot is published once to
+Redis and each gateway relays it to its own clients (ORDERBOOK_REDIS_URL).
+
+    cd backend
+    python -m benchmarks.ws_fanout --clients 5000 --symbols 20
+    python -m benchmarks.ws_fanout --clients 5000 --gateways 4 \\
+        --broker redis://localhost:6379/2
+
+Seeds (and wipes) the target database; don't point it at real data.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+import httpx
+import redis.asyncio as redis
+from websockets.asyncio.client import connect
+
+from benchmarks.common import engine, percentile, seed
+from app.book_feed import SNAPSHOT_PREFIX, book_feed
+from app.routers import ws_orderbook
+
+BASE_PORT = 8700
+
+
+def serve_gateway(port: int):
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.include_router(ws_orderbook.router)
+
+    @app.post("/bench/broadcast/{symbol_id}")
+    async def broadcast(symbol_id: int):
+        await ws_orderbook.manager.broadcast(
+            symbol_id, {"symbol_id": symbol_id, "sent_at": time.time()}
+        )
+
+    @app.on_event("startup")
+    async def relay():
+        if book_feed.enabled:
+            asyncio.create_task(book_feed.run_relay(ws_orderbook.relay_snapshot))
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_listening(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def client(url, symbol_ids, slots, subscribed, latencies, stop):
+    async with slots:
+        ws = await connect(url, open_timeout=60, max_queue=None)
+        await ws.send(json.dumps({"type": "subscribe", "symbol_ids": symbol_ids}))
+        for _ in symbol_ids:
+            await ws.recv()  # initial snapshots
+    subscribed.release()
+    try:
+        while not stop.is_set():
+            try:
+                text = await asyncio.wait_for(ws.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            message = json.loads(text)
+            if "sent_at" in message:
+                latencies.append(time.time() - message["sent_at"])
+    finally:
+        await ws.close()
+
+
+async def main(args):
+    symbol_ids = seed(args.symbols, 0, trades=0)
+    ports = [BASE_PORT + i for i in range(args.gateways)]
+    ctx = multiprocessing.get_context("spawn")
+    gateways = [ctx.Process(target=serve_gateway, args=(port,), daemon=True) for port in ports]
+    for process in gateways:
+        process.start()
+    try:
+        for port in ports:
+            await wait_listening(port)
+        results = await run(args, symbol_ids, ports)
+    finally:
+        for process in gateways:
+            process.terminate()
+            process.join()
+    print(json.dumps(results, indent=2))
+
+
+async def run(args, symbol_ids, ports) -> dict:
+    followers = Counter()
+    slots = asyncio.Semaphore(args.connect_concurrency)
+    subscribed = asyncio.Semaphore(0)
+    latencies, stop = [], asyncio.Event()
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(args.clients):
+        subs = [symbol_ids[(i + k) % len(symbol_ids)] for k in range(args.per_client)]
+        followers.update(subs)
+        url = f"ws://127.0.0.1:{ports[i % len(ports)]}/ws/market"
+        tasks.append(asyncio.create_task(
+            client(url, subs, slots, subscribed, latencies, stop)
+        ))
+    for _ in range(args.clients):
+        await subscribed.acquire()
+    connect_s = time.perf_counter() - start
+
+    publisher = redis.from_url(args.broker) if args.broker else None
+    expected = 0
+    async with httpx.AsyncClient() as http:
+        for n in range(args.messages):
+            symbol_id = symbol_ids[n % len(symbol_ids)]
+            expected += followers[symbol_id]
+            if publisher is not None:
+                text = json.dumps({"symbol_id": symbol_id, "sent_at": time.time()})
+                await publisher.publish(SNAPSHOT_PREFIX + str(symbol_id), text)
+            else:
+                await asyncio.gather(*(
+                    http.post(f"http://127.0.0.1:{port}/bench/broadcast/{symbol_id}")
+                    for port in ports
+                ))
+            await asyncio.sleep(args.interval)
+
+    deadline = time.monotonic() + args.drain_timeout
+    while len(latencies) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if publisher is not None:
+        await publisher.aclose()
+
+    latencies.sort()
+    return {
+        "database": engine.url.render_as_string(hide_password=True),
+        "broker": args.broker,
+        "gateways": args.gateways,
+        "clients": args.clients,
+        "subscriptions": args.clients * args.per_client,
+        "connect_s": round(connect_s, 2),
+        "expected": expected,
+        "delivered": len(latencies),
+        "latency_p50_ms": percentile(latencies, 0.5) if latencies else None,
+        "latency_p90_ms": percentile(latencies, 0.9) if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) if latencies else None,
+        "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--per-client", type=int, default=3, help="symbols per socket")
+    parser.add_argument("--gateways", type=int, default=1, help="gateway processes")
+    parser.add_argument("--broker", default=None, help="Redis URL; relay through pub/sub")
+    parser.add_argument("--messages", type=int, default=200, help="broadcasts to send")
+    parser.add_argument("--interval", type=float, default=0.02, help="pause between broadcasts")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+    if args.broker:
+        # Gateways read it at import, before they start
+        os.environ["ORDERBOOK_REDIS_URL"] = args.broker
+    asyncio.run(main(args))
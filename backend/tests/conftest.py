@@ -4,11 +4,14 @@ import pytest
 import redis
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.main import app
-from app.models import Base, Order, Symbol, Trade, User
+from app.models import Base, Candle, Order, Symbol, Trade, User
+from app.routers import orders as orders_router
 from app.routers.auth import get_current_user
 
 # ---------------------------
@@ -19,6 +22,15 @@ SQLALCHEMY_DATABASE_URL = "postgresql://postgres:postgres@db:5432/test_db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: every TestClient runs its own event loop, asyncpg connections
+# can't be shared between loops
+async_engine = create_async_engine(
+    "postgresql+asyncpg://postgres:postgres@db:5432/test_db", poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 # Override get_db dependency to use test DB
 def override_get_db():
@@ -29,7 +41,15 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+# Order placement jobs open their own sessions
+orders_router.SessionLocal = TestingSessionLocal
 
 
 # ---------------------------
@@ -49,11 +69,21 @@ def client():
         yield c
 
 
+@pytest.fixture()
+def db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @pytest.fixture(autouse=True)
 def clean_db():
     """Clean DB tables before each test"""
     db = TestingSessionLocal()
     try:
+        db.query(Candle).delete()
         db.query(Order).delete()
         db.query(Trade).delete()
         db.query(Symbol).delete()
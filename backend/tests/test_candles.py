@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from app.candles import aggregate, bucket_start
+
+
+def test_bucket_start_floors_to_interval():
+    ts = datetime(2025, 1, 1, 10, 7, 42, 500000)
+
+    assert bucket_start(ts, 1) == datetime(2025, 1, 1, 10, 7, 42)
+    assert bucket_start(ts, 300) == datetime(2025, 1, 1, 10, 5)
+    assert bucket_start(ts, 3600) == datetime(2025, 1, 1, 10, 0)
+
+
+def test_aggregate_ohlcv_per_interval():
+    trades = [
+        (datetime(2025, 1, 1, 10, 0, 0, 100000), 100, 5),
+        (datetime(2025, 1, 1, 10, 0, 0, 900000), 103, 1),
+        (datetime(2025, 1, 1, 10, 0, 1), 99, 2),
+    ]
+
+    rows = {(r["interval"], r["start"]): r for r in aggregate(1, trades)}
+
+    assert len(rows) == 5  # two 1s candles, one each for 1m, 5m, 1h
+    minute = rows[(60, datetime(2025, 1, 1, 10, 0))]
+    assert (minute["open_ticks"], minute["high_ticks"], minute["low_ticks"],
+            minute["close_ticks"], minute["volume"], minute["trades"]) == (100, 103, 99, 99, 8, 3)
+    assert rows[(1, datetime(2025, 1, 1, 10, 0, 1))]["open_ticks"] == 99
@@ -0,0 +1,57 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.commit_hooks import after_commit
+
+
+def test_after_commit_follows_savepoints():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER PRIMARY KEY)"))
+    ran = []
+
+    with Session(engine) as db:
+        db.execute(text("INSERT INTO t VALUES (1)"))
+        after_commit(db, ran.append, "outer")
+
+        savepoint = db.begin_nested()
+        db.execute(text("INSERT INTO t VALUES (2)"))
+        after_commit(db, ran.append, "released")
+        savepoint.commit()
+
+        savepoint = db.begin_nested()
+        after_commit(db, ran.append, "rolled back")
+        try:
+            db.execute(text("INSERT INTO t VALUES (1)"))
+        except IntegrityError:
+            savepoint.rollback()
+
+        assert ran == []  # a released savepoint is not a commit
+        db.commit()
+        assert ran == ["outer", "released"]
+
+        db.execute(text("INSERT INTO t VALUES (3)"))
+        after_commit(db, ran.append, "outer rolled back")
+        db.rollback()
+        db.commit()
+        assert ran == ["outer", "released"]
+
+
+def test_after_commit_hook_errors_do_not_fail_the_commit():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER PRIMARY KEY)"))
+    ran = []
+
+    def fail():
+        raise RuntimeError("feed down")
+
+    with Session(engine) as db:
+        db.execute(text("INSERT INTO t VALUES (1)"))
+        after_commit(db, fail)
+        after_commit(db, ran.append, "after")
+        db.commit()  # does not raise
+
+        assert ran == ["after"]
+        assert db.execute(text("SELECT x FROM t")).scalars().all() == [1]
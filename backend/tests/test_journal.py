@@ -0,0 +1,66 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from app.journal import (
+    CancelEvent,
+    FillEvent,
+    JournalState,
+    OrderEvent,
+    ReduceEvent,
+    encode_record,
+    read_segment,
+    replay,
+    write_checkpoint,
+)
+from app.ticks import tick_sizes
+
+TS = datetime(2025, 1, 1, 10, 0, 0, 123456)
+
+
+def order(order_id, side, price, quantity, exec_qty=0, status="pending"):
+    return OrderEvent(order_id, 1, 7, side, "L", price, quantity, exec_qty, TS, status)
+
+
+def write_segment(directory, first_seq, events):
+    path = os.path.join(directory, f"segment-{first_seq:020d}.log")
+    with open(path, "ab") as f:
+        for seq, event in enumerate(events, first_seq):
+            f.write(encode_record(seq, event))
+    return path
+
+
+def test_records_round_trip_and_stop_at_torn_write(tmp_path):
+    events = [
+        order(1, "S", 10000, 10),
+        FillEvent(1, 1, 55, 2, 10000, 4, 4),
+        ReduceEvent(1, 1, 8),
+        CancelEvent(1, 1),
+    ]
+    path = write_segment(tmp_path, 1, events)
+    with open(path, "ab") as f:
+        f.write(encode_record(5, order(3, "B", 9900, 1))[:-3])  # cut short by a crash
+
+    assert list(read_segment(path)) == list(enumerate(events, 1))
+
+
+def test_replay_from_checkpoint_plus_tail(tmp_path, monkeypatch):
+    state = JournalState()
+    for seq, event in enumerate([order(1, "S", 10000, 10), order(2, "S", 10000, 5)], 1):
+        state.apply(seq, event)
+    write_checkpoint(tmp_path, state)
+    write_segment(tmp_path, 3, [
+        FillEvent(1, 1, 55, 3, 10000, 10, 10),
+        order(3, "B", 10000, 10, exec_qty=10, status="filled"),
+        ReduceEvent(2, 1, 3),
+        order(4, "S", 10000, 6),
+    ])
+
+    result = replay(tmp_path)
+    # Process-wide registry: restored after the test
+    monkeypatch.setitem(tick_sizes._sizes, 1, Decimal("0.01"))
+
+    assert (result.checkpoint_seq, result.records, result.state.seq) == (2, 4, 6)
+    book = result.state.to_books()[1]
+    assert [(o.id, o.remaining) for o in book.asks.best().orders.values()] == [(2, 3), (4, 6)]
+    assert book.ltp == 10000
@@ -0,0 +1,24 @@
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_render_text_format():
+    registry = Registry()
+    latency = registry.register(Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1)))
+    errors = registry.register(Counter("errors_total", "Errors."))
+    registry.add_collector(lambda: [("depth", "gauge", "Depth.", [({"symbol_id": 1}, 3)])])
+
+    child = latency.labels("/orders/new")
+    assert latency.labels("/orders/new") is child
+    for value in (0.05, 0.1, 0.5, 3):
+        child.observe(value)
+    errors.inc()
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/orders/new",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/orders/new",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/orders/new",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/orders/new"} 3.65' in lines
+    assert 'latency_seconds_count{route="/orders/new"} 4' in lines
+    assert "errors_total 1" in lines
+    assert 'depth{symbol_id="1"} 3' in lines
@@ -0,0 +1,60 @@
+import os
+from datetime import datetime
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+
+from app.models import Base
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+SCRATCH_DB = "migration_test_db"
+SCRATCH_URL = f"postgresql://postgres:postgres@db:5432/{SCRATCH_DB}"
+
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", SCRATCH_URL)
+    return config
+
+
+def test_candles_backfill_upgrade():
+    admin = create_engine(
+        "postgresql://postgres:postgres@db:5432/postgres", isolation_level="AUTOCOMMIT"
+    )
+    with admin.connect() as conn:
+        conn.execute(text(f"DROP DATABASE IF EXISTS {SCRATCH_DB}"))
+        conn.execute(text(f"CREATE DATABASE {SCRATCH_DB}"))
+    engine = create_engine(SCRATCH_URL)
+    try:
+        # Schema just before the candles migration, with trades to backfill
+        tables = [t for name, t in Base.metadata.tables.items() if name != "candles"]
+        Base.metadata.create_all(bind=engine, tables=tables)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO symbols (id, ticker, name) VALUES (1, 'SYM', 'SYM')"))
+            conn.execute(
+                text(
+                    "INSERT INTO trades (symbol_id, ticker, price_ticks, trade_quantity, timestamp) "
+                    "VALUES (1, 'SYM', :price, :quantity, :ts)"
+                ),
+                [
+                    {"price": 10137, "quantity": 3, "ts": datetime(2026, 1, 1, 10, 0, 5)},
+                    {"price": 10150, "quantity": 2, "ts": datetime(2026, 1, 1, 10, 0, 40)},
+                ],
+            )
+        config = alembic_config()
+        command.stamp(config, "b7d2e94c15a3")
+        command.upgrade(config, "head")
+
+        with engine.connect() as conn:
+            minute = conn.execute(text(
+                "SELECT open_ticks, high_ticks, low_ticks, close_ticks, volume, trades "
+                "FROM candles WHERE symbol_id = 1 AND interval = 60"
+            )).all()
+        assert minute == [(10137, 10150, 10137, 10150, 5, 2)]
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {SCRATCH_DB}"))
+        admin.dispose()
@@ -0,0 +1,86 @@
+from datetime import datetime
+from decimal import Decimal
+
+from app.orderbook import OrderBook, RestingOrder
+
+
+def resting(order_id, side, price, quantity):
+    return RestingOrder(
+        id=order_id,
+        user_id=1,
+        side=side,
+        price=price,
+        quantity=quantity,
+        exec_qty=0,
+        timestamp=datetime.utcnow(),
+    )
+
+
+def test_book_price_time_priority():
+    book = OrderBook(symbol_id=1)
+    book.add(resting(1, "S", 101, 5))
+    book.add(resting(2, "S", 100, 5))
+    book.add(resting(3, "S", 100, 5))
+
+    fills = book.match("B", "L", 101, 12)
+
+    # Best price first, then FIFO within the level
+    assert [(o.id, qty) for o, qty in fills] == [(2, 5), (3, 5), (1, 2)]
+    assert list(book.orders) == [1]
+    assert book.asks.best().quantity == 3
+
+
+def test_book_limit_price_stops_matching():
+    book = OrderBook(symbol_id=1)
+    book.add(resting(1, "B", 99, 5))
+    book.add(resting(2, "B", 98, 5))
+
+    fills = book.match("S", "L", 99, 10)
+
+    assert [(o.id, qty) for o, qty in fills] == [(1, 5)]
+    assert book.bids.best().price == 98
+
+
+def test_book_depth_converts_ticks_to_prices():
+    book = OrderBook(symbol_id=1, tick_size=Decimal("0.05"))
+    book.add(resting(1, "B", 2001, 5))  # 100.05
+    book.add(resting(2, "B", 2001, 3))
+    book.commit()
+
+    assert book.committed_depth()["bids"] == [{"price": 100.05, "quantity": 8}]
+
+
+def test_book_reduce_keeps_time_priority():
+    book = OrderBook(symbol_id=1)
+    book.add(resting(1, "S", 100, 10))
+    book.add(resting(2, "S", 100, 10))
+
+    assert book.reduce(1, 4)
+    assert not book.reduce(1, 6)  # reduce only, never grow
+    assert book.asks.best().quantity == 14
+
+    fills = book.match("B", "L", 100, 5)
+
+    assert [(o.id, qty) for o, qty in fills] == [(1, 4), (2, 1)]
+
+
+def test_book_readers_only_see_committed_changes():
+    book = OrderBook(symbol_id=1, tick_size=Decimal("1"))
+    book.add(resting(1, "S", 100, 5))
+    book.commit()
+    book.drain_changes()
+
+    book.match("B", "L", 100, 2)
+
+    # Matched but not committed yet
+    assert book.committed_depth()["asks"] == [{"price": 100.0, "quantity": 5}]
+    assert book.committed_ltp is None
+    assert book.drain_changes()["trades"] == []
+
+    book.commit()
+
+    assert book.committed_depth()["asks"] == [{"price": 100.0, "quantity": 3}]
+    assert book.committed_ltp == 100
+    changes = book.drain_changes()
+    assert changes["levels"] == [{"side": "S", "price": 100.0, "quantity": 3}]
+    assert changes["trades"] == [{"price": 100.0, "quantity": 2}]
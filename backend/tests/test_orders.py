@@ -1,3 +1,46 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.group_commit import commit_stats
+from app.models import Order, OrderStatus
+from app.routers import matching
+from app.routers import orders as orders_router
+from app.routers import ws_orderbook
+from app.sequencer import MatchingSequencer
+from app.ticks import tick_sizes
+from tests.conftest import TestingSessionLocal
+
+
+def add_order(db, user, symbol, side, quantity, price, exec_qty=0):
+    """A resting limit order written straight to the DB, before the symbol's book is loaded."""
+    order = Order(
+        user_id=user.id,
+        symbol_id=symbol.id,
+        ticker=symbol.ticker,
+        side=side,
+        quantity=quantity,
+        exec_qty=exec_qty,
+        price_ticks=tick_sizes.to_ticks(symbol.id, price, db),
+        status=OrderStatus.partially_filled if exec_qty else OrderStatus.pending,
+        type="L",
+    )
+    db.add(order)
+    db.commit()
+    db.refresh(order)
+    return order
+
+
+def sell(client, symbol, quantity, price):
+    return client.post(
+        "/orders/new",
+        json={"symbol_id": symbol.id, "side": "S", "quantity": quantity, "price": price, "type": "L"},
+    )
+
+
 def test_create_order_api(client, test_user, test_symbol):
     response = client.post(
         "/orders/new",
@@ -76,3 +119,280 @@ def test_rate_limit(client, test_user, test_symbol):
         print("[TEST RATE LIMIT] Request 3 → Raw Text:", resp.text)
 
     assert resp.status_code == 429
+
+
+def test_order_batch(client, db, test_user, test_symbol):
+    resting = add_order(db, test_user, test_symbol, "B", 5, 99)
+
+    response = client.post(
+        "/orders/batch",
+        json={
+            "symbol_id": test_symbol.id,
+            "cancels": [resting.id, 999999],
+            "orders": [
+                {"side": "S", "quantity": 4, "price": 100, "type": "L"},
+                {"side": "B", "quantity": 4, "price": 100, "type": "L"},
+            ],
+        },
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["cancels"] == [
+        {"order_id": resting.id, "cancelled": True, "detail": None},
+        {"order_id": 999999, "cancelled": False, "detail": "Order not found"},
+    ]
+    assert [o["status"] for o in data["orders"]] == ["filled", "filled"]
+    db.refresh(resting)
+    assert resting.status == OrderStatus.cancelled
+
+
+def test_order_batch_rejects_off_tick_price(client, db, test_user, test_symbol):
+    resting = add_order(db, test_user, test_symbol, "B", 5, 99)
+
+    response = client.post(
+        "/orders/batch",
+        json={
+            "symbol_id": test_symbol.id,
+            "cancels": [resting.id],
+            "orders": [{"side": "S", "quantity": 1, "price": 100.001, "type": "L"}],
+        },
+    )
+
+    # Nothing is applied, not even the cancel
+    assert response.status_code == 400
+    db.refresh(resting)
+    assert resting.status == OrderStatus.pending
+
+
+def test_cancel_all_orders(client, db, test_user, test_symbol):
+    pending = add_order(db, test_user, test_symbol, "B", 5, 99)
+    partial = add_order(db, test_user, test_symbol, "S", 5, 101, exec_qty=2)
+
+    response = client.delete("/orders/cancel-all", params={"symbol_id": test_symbol.id})
+
+    assert response.status_code == 200
+    assert sorted(response.json()["cancelled"]) == [pending.id, partial.id]
+    # Nothing left to cancel
+    assert client.delete("/orders/cancel-all").json() == {"cancelled": []}
+
+
+def test_cancel_partially_filled_order(client, db, test_user, test_symbol):
+    order = add_order(db, test_user, test_symbol, "B", 5, 99, exec_qty=3)
+
+    response = client.delete(f"/orders/cancel/{order.id}")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "cancelled"
+    assert data["exec_qty"] == 3
+    # The remainder left the book: a crossing sell rests instead of matching
+    assert sell(client, test_symbol, 2, 99).json()["status"] == "pending"
+
+
+def test_cancel_filled_order(client, db, test_user, test_symbol):
+    order = add_order(db, test_user, test_symbol, "B", 5, 99)
+    order.exec_qty = 5
+    order.status = OrderStatus.filled
+    db.commit()
+
+    response = client.delete(f"/orders/cancel/{order.id}")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Only pending or partially filled orders can be cancelled"
+
+
+def test_amend_reduce_keeps_priority(client, db, test_user, test_symbol):
+    first = add_order(db, test_user, test_symbol, "B", 5, 100)
+    second = add_order(db, test_user, test_symbol, "B", 5, 100)
+
+    response = client.patch(f"/orders/{first.id}", json={"quantity": 3})
+
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 3
+    # Still ahead of `second`
+    assert sell(client, test_symbol, 3, 100).json()["status"] == "filled"
+    db.refresh(first)
+    db.refresh(second)
+    assert first.status == OrderStatus.filled
+    assert second.exec_qty == 0
+
+
+def test_amend_increase_goes_to_back_of_queue(client, db, test_user, test_symbol):
+    first = add_order(db, test_user, test_symbol, "B", 5, 100)
+    second = add_order(db, test_user, test_symbol, "B", 5, 100)
+    timestamp = first.timestamp
+
+    response = client.patch(f"/orders/{first.id}", json={"quantity": 6})
+
+    assert response.status_code == 200
+    db.refresh(first)
+    assert first.quantity == 6
+    assert first.timestamp > timestamp
+    # Now behind `second`
+    sell(client, test_symbol, 5, 100)
+    db.refresh(first)
+    db.refresh(second)
+    assert second.status == OrderStatus.filled
+    assert first.exec_qty == 0
+
+
+def test_amend_price_matches(client, db, test_user, test_symbol):
+    resting = add_order(db, test_user, test_symbol, "S", 5, 101)
+    order = add_order(db, test_user, test_symbol, "B", 5, 100)
+
+    response = client.patch(f"/orders/{order.id}", json={"price": 101})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["price"] == 101
+    assert data["status"] == "filled"
+    db.refresh(resting)
+    assert resting.status == OrderStatus.filled
+
+
+def test_amend_to_executed_quantity(client, db, test_user, test_symbol):
+    order = add_order(db, test_user, test_symbol, "B", 5, 100, exec_qty=3)
+
+    response = client.patch(f"/orders/{order.id}", json={"quantity": 3})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Quantity must exceed the executed quantity (3)"
+
+
+def test_candles(client, db, test_user, test_symbol):
+    add_order(db, test_user, test_symbol, "S", 5, 100)
+    add_order(db, test_user, test_symbol, "S", 3, 101)
+    client.post(
+        "/orders/new",
+        json={"symbol_id": test_symbol.id, "side": "B", "quantity": 8, "price": 101, "type": "L"},
+    )
+
+    response = client.get("/market/candles", params={"symbol_id": test_symbol.id, "interval": "1m"})
+
+    assert response.status_code == 200
+    [candle] = response.json()
+    assert (candle["open"], candle["high"], candle["low"], candle["close"]) == (100, 101, 100, 101)
+    assert candle["volume"] == 8
+    assert candle["trades"] == 2
+    assert client.get(
+        "/market/candles", params={"symbol_id": test_symbol.id, "interval": "2m"}
+    ).status_code == 422
+
+
+def test_trade_tape(client, db, test_user, test_symbol):
+    add_order(db, test_user, test_symbol, "B", 5, 100)
+
+    with client.websocket_connect(f"/ws/trades/{test_symbol.id}") as ws:
+        assert ws.receive_json() == {"type": "replay", "symbol_id": test_symbol.id, "trades": []}
+        sell(client, test_symbol, 2, 100)
+        message = ws.receive_json()
+
+    assert message["type"] == "trades"
+    assert [(t["price"], t["quantity"]) for t in message["trades"]] == [(100, 2)]
+
+
+def test_sql_engine_snapshots_come_from_db(client, db, test_user, test_symbol, monkeypatch):
+    monkeypatch.setattr(matching, "MATCHING_ENGINE", "sql")
+    monkeypatch.setattr(ws_orderbook, "SessionLocal", TestingSessionLocal)
+
+    with client.websocket_connect(f"/ws/orderbook/{test_symbol.id}") as ws:
+        assert ws.receive_json()["order_book"] == {"bids": [], "asks": []}
+    # Written by another worker: never in this worker's book
+    add_order(db, test_user, test_symbol, "B", 5, 100)
+
+    with client.websocket_connect(f"/ws/orderbook/{test_symbol.id}") as ws:
+        message = ws.receive_json()
+
+    assert message["order_book"]["bids"] == [{"price": 100, "quantity": 5}]
+
+
+def test_sql_engine_refuses_delta_mode(client, test_user, test_symbol, monkeypatch):
+    monkeypatch.setattr(matching, "MATCHING_ENGINE", "sql")
+
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect(f"/ws/orderbook/{test_symbol.id}?mode=delta") as ws:
+            ws.receive_json()
+    assert exc_info.value.code == 1008
+
+    with client.websocket_connect("/ws/market") as ws:
+        ws.send_json({"type": "subscribe", "symbol_id": test_symbol.id, "mode": "delta"})
+        assert ws.receive_json()["type"] == "error"
+
+
+def test_group_commit(client, test_user, test_symbol, monkeypatch):
+    monkeypatch.setattr(orders_router, "ORDER_GROUP_COMMIT", True)
+    monkeypatch.setattr(orders_router, "ORDER_GROUP_COMMIT_WINDOW_MS", 500)
+    before = commit_stats.stats().get(test_symbol.id, {"commits": 0, "orders": 0})
+
+    def place(side):
+        return client.post(
+            "/orders/new",
+            json={"symbol_id": test_symbol.id, "side": side, "quantity": 5, "price": 100, "type": "L"},
+        )
+
+    with ThreadPoolExecutor(2) as pool:
+        responses = list(pool.map(place, ["B", "S"]))
+
+    assert [r.status_code for r in responses] == [200, 200]
+    # Matched in one group and answered after its single commit
+    assert [r.json()["status"] for r in responses] == ["filled", "filled"]
+    after = commit_stats.stats()[test_symbol.id]
+    assert after["commits"] - before["commits"] == 1
+    assert after["orders"] - before["orders"] == 2
+
+
+def test_sequencer_runs_jobs_in_submission_order():
+    sequencer = MatchingSequencer()
+    applied = []
+
+    def job(i):
+        time.sleep(0.01 * (i % 2))  # slower jobs don't let later ones overtake
+        applied.append(i)
+        return i
+
+    async def submit_all():
+        try:
+            return await asyncio.gather(*(sequencer.submit(1, job, i) for i in range(6)))
+        finally:
+            await sequencer.stop()
+
+    assert asyncio.run(submit_all()) == list(range(6))
+    assert applied == list(range(6))
+
+
+def test_concurrent_orders_are_matched_one_at_a_time(client, db, test_user, test_symbol):
+    resting = add_order(db, test_user, test_symbol, "B", 5, 100)
+
+    with ThreadPoolExecutor(2) as pool:
+        responses = list(pool.map(lambda _: sell(client, test_symbol, 4, 100), range(2)))
+
+    # The resting buy is filled once, never overfilled
+    assert sorted(r.json()["exec_qty"] for r in responses) == [1, 4]
+    db.refresh(resting)
+    assert resting.exec_qty == 5
+    assert resting.status == OrderStatus.filled
+
+
+def test_order_price_not_finite(client, test_user, test_symbol):
+    # Python's json accepts Infinity, which pydantic lets through as a float
+    response = client.post(
+        "/orders/new",
+        content=f'{{"symbol_id": {test_symbol.id}, "side": "S", "quantity": 1, '
+        '"price": Infinity, "type": "L"}',
+        headers={"Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Price must be a finite number"
+
+
+def test_order_price_out_of_range(client, db, test_user, test_symbol):
+    order = add_order(db, test_user, test_symbol, "B", 5, 100)
+
+    # Beyond a BIGINT of ticks
+    assert sell(client, test_symbol, 1, 1e300).status_code == 400
+    response = client.patch(f"/orders/{order.id}", json={"price": 1e300})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Price is out of range"
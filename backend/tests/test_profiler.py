@@ -0,0 +1,33 @@
+import os
+import threading
+import time
+
+from app.profiler import SamplingProfiler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_window_profile_writes_collapsed_stacks(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), 0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        profiler.start_window(0.2)
+        deadline = time.monotonic() + 5
+        while profiler.status()["window"] is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        worker.join()
+    profiler.close()
+
+    [path] = profiler.status()["files"]
+    assert os.path.dirname(path) == str(tmp_path)
+    lines = open(path).read().splitlines()
+    busy = [line for line in lines if line.startswith("busy;")]
+    assert busy and all("busy_loop (tests/test_profiler.py:" in line for line in busy)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
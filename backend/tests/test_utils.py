@@ -10,7 +10,7 @@ def test_match_order_basic(test_user, test_symbol):
     buy_order = Order(
         side="B",
         quantity=10,
-        price=100,
+        price_ticks=10000,
         exec_qty=0,
         user_id=test_user.id,
         symbol_id=test_symbol.id,
@@ -21,7 +21,7 @@ def test_match_order_basic(test_user, test_symbol):
     sell_order = Order(
         side="S",
         quantity=10,
-        price=100,
+        price_ticks=10000,
         exec_qty=0,
         user_id=test_user.id,
         symbol_id=test_symbol.id,